@@ -0,0 +1,221 @@
+"""
+Load test of the API hot paths against a seeded Postgres.
+
+Drives the FastAPI app with concurrent clients and reports throughput and p50/p95/p99
+latency per endpoint. By default the app runs in-process over ASGI, so the numbers cover
+the whole request path except the network; ``--url`` targets a running server instead.
+``get_current_user`` is measured by calling the dependency directly, in-process only.
+
+The app's database (``DB_*`` settings) is used. ``--seed`` migrates it, truncates every
+table and inserts the configured number of users, groups and messages, so only point it
+at a scratch database. Requires ``httpx``.
+
+Usage: python -m bench.bench_api --seed [--users N] [--groups N] [--messages N]
+           [--concurrency N] [--requests N] [--scenarios a,b] [--output FILE] [--compare FILE]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+import bcrypt
+import httpx
+import psycopg2
+from main import app
+from src.migrations.runner import migrate
+from src.utils.db_util import get_connect_kwargs, acquire_db
+from src.services.auth_service import get_current_user
+
+BENCH_PASSWORD = "bench-password"
+
+SCENARIOS = ("login", "get_current_user", "send_group_message", "like_message", "list_groups")
+
+SEED = """
+    TRUNCATE users, groups, group_members, messages, message_likes RESTART IDENTITY CASCADE;
+    INSERT INTO users (username, password, is_admin)
+        SELECT 'bench_user_' || i, %(password)s, FALSE FROM generate_series(1, %(users)s) i;
+    INSERT INTO groups (name) SELECT 'bench_group_' || i FROM generate_series(1, %(groups)s) i;
+    INSERT INTO group_members (group_id, user_id)
+        SELECT (i - 1) %% %(groups)s + 1, i FROM generate_series(1, %(users)s) i;
+    INSERT INTO messages (group_id, user_id, content)
+        SELECT (i - 1) %% %(groups)s + 1, (i - 1) %% %(users)s + 1, 'bench message ' || i FROM generate_series(1, %(messages)s) i;
+    ANALYZE;
+"""
+
+
+def seed(users: int, groups: int, messages: int):
+    """
+    Migrate the database and replace its contents with benchmark data.
+
+    User ``u`` belongs to group ``(u - 1) % groups + 1``, and message ``m`` is posted to group
+    ``(m - 1) % groups + 1``, so clients can derive the groups and messages they may use.
+    """
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    conn = psycopg2.connect(**get_connect_kwargs())
+    try:
+        migrate(conn)
+        with conn.cursor() as cur:
+            cur.execute(SEED, {"password": password, "users": users, "groups": groups, "messages": messages})
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    """Return the nearest-rank percentile of sorted latencies."""
+    return latencies[max(0, min(len(latencies) - 1, int(round(fraction * len(latencies))) - 1))]
+
+
+class Client:
+    """One virtual user: a logged-in identity with its group and a message in that group."""
+
+    def __init__(self, http: httpx.AsyncClient, index: int, args):
+        self.http = http
+        self.user_id = index % args.users + 1
+        self.username = f"bench_user_{self.user_id}"
+        self.group_id = (self.user_id - 1) % args.groups + 1
+        self.message_id = self.group_id if self.group_id <= args.messages else None
+        self.token = None
+
+    async def login(self):
+        response = await self.http.post("/login", data={"username": self.username, "password": BENCH_PASSWORD})
+        if response.status_code == 200:
+            self.token = response.json()["access_token"]
+        return response.status_code
+
+    async def get_current_user(self):
+        async with acquire_db() as db:
+            await get_current_user(self.token, db)
+        return 200
+
+    async def send_group_message(self):
+        response = await self.http.post(f"/groups/{self.group_id}/messages", json={"content": "bench"}, headers=self._auth())
+        return response.status_code
+
+    async def like_message(self):
+        response = await self.http.post(f"/messages/{self.message_id}/likes", headers=self._auth())
+        return response.status_code
+
+    async def list_groups(self):
+        response = await self.http.get("/groups", params={"limit": 50}, headers=self._auth())
+        return response.status_code
+
+    def _auth(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def run_scenario(clients: list, scenario: str, requests: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                status = await getattr(client, scenario)()
+            except Exception:
+                status = None
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status is None or status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3),
+    }
+
+
+async def run(args) -> dict:
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, timeout=30)
+        lifespan = None
+    else:
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+    results = {}
+    try:
+        clients = [Client(http, index, args) for index in range(args.concurrency)]
+        await asyncio.gather(*(client.login() for client in clients))
+        for scenario in args.scenarios:
+            if scenario == "get_current_user" and args.url:
+                continue
+            if scenario == "like_message" and any(client.message_id is None for client in clients):
+                continue
+            await run_scenario(clients, scenario, min(args.requests, args.concurrency * 5))
+            results[scenario] = await run_scenario(clients, scenario, args.requests)
+    finally:
+        await http.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return results
+
+
+def report(results: dict, baseline: dict = None):
+    print("%-20s %8s %7s %10s %9s %9s %9s" % ("scenario", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms"))
+    for scenario, result in results.items():
+        print("%-20s %8d %7d %10.1f %9.3f %9.3f %9.3f" % (
+            scenario, result["requests"], result["errors"], result["throughput_rps"],
+            result["p50_ms"], result["p95_ms"], result["p99_ms"]))
+        previous = (baseline or {}).get(scenario)
+        if previous:
+            print("%-20s %8s %7s %+9.1f%% %+8.1f%% %+8.1f%% %+8.1f%%" % (
+                "  vs baseline", "", "",
+                _change(previous["throughput_rps"], result["throughput_rps"]), _change(previous["p50_ms"], result["p50_ms"]),
+                _change(previous["p95_ms"], result["p95_ms"]), _change(previous["p99_ms"], result["p99_ms"])))
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed", action="store_true", help="Migrate, truncate and seed the database first")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS))
+    parser.add_argument("--url", help="Base URL of a running server; the app runs in-process when omitted")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="A previous --output file to report changes against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: " + ", ".join(sorted(unknown)))
+    if args.seed:
+        seed(args.users, args.groups, args.messages)
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    report(results, baseline)
+    if args.output:
+        meta = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+        meta.update(revision=_git_revision(), timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    cpu_count=os.cpu_count())
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
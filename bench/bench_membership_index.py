@@ -0,0 +1,97 @@
+"""
+Benchmark of request latency with and without the group membership index.
+
+The database is simulated by a connection whose every statement costs a fixed round
+trip, so the numbers isolate the round trips the index saves rather than Postgres itself.
+Sending and liking run as single fused statements that check membership themselves, so
+they are reported once; history reads still consult the index.
+
+Usage: python -m bench.bench_membership_index [--requests N] [--round-trip-ms MS]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from src.models.schemas import MessageIn, User
+from src.services import membership_service
+from src.services.message_service import send_group_message, like_message, list_group_messages
+from src.utils.query_util import SEND_MESSAGE, LIKE_MESSAGE, SELECT_MESSAGES_LATEST
+
+
+class SimulatedConnection:
+    """A stand-in connection whose statements each take ``round_trip`` seconds."""
+
+    def __init__(self, round_trip: float):
+        self.round_trip = round_trip
+        self.autocommit = False
+        self._last_query = ""
+
+    def get_transaction_status(self):
+        return 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        time.sleep(self.round_trip)
+        self._last_query = query
+
+    def fetchone(self):
+        if self._last_query is SEND_MESSAGE:
+            return (True, 1, 1, "benchmark", 0, 1)
+        if self._last_query is LIKE_MESSAGE:
+            return (1, True, 1, 1)
+        return (1,)
+
+    def fetchall(self):
+        if self._last_query is SELECT_MESSAGES_LATEST:
+            return [(message_id, 1, "benchmark", 0, []) for message_id in range(50, 0, -1)]
+        return [(user_id,) for user_id in range(1, 51)]
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+async def measure(operation, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await operation()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print("%-36s p50 %7.3f ms   p95 %7.3f ms" % (label, statistics.median(latencies), p95))
+
+
+async def main(requests: int, round_trip_ms: float):
+    db = SimulatedConnection(round_trip_ms / 1000)
+    user = User(id=1, username="bench", is_admin=False)
+    message = MessageIn(content="benchmark")
+    report("send_group_message", await measure(lambda: send_group_message(1, message, user, db), requests))
+    report("like_message", await measure(lambda: like_message(1, user, db), requests))
+    for enabled in (False, True):
+        membership_service.MEMBERSHIP_INDEX_ENABLED = enabled
+        membership_service.MEMBERSHIP_INDEX.clear()
+        label = "with index" if enabled else "without index"
+        report("list_group_messages " + label, await measure(lambda: list_group_messages(1, user, db), requests))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--round-trip-ms", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.round_trip_ms))
@@ -0,0 +1,112 @@
+"""
+Benchmark of full-text message search latency at millions of messages.
+
+Seeds a scratch Postgres with messages drawn from a skewed vocabulary, so some terms match
+most of a group and others almost nothing, then times the search statements (first page
+and a page deep into the results) against an ``ILIKE`` scan of the same group.
+
+The app's database (``DB_*`` settings) is used. ``--seed`` migrates it, truncates every
+table and inserts the messages, so only point it at a scratch database.
+
+Usage: python -m bench.bench_search --seed [--messages N] [--groups N] [--requests N]
+"""
+import argparse
+import statistics
+import time
+import psycopg2
+from src.migrations.runner import migrate
+from src.utils.db_util import PreparingConnection, get_connect_kwargs
+from src.utils.query_util import SEARCH_MESSAGES, SEARCH_MESSAGES_AFTER
+
+# Word n of the vocabulary is "w<n>"; low numbers are by far the most frequent.
+SEED = """
+    TRUNCATE users, groups, group_members, messages, message_likes RESTART IDENTITY CASCADE;
+    INSERT INTO users (username, password) VALUES ('bench_search', 'x');
+    INSERT INTO groups (name) SELECT 'bench_group_' || i FROM generate_series(1, %(groups)s) i;
+    INSERT INTO messages (group_id, user_id, content)
+        SELECT (i - 1) %% %(groups)s + 1, 1,
+               (SELECT string_agg('w' || (1 + floor(power(random(), 4) * 20000))::int, ' ')
+                FROM generate_series(1, 4 + i %% 12))
+        FROM generate_series(1, %(messages)s) i;
+    ANALYZE;
+"""
+
+ILIKE_SEARCH = "SELECT id, group_id, content, likes FROM messages WHERE group_id = %s AND content ILIKE %s ORDER BY id DESC LIMIT %s"
+
+QUERIES = (("common", "w1"), ("frequent", "w20"), ("uncommon", "w2000"), ("rare", "w19000"),
+           ("two terms", "w20 w300"), ("phrase", '"w1 w2"'))
+
+
+def seed(conn, messages: int, groups: int):
+    migrate(conn)
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(SEED, {"messages": messages, "groups": groups})
+    conn.commit()
+    print("seeded %d messages in %d groups in %.1f s" % (messages, groups, time.perf_counter() - started))
+
+
+def measure(conn, statement, params, requests: int) -> tuple:
+    latencies = []
+    with conn.cursor() as cur:
+        for _ in range(requests):
+            started = time.perf_counter()
+            cur.execute(statement, params)
+            rows = cur.fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+    conn.rollback()
+    return latencies, rows
+
+
+def deep_page_params(conn, params: dict, pages: int) -> dict:
+    """Follow the search cursor ``pages`` pages in, returning the parameters of the next page."""
+    cursor_params = dict(params)
+    try:
+        with conn.cursor() as cur:
+            for page in range(pages):
+                cur.execute(SEARCH_MESSAGES_AFTER if page else SEARCH_MESSAGES, cursor_params)
+                rows = cur.fetchall()
+                if len(rows) < params["limit"]:
+                    return None
+                cursor_params = dict(params, rank=rows[-1][5], id=rows[-1][0])
+    finally:
+        conn.rollback()
+    return cursor_params
+
+
+def report(label: str, latencies: list, rows: list):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print("%-34s p50 %8.3f ms   p95 %8.3f ms   %3d rows" % (label, statistics.median(latencies), p95, len(rows)))
+
+
+def main(args):
+    conn = psycopg2.connect(connection_factory=PreparingConnection, **get_connect_kwargs())
+    try:
+        if args.seed:
+            seed(conn, args.messages, args.groups)
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM messages WHERE group_id = 1")
+            print("group 1 holds %d messages" % cur.fetchone()[0])
+        conn.rollback()
+        for label, query in QUERIES:
+            params = {"group_id": 1, "q": query, "limit": args.limit}
+            report(f"search {label}", *measure(conn, SEARCH_MESSAGES, params, args.requests))
+            deep = deep_page_params(conn, params, 10)
+            if deep:
+                report(f"search {label}, page 11", *measure(conn, SEARCH_MESSAGES_AFTER, deep, args.requests))
+            if not query.startswith('"') and " " not in query:
+                pattern = "%" + query + "%"
+                report(f"ilike {label}", *measure(conn, ILIKE_SEARCH, (1, pattern, args.limit), max(1, args.requests // 10)))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed", action="store_true", help="Migrate, truncate and seed the database first")
+    parser.add_argument("--messages", type=int, default=5000000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=100, help="Executions per measured query")
+    parser.add_argument("--limit", type=int, default=50, help="Page size")
+    main(parser.parse_args())
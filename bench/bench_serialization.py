@@ -0,0 +1,73 @@
+"""
+Benchmark of group listing serialization with and without the fast path.
+
+Compares building pydantic models and encoding them with the standard library against
+encoding the database rows directly (FAST_SERIALIZATION) with orjson.
+The database is replaced by canned rows so only serialization is measured.
+
+Usage: python -m bench.bench_serialization [--groups N] [--members N] [--repeat N]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from src.utils.stream_util import iter_json_array, encode_item
+from src.services.group_service import list_groups, encode_group_row
+
+
+class CannedConnection:
+    """A stand-in connection whose queries instantly return the same rows."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+def make_rows(groups: int, members: int) -> list:
+    ids = list(range(1, members + 1))
+    return [(group_id, "group %d" % group_id, ids, ["user%d" % i for i in ids], [i % 10 == 0 for i in ids])
+            for group_id in range(1, groups + 1)]
+
+
+def measure(db, fast: bool, repeat: int) -> tuple:
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        items = asyncio.run(list_groups(db, limit=len(db.rows), raw=fast))
+        size = len(b"".join(iter_json_array(items, encode_group_row if fast else encode_item)))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), size
+
+
+def main(groups: int, members: int, repeat: int):
+    db = CannedConnection(make_rows(groups, members))
+    model_ms, model_size = measure(db, False, repeat)
+    fast_ms, fast_size = measure(db, True, repeat)
+    print("%d groups x %d members" % (groups, members))
+    print("%-28s %9.2f ms  %9d bytes" % ("models + jsonable_encoder", model_ms, model_size))
+    print("%-28s %9.2f ms  %9d bytes" % ("rows + orjson", fast_ms, fast_size))
+    print("speedup %.1fx" % (model_ms / fast_ms))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.groups, args.members, args.repeat)
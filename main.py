@@ -1,5 +1,13 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.routers import auth, users, groups, messages
+from src.routers import auth, users, groups, messages, read_markers, attachments, stream, health, metrics
+from src.utils.db_util import close_pool
+from src.utils.notify_util import LISTENER
+from src.utils.metrics_util import RequestTimingMiddleware
+from src.utils.replica_util import ReadYourWritesMiddleware, close_router
+from src.utils.lifecycle_util import READINESS, cancel_warm_up, warm_up
+from src.services.like_service import LIKE_AGGREGATOR, LIKE_WRITE_BEHIND
+from src.services.attachment_service import ATTACHMENT_REAPER
 
 """
 Group Chat API
@@ -11,19 +19,51 @@ Routers:
 - users: User-related routes for creating and updating user accounts.
 - groups: Group-related routes for creating, deleting, listing groups, and adding members to groups.
 - messages: Message-related routes for sending messages to groups and liking messages.
+- read_markers: Per-group read markers and unread message counts.
+- stream: Real-time group events over WebSocket, with a server-sent events fallback.
+- health: Liveness, readiness and database connection pool statistics.
+- metrics: Request, query, connection pool and password hashing metrics in Prometheus format.
 
 Usage:
-- Run the API server using `uvicorn main:app --reload`.
+- Run the API server using `uvicorn main:app --reload` in development.
+- Run `python serve.py` in production to pre-fork one warmed-up worker per CPU core.
 - Access the API documentation at `http://localhost:8000/docs` or `http://localhost:8000/redoc`.
 """
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up and start background workers and, on shutdown, stop them, drain pending likes and release shared resources."""
+    LISTENER.start()
+    if LIKE_WRITE_BEHIND:
+        LIKE_AGGREGATOR.start()
+    ATTACHMENT_REAPER.start()
+    await warm_up()
+    yield
+    READINESS.mark_draining()
+    cancel_warm_up()
+    await ATTACHMENT_REAPER.stop()
+    await LIKE_AGGREGATOR.stop()
+    LISTENER.stop()
+    close_router()
+    close_pool()
+
 app = FastAPI(title="Group Chat API",
     description="A FastAPI-based Group Chat API that allows users to create accounts, join groups, send messages, and like messages within groups.",
-    version="1.0.0",)
+    version="1.0.0",
+    lifespan=lifespan,)
+
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(RequestTimingMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(groups.router)
 app.include_router(messages.router)
+app.include_router(read_markers.router)
+app.include_router(attachments.router)
+app.include_router(stream.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,286 @@
+"""
+Production launcher for the Group Chat API.
+
+Binds the listening socket once, then pre-forks ``WEB_CONCURRENCY`` uvicorn workers (one
+per CPU core by default) that all accept from it. Each worker runs the app's lifespan
+before it accepts a connection, which opens and prepares its database connections, and
+reports back when it is serving. The launcher then measures the time until a request is
+actually served through the socket.
+
+Workers are recycled after ``WORKER_MAX_REQUESTS`` requests or once their resident memory
+exceeds ``WORKER_MAX_RSS_MB``: they stop accepting, finish their in-flight requests and are
+replaced. SIGTERM or SIGINT drains every worker the same way, for up to
+``GRACEFUL_TIMEOUT`` seconds, before the launcher exits.
+
+With more than one worker, logged-out tokens and rate limits default to the SQLite
+backends, so every worker on the host honours them.
+
+Usage: python serve.py [--host HOST] [--port PORT] [--workers N]
+"""
+import time
+
+STARTED = time.monotonic()
+
+import argparse
+import http.client
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import threading
+
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', str(os.cpu_count() or 1)))
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '8000'))
+WORKER_MAX_REQUESTS = int(os.getenv('WORKER_MAX_REQUESTS', '0'))
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv('WORKER_MAX_REQUESTS_JITTER', str(WORKER_MAX_REQUESTS // 10)))
+WORKER_MAX_RSS_MB = int(os.getenv('WORKER_MAX_RSS_MB', '0'))
+GRACEFUL_TIMEOUT = float(os.getenv('GRACEFUL_TIMEOUT', '30'))
+READY_TIMEOUT = float(os.getenv('READY_TIMEOUT', '60'))
+
+# Imported once by the launcher so that forked workers share them instead of each paying
+# for the imports. The app itself is imported by each worker, since it opens per-process
+# resources such as SQLite connections when imported.
+PRELOAD_MODULES = ("uvicorn", "fastapi", "pydantic", "starlette.routing", "psycopg2", "psycopg2.extras",
+                   "bcrypt", "jwt", "dotenv")
+
+MEMORY_CHECK_INTERVAL = 5.0
+
+logger = logging.getLogger("serve")
+
+
+def worker_max_requests(limit: int = WORKER_MAX_REQUESTS, jitter: int = WORKER_MAX_REQUESTS_JITTER) -> int:
+    """
+    Pick the number of requests after which a new worker is recycled.
+
+    :param limit: The configured limit; 0 disables recycling.
+    :param jitter: Up to this many requests are added, so workers do not all recycle at once.
+    :return: The worker's limit, or None for no limit.
+    """
+    if limit <= 0:
+        return None
+    return limit + random.randint(0, max(0, jitter))
+
+
+def resident_memory() -> int:
+    """
+    Return this process's resident set size in bytes.
+
+    :return: The current RSS from /proc where available, otherwise the peak RSS.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def probe_address(host: str) -> str:
+    """Return the address to reach a server bound to ``host`` from this machine."""
+    return {"0.0.0.0": "127.0.0.1", "": "127.0.0.1", "::": "::1"}.get(host, host)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, ready_fd: int):
+    """Serve the app on the shared socket until told to stop or recycled. Runs in a forked child."""
+    import uvicorn
+    from main import app
+    from src.utils.lifecycle_util import READINESS
+
+    class WorkerServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets)
+            if not self.should_exit:
+                os.write(ready_fd, b"%d\n" % os.getpid())
+
+        def handle_exit(self, sig, frame):
+            READINESS.mark_draining()
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(app, limit_max_requests=worker_max_requests(), timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+                            lifespan="on")
+    server = WorkerServer(config)
+    if WORKER_MAX_RSS_MB > 0:
+        threading.Thread(target=_watch_memory, args=(server, WORKER_MAX_RSS_MB * 1024 * 1024), daemon=True).start()
+    server.run(sockets=[sock])
+
+
+def _watch_memory(server, limit: int):
+    from src.utils.lifecycle_util import READINESS
+    while not server.should_exit:
+        rss = resident_memory()
+        if rss > limit:
+            logger.warning("Worker %d uses %d MB, recycling", os.getpid(), rss // (1024 * 1024))
+            READINESS.mark_draining()
+            server.should_exit = True
+            return
+        time.sleep(MEMORY_CHECK_INTERVAL)
+
+
+class Arbiter:
+    """Forks the workers, replaces those that exit and drains them all on shutdown."""
+
+    def __init__(self, sock: socket.socket, workers: int, worker=None):
+        """
+        :param sock: The bound listening socket the workers accept from.
+        :param workers: The number of workers to keep running.
+        :param worker: Serves in a forked child, given the socket and the readiness pipe; defaults to run_worker.
+        """
+        self.sock = sock
+        self.size = workers
+        self.worker = worker or run_worker
+        self.workers = {}
+        self.stopping = False
+        self.ready_r, self.ready_w = os.pipe()
+        os.set_blocking(self.ready_r, False)
+        self._pending = b""
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+                    signal.signal(sig, signal.SIG_DFL)
+                os.close(self.ready_r)
+                self.worker(self.sock, self.ready_w)
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def run(self) -> int:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._handle_stop)
+        for _ in range(self.size):
+            self.spawn()
+        ready = self._wait_ready(self.size, STARTED + READY_TIMEOUT)
+        logger.info("%d of %d workers ready %.3f s after launch", ready, self.size, time.monotonic() - STARTED)
+        first_request = self._first_request()
+        if first_request is not None:
+            logger.info("First request served %.3f s after launch", first_request)
+        while not self.stopping:
+            self._reap()
+            while not self.stopping and len(self.workers) < self.size:
+                self.spawn()
+            self._wait_ready(0, time.monotonic() + 1.0)
+        return self._drain()
+
+    def _handle_stop(self, sig, frame):
+        self.stopping = True
+
+    def _wait_ready(self, count: int, deadline: float) -> int:
+        """Log workers reporting ready until ``count`` have, or until ``deadline``; return how many did."""
+        ready = 0
+        while time.monotonic() < deadline and not self.stopping and (ready < count or count == 0):
+            readable, _, _ = select.select([self.ready_r], [], [], max(0.0, min(0.5, deadline - time.monotonic())))
+            if readable:
+                try:
+                    self._pending += os.read(self.ready_r, 4096)
+                except BlockingIOError:
+                    pass
+                *lines, self._pending = self._pending.split(b"\n")
+                for line in lines:
+                    pid = int(line)
+                    logger.info("Worker %d serving after %.3f s", pid, time.monotonic() - self.workers.get(pid, STARTED))
+                    ready += 1
+            elif count:
+                self._reap()
+        return ready
+
+    def _first_request(self):
+        address = probe_address(self.sock.getsockname()[0])
+        port = self.sock.getsockname()[1]
+        deadline = STARTED + READY_TIMEOUT
+        while time.monotonic() < deadline and not self.stopping:
+            conn = http.client.HTTPConnection(address, port, timeout=2)
+            try:
+                conn.request("GET", "/health/ready")
+                if conn.getresponse().status == 200:
+                    return time.monotonic() - STARTED
+            except OSError:
+                pass
+            finally:
+                conn.close()
+            time.sleep(0.05)
+        logger.warning("No request served within %.0f s of launch", READY_TIMEOUT)
+        return None
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is not None and not self.stopping:
+                logger.info("Worker %d exited with status %d after %.0f s, replacing it", pid,
+                            os.waitstatus_to_exitcode(status), time.monotonic() - started)
+
+    def _drain(self) -> int:
+        logger.info("Draining %d workers", len(self.workers))
+        for pid in list(self.workers):
+            _signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning("Worker %d did not drain in time, killing it", pid)
+            _signal(pid, signal.SIGKILL)
+        while self.workers:
+            try:
+                os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self._reap()
+        self.sock.close()
+        return 0
+
+
+def _signal(pid: int, sig: int):
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="[%(process)d] %(levelname)s %(name)s: %(message)s")
+    if args.workers > 1:
+        os.environ.setdefault('REVOCATION_BACKEND', 'sqlite')
+        os.environ.setdefault('RATE_LIMIT_BACKEND', 'sqlite')
+    preload_started = time.monotonic()
+    for name in PRELOAD_MODULES:
+        __import__(name)
+    logger.info("Preloaded modules in %.3f s", time.monotonic() - preload_started)
+    sock = bind_socket(args.host, args.port)
+    logger.info("Listening on %s:%d with %d workers", args.host, sock.getsockname()[1], args.workers)
+    raise SystemExit(Arbiter(sock, args.workers).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Schema migration runner.
+
+Applied versions are recorded in ``schema_migrations``. Every step runs in its own
+transaction under an advisory lock, so concurrent runners (for example several hosts
+deploying at once) apply each migration exactly once. A migration with online steps holds
+the lock for the whole session instead, as its steps span several transactions.
+
+Usage: python -m src.migrations.runner [up|down|status] [--target VERSION]
+"""
+import argparse
+import psycopg2
+from src.utils.db_util import get_connect_kwargs
+from src.migrations.versions import MIGRATIONS
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every runner of this application.
+MIGRATION_LOCK_ID = 4170316
+
+CREATE_SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+def current_version(conn) -> int:
+    """
+    Return the highest applied migration version.
+
+    :param conn: A connection to the database.
+    :return: The current schema version, or 0 if no migration was applied.
+    """
+    with conn.cursor() as cur:
+        cur.execute(CREATE_SCHEMA_MIGRATIONS)
+        cur.execute("SELECT coalesce(max(version), 0) FROM schema_migrations")
+        version = cur.fetchone()[0]
+    conn.commit()
+    return version
+
+
+def migrate(conn, target: int = None, migrations: list = MIGRATIONS) -> list:
+    """
+    Apply pending migrations in ascending order.
+
+    :param conn: A connection to the database.
+    :param target: The version to migrate up to; defaults to the latest.
+    :param migrations: The migrations to choose from, in ascending version order.
+    :return: The versions that were applied.
+    """
+    target = migrations[-1].version if target is None else target
+    applied = []
+    for migration in migrations:
+        if migration.version > target:
+            break
+        if _step(conn, migration, forward=True):
+            applied.append(migration.version)
+    return applied
+
+
+def rollback(conn, target: int, migrations: list = MIGRATIONS) -> list:
+    """
+    Revert applied migrations in descending order.
+
+    :param conn: A connection to the database.
+    :param target: The version to leave the schema at; 0 reverts everything.
+    :param migrations: The migrations to choose from, in ascending version order.
+    :return: The versions that were reverted.
+    """
+    reverted = []
+    for migration in reversed(migrations):
+        if migration.version <= target:
+            break
+        if _step(conn, migration, forward=False):
+            reverted.append(migration.version)
+    return reverted
+
+
+def _step(conn, migration, forward: bool) -> bool:
+    current_version(conn)
+    if forward and migration.online:
+        return _online_step(conn, migration)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (migration.version,))
+            if (cur.fetchone() is not None) == forward:
+                conn.rollback()
+                return False
+            if forward:
+                cur.execute(migration.up)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (migration.version, migration.name))
+            else:
+                cur.execute(migration.down)
+                cur.execute("DELETE FROM schema_migrations WHERE version = %s", (migration.version,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+def _online_step(conn, migration) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    conn.commit()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (migration.version,))
+            if cur.fetchone() is not None:
+                conn.rollback()
+                return False
+            cur.execute(migration.up)
+        conn.commit()
+        for step in migration.online:
+            _run_online(conn, step)
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (migration.version, migration.name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+    return True
+
+
+def _run_online(conn, step):
+    if step.autocommit:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(step.sql)
+        finally:
+            conn.autocommit = False
+        return
+    after = 0
+    while True:
+        with conn.cursor() as cur:
+            if step.batched:
+                cur.execute(step.sql, {"after": after})
+                after = cur.fetchone()[0]
+            else:
+                cur.execute(step.sql)
+        conn.commit()
+        if not step.batched or after is None:
+            return
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Apply or revert database schema migrations.")
+    parser.add_argument("command", nargs="?", choices=("up", "down", "status"), default="up")
+    parser.add_argument("--target", type=int, help="Version to migrate to (required for down)")
+    args = parser.parse_args(argv)
+    if args.command == "down" and args.target is None:
+        parser.error("down requires --target")
+    conn = psycopg2.connect(**get_connect_kwargs())
+    try:
+        if args.command == "up":
+            for version in migrate(conn, args.target):
+                print(f"applied {version}")
+        elif args.command == "down":
+            for version in rollback(conn, args.target):
+                print(f"reverted {version}")
+        print(f"schema version {current_version(conn)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Schema migration steps.
+
+Each migration is a versioned pair of SQL scripts: ``up`` moves the schema forward and
+``down`` reverts it. Versions are applied in ascending order and must never be edited once
+released; change the schema by appending a new migration.
+
+The initial steps use ``IF NOT EXISTS`` so databases created by hand before migrations
+existed can be adopted without recreating them.
+
+Work that would hold a lock on a large table for too long goes in ``online`` steps, run
+after ``up`` commits and before the version is recorded, so an interrupted migration is
+simply run again. Each step runs in its own transaction, or outside any for statements
+such as ``CREATE INDEX CONCURRENTLY``.
+"""
+from typing import NamedTuple
+
+
+class OnlineStep(NamedTuple):
+    sql: str
+    # Run with %(after)s set to the key its single result column returned last time,
+    # starting from 0, until it returns NULL.
+    batched: bool = False
+    # Run outside a transaction, as CREATE INDEX CONCURRENTLY requires.
+    autocommit: bool = False
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    up: str
+    down: str
+    online: tuple = ()
+
+
+MIGRATIONS = [
+    Migration(1, "initial_schema", up="""
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGSERIAL PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            is_admin BOOLEAN NOT NULL DEFAULT FALSE
+        );
+        CREATE TABLE IF NOT EXISTS groups (
+            id BIGSERIAL PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS group_members (
+            group_id BIGINT NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+            user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            PRIMARY KEY (group_id, user_id)
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id BIGSERIAL PRIMARY KEY,
+            group_id BIGINT NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+            user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            content TEXT NOT NULL,
+            likes INTEGER NOT NULL DEFAULT 0
+        );
+    """, down="""
+        DROP TABLE IF EXISTS messages;
+        DROP TABLE IF EXISTS group_members;
+        DROP TABLE IF EXISTS groups;
+        DROP TABLE IF EXISTS users;
+    """),
+    # Message history pages by (group_id, id); the member primary key leads with group_id,
+    # so deleting a user needs its own index on user_id, as do messages for the same reason.
+    Migration(2, "hot_path_indexes", up="""
+        CREATE INDEX IF NOT EXISTS messages_group_id_id_idx ON messages (group_id, id);
+        CREATE INDEX IF NOT EXISTS messages_user_id_idx ON messages (user_id);
+        CREATE INDEX IF NOT EXISTS group_members_user_id_idx ON group_members (user_id);
+    """, down="""
+        DROP INDEX IF EXISTS group_members_user_id_idx;
+        DROP INDEX IF EXISTS messages_user_id_idx;
+        DROP INDEX IF EXISTS messages_group_id_id_idx;
+    """),
+    Migration(3, "message_likes", up="""
+        CREATE TABLE IF NOT EXISTS message_likes (
+            message_id BIGINT NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+            user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            PRIMARY KEY (message_id, user_id)
+        );
+        CREATE INDEX IF NOT EXISTS message_likes_user_id_idx ON message_likes (user_id);
+    """, down="""
+        DROP TABLE IF EXISTS message_likes;
+    """),
+    # Used by the postgres revocation backend, which relies on this migration for its table.
+    Migration(4, "revoked_tokens", up="""
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            seq BIGSERIAL PRIMARY KEY,
+            token_hash TEXT NOT NULL UNIQUE,
+            expires_at DOUBLE PRECISION NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS revoked_tokens_expires_at_idx ON revoked_tokens (expires_at);
+    """, down="""
+        DROP TABLE IF EXISTS revoked_tokens;
+    """),
+    # A trigger keeps the column up to date, so no write path has to maintain it. Adding a
+    # nullable column is instant; existing rows are filled in batches and the index is built
+    # without blocking writes, so messages stay writable throughout.
+    Migration(5, "message_search", up="""
+        ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector;
+        CREATE OR REPLACE FUNCTION messages_content_tsv() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.content_tsv := to_tsvector('simple'::regconfig, NEW.content);
+            RETURN NEW;
+        END
+        $$;
+        DROP TRIGGER IF EXISTS messages_content_tsv ON messages;
+        CREATE TRIGGER messages_content_tsv BEFORE INSERT OR UPDATE OF content ON messages
+            FOR EACH ROW EXECUTE FUNCTION messages_content_tsv();
+    """, down="""
+        DROP INDEX IF EXISTS messages_content_tsv_idx;
+        DROP TRIGGER IF EXISTS messages_content_tsv ON messages;
+        DROP FUNCTION IF EXISTS messages_content_tsv();
+        ALTER TABLE messages DROP COLUMN IF EXISTS content_tsv;
+    """, online=(
+        OnlineStep("""
+            WITH batch AS (
+                SELECT id FROM messages WHERE id > %(after)s ORDER BY id LIMIT 5000
+            ), filled AS (
+                UPDATE messages m SET content_tsv = to_tsvector('simple'::regconfig, m.content)
+                FROM batch WHERE m.id = batch.id AND m.content_tsv IS NULL
+            )
+            SELECT max(id) FROM batch
+        """, batched=True),
+        # A build interrupted earlier leaves an invalid index behind.
+        OnlineStep("DROP INDEX CONCURRENTLY IF EXISTS messages_content_tsv_idx", autocommit=True),
+        OnlineStep("CREATE INDEX CONCURRENTLY messages_content_tsv_idx ON messages USING GIN (content_tsv)", autocommit=True),
+    )),
+    # Existing members start with everything read, so the upgrade does not light up badges
+    # for the whole history; members added later start at 0. Adding the column with a
+    # constant default is instant; markers are then moved a few groups at a time, so
+    # memberships stay writable throughout. Members who join while that runs also start with
+    # everything read.
+    Migration(6, "read_markers", up="""
+        ALTER TABLE group_members ADD COLUMN IF NOT EXISTS last_read_id BIGINT NOT NULL DEFAULT 0;
+    """, down="""
+        ALTER TABLE group_members DROP COLUMN IF EXISTS last_read_id;
+    """, online=(
+        OnlineStep("""
+            WITH batch AS (
+                SELECT id FROM groups WHERE id > %(after)s ORDER BY id LIMIT 100
+            ), newest AS (
+                SELECT b.id AS group_id, (SELECT max(m.id) FROM messages m WHERE m.group_id = b.id) AS id FROM batch b
+            ), filled AS (
+                UPDATE group_members gm SET last_read_id = newest.id
+                FROM newest WHERE gm.group_id = newest.group_id AND newest.id IS NOT NULL AND gm.last_read_id = 0
+            )
+            SELECT max(id) FROM batch
+        """, batched=True),
+    )),
+    # File contents live in the blob store under their SHA-256; rows only reference them.
+    Migration(7, "attachments", up="""
+        CREATE TABLE IF NOT EXISTS attachments (
+            id BIGSERIAL PRIMARY KEY,
+            group_id BIGINT NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+            user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            message_id BIGINT REFERENCES messages (id) ON DELETE CASCADE,
+            sha256 TEXT NOT NULL,
+            size BIGINT NOT NULL,
+            content_type TEXT NOT NULL,
+            filename TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS attachments_message_id_idx ON attachments (message_id);
+        CREATE INDEX IF NOT EXISTS attachments_group_id_idx ON attachments (group_id);
+        CREATE INDEX IF NOT EXISTS attachments_user_id_idx ON attachments (user_id);
+    """, down="""
+        DROP TABLE IF EXISTS attachments;
+    """),
+    # Versions of the group listings, drawn from one sequence so that an ETag is never reused.
+    # group_id 0 is the version of the listing of all groups; there is no foreign key, so the
+    # version of a deleted group outlives it.
+    Migration(8, "group_versions", up="""
+        CREATE SEQUENCE IF NOT EXISTS group_version_seq;
+        CREATE TABLE IF NOT EXISTS group_versions (
+            group_id BIGINT PRIMARY KEY,
+            version BIGINT NOT NULL
+        );
+    """, down="""
+        DROP TABLE IF EXISTS group_versions;
+        DROP SEQUENCE IF EXISTS group_version_seq;
+    """),
+    # Deleting attachment rows, directly or by cascade from their message or group, records
+    # their blobs in unreferenced_blobs, so the reaper only checks those instead of listing
+    # the blob store. Existing attachments get the time of the migration as created_at.
+    Migration(9, "attachment_reaping", up="""
+        ALTER TABLE attachments ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now();
+        CREATE INDEX IF NOT EXISTS attachments_unsent_created_at_idx ON attachments (created_at) WHERE message_id IS NULL;
+        CREATE INDEX IF NOT EXISTS attachments_sha256_idx ON attachments (sha256);
+        CREATE TABLE IF NOT EXISTS unreferenced_blobs (
+            sha256 TEXT PRIMARY KEY,
+            since TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE OR REPLACE FUNCTION attachments_deleted() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO unreferenced_blobs (sha256) SELECT DISTINCT sha256 FROM deleted ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END
+        $$;
+        DROP TRIGGER IF EXISTS attachments_deleted ON attachments;
+        CREATE TRIGGER attachments_deleted AFTER DELETE ON attachments REFERENCING OLD TABLE AS deleted
+            FOR EACH STATEMENT EXECUTE FUNCTION attachments_deleted();
+    """, down="""
+        DROP TRIGGER IF EXISTS attachments_deleted ON attachments;
+        DROP FUNCTION IF EXISTS attachments_deleted();
+        DROP TABLE IF EXISTS unreferenced_blobs;
+        DROP INDEX IF EXISTS attachments_sha256_idx;
+        DROP INDEX IF EXISTS attachments_unsent_created_at_idx;
+        ALTER TABLE attachments DROP COLUMN IF EXISTS created_at;
+    """),
+]
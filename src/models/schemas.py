@@ -4,7 +4,7 @@ Schema definitions for the Group Chat API.
 This module contains Pydantic models used for data validation and serialization.
 """
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class UserIn(BaseModel):
@@ -29,9 +29,26 @@ class Group(BaseModel):
     name: str
     members: List[User]
 
+class GroupSummary(BaseModel):
+    """Schema for group output with a member count instead of the member list."""
+    id: int
+    name: str
+    member_count: int
+
+class MemberAddResult(BaseModel):
+    """Schema for the outcome of adding one user to a group."""
+    user_id: int
+    status: Literal["added", "already_member", "unknown_user"]
+
+class MembersAdded(BaseModel):
+    """Schema for the outcome of adding users to a group."""
+    message: str
+    results: List[MemberAddResult]
+
 class MessageIn(BaseModel):
-    """Schema for message input when creating a message."""
+    """Schema for message input when creating a message; attachments must be uploaded to the group first."""
     content: str
+    attachment_ids: List[int] = []
 
 class Message(BaseModel):
     """Schema for message output."""
@@ -39,6 +56,32 @@ class Message(BaseModel):
     group_id: int
     content: str
     likes: int = 0
+    attachment_ids: List[int] = []
+
+class Attachment(BaseModel):
+    """Schema for an uploaded file; its content is downloaded separately."""
+    id: int
+    group_id: int
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+
+class ReadMarkerIn(BaseModel):
+    """Schema for moving a read marker; without a message ID the whole group is marked read."""
+    message_id: Optional[int] = None
+
+class ReadMarker(BaseModel):
+    """Schema for a user's read position in a group."""
+    group_id: int
+    last_read_id: int
+
+class UnreadCount(BaseModel):
+    """Schema for the unread messages of one group; capped means there are at least ``unread``."""
+    group_id: int
+    last_read_id: int
+    unread: int
+    capped: bool
 
 class Token(BaseModel):
     """Schema for authentication token."""
@@ -0,0 +1,69 @@
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import FileResponse
+from src.utils.db_util import acquire_db
+from src.services.auth_service import get_current_user, get_token_subject, oauth2_scheme
+from src.services.admission_service import admitted
+from src.services.membership_service import require_group_member
+from src.services.attachment_service import ATTACHMENT_ACCEL_REDIRECT, BLOB_STORE, upload_attachment, get_attachment
+from src.models.schemas import Attachment
+
+router = APIRouter()
+
+@router.post("/groups/{group_id}/attachments", response_model=Attachment, status_code=201)
+async def upload_attachment_route(group_id: int, request: Request, token: str = Depends(oauth2_scheme)):
+    """
+    Upload a file to a group, to be attached to a message by sending its ID in attachment_ids.
+
+    The body is streamed to storage as it arrives; no database connection is held while it
+    is received. Admission control covers the checks before the transfer, so a slow upload
+    does not hold a slot shared with other writes; uploads have their own limit.
+
+    Args:
+        group_id (int): The ID of the group the file is uploaded to.
+        request (Request): The multipart/form-data request, with the file in its ``file`` field.
+        token (str): The access token, automatically injected by dependency.
+
+    Returns:
+        Attachment: The uploaded file's ID, name, content type, size and SHA-256.
+
+    Raises:
+        HTTPException: If the user is not a member of the group, the body is not a valid upload,
+        the file is too large, the user is rate limited, or too many uploads are in progress.
+    """
+    async with admitted(await get_token_subject(token), "upload_attachment"):
+        async with acquire_db() as db:
+            current_user = await get_current_user(token, db)
+            await require_group_member(group_id, current_user.id, db)
+    return await upload_attachment(group_id, request, current_user)
+
+@router.get("/attachments/{attachment_id}", response_class=FileResponse)
+async def download_attachment_route(attachment_id: int, token: str = Depends(oauth2_scheme)):
+    """
+    Download an attachment's content.
+
+    Range requests are supported. The file is sent with sendfile where the server supports
+    it or, with ATTACHMENT_ACCEL_REDIRECT set, by the reverse proxy in front of the app.
+
+    Args:
+        attachment_id (int): The ID of the attachment.
+        token (str): The access token, automatically injected by dependency.
+
+    Returns:
+        FileResponse: The file, as a download.
+
+    Raises:
+        HTTPException: If the attachment is not found or the user is not a member of its group.
+    """
+    async with acquire_db() as db:
+        current_user = await get_current_user(token, db)
+        attachment = await get_attachment(attachment_id, current_user, db)
+    headers = {
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(attachment.filename)}",
+        "ETag": f'"{attachment.sha256}"',
+        "X-Content-Type-Options": "nosniff",
+    }
+    if ATTACHMENT_ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = ATTACHMENT_ACCEL_REDIRECT.rstrip("/") + "/" + BLOB_STORE.relative_path(attachment.sha256)
+        return Response(media_type=attachment.content_type, headers=headers)
+    return FileResponse(BLOB_STORE.path(attachment.sha256), media_type=attachment.content_type, headers=headers)
@@ -2,9 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import timedelta
 from src.utils.db_util import get_db_connection
-from src.services.auth_service import create_access_token, get_current_user, BLACKLISTED_TOKENS
+from src.services.auth_service import create_access_token, get_current_user, get_user_credentials, revoke_token
+from src.utils.hash_util import verify_password
 from src.models.schemas import Token, User
-import bcrypt
 
 router = APIRouter()
 
@@ -20,18 +20,16 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get
         Token: An access token for the authenticated user.
 
     Raises:
-        HTTPException: If the credentials are invalid.
+        HTTPException: If the credentials are invalid, or 503 if the password hashing queue is full.
     """
-    with db.cursor() as cur:
-        cur.execute("SELECT id, username, password, is_admin FROM users WHERE username = %s", (form_data.username,))
-        user = cur.fetchone()
-        if not user or not bcrypt.checkpw(form_data.password.encode('utf-8'), user[2].encode('utf-8')):
-            raise HTTPException(status_code=401, detail="Incorrect username or password")
-        access_token_expires = timedelta(minutes=30)
-        access_token = create_access_token(
-            data={"sub": user[1], "is_admin": user[3]}, expires_delta=access_token_expires
-        )
-        return {"access_token": access_token, "token_type": "bearer"}
+    user = await get_user_credentials(form_data.username, db)
+    if not user or not await verify_password(form_data.password, user[2]):
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    access_token_expires = timedelta(minutes=30)
+    access_token = create_access_token(
+        data={"sub": user[1], "is_admin": user[3]}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/logout")
 async def logout(current_user: User = Depends(get_current_user), token: str = Depends(OAuth2PasswordBearer(tokenUrl="login"))):
@@ -45,5 +43,5 @@ async def logout(current_user: User = Depends(get_current_user), token: str = De
     Returns:
         dict: A message confirming successful logout.
     """
-    BLACKLISTED_TOKENS.add(token)
+    await revoke_token(token)
     return {"message": "Successfully logged out"}
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends
-from typing import List
+from fastapi import APIRouter, Depends, Query, Request
+from typing import List, Optional, Union
 from src.utils.db_util import get_db_connection
+from src.utils.replica_util import READ_DB_CONNECTION
+from src.utils.pagination_util import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, cursor_headers, next_page_cursor
+from src.utils.stream_util import FAST_SERIALIZATION, iter_json_array
 from src.services.auth_service import get_current_user
-from src.services.group_service import create_group, delete_group, list_groups, add_group_members
-from src.models.schemas import GroupIn, Group, User
+from src.services.admission_service import admission_control
+from src.services.version_service import ALL_GROUPS, cached_listing
+from src.services.group_service import (create_group, delete_group, list_groups, list_group_members, add_group_members,
+                                        encode_group_row, encode_group_summary_row, encode_user_row)
+from src.models.schemas import GroupIn, Group, GroupSummary, MembersAdded, User
 
 router = APIRouter()
 
-@router.post("/groups", response_model=Group)
+@router.post("/groups", response_model=Group, dependencies=[Depends(admission_control("create_group"))])
 async def create_group_route(group_in: GroupIn, current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
     """
     Create a new group.
@@ -25,7 +31,7 @@ async def create_group_route(group_in: GroupIn, current_user: User = Depends(get
     """
     return await create_group(group_in, current_user, db)
 
-@router.delete("/groups/{group_id}")
+@router.delete("/groups/{group_id}", dependencies=[Depends(admission_control("delete_group"))])
 async def delete_group_route(group_id: int, current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
     """
     Delete a group by its ID.
@@ -43,21 +49,70 @@ async def delete_group_route(group_id: int, current_user: User = Depends(get_cur
     """
     return await delete_group(group_id, current_user, db)
 
-@router.get("/groups", response_model=List[Group])
-async def list_groups_route(current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
+@router.get("/groups", response_model=Union[List[Group], List[GroupSummary]])
+async def list_groups_route(request: Request, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), summary: bool = False, current_user: User = Depends(get_current_user), db=Depends(READ_DB_CONNECTION)):
     """
-    List all groups.
+    List groups one page at a time.
+
+    Pages carry a strong ETag that changes whenever a group is created, deleted or gains
+    members, or a member's details change; a request with a matching If-None-Match header
+    is answered with 304 Not Modified.
 
     Args:
+        request (Request): The incoming request, for its If-None-Match header.
+        cursor (str, optional): The X-Next-Cursor header of the previous page.
+        limit (int): The maximum number of groups in the page.
+        summary (bool): Return member counts instead of member lists.
         current_user (User): The user requesting the list of groups, automatically injected by dependency.
         db: The database connection, automatically injected by dependency.
 
     Returns:
-        List[Group]: A list of groups with their IDs, names, and members.
+        List[Group]: A page of groups with their IDs, names, and members, or List[GroupSummary] with
+        member counts in summary mode, as a JSON array; X-Next-Cursor addresses the next page.
+
+    Raises:
+        HTTPException: If the cursor is invalid.
     """
-    return await list_groups(db)
+    async def build():
+        if FAST_SERIALIZATION:
+            rows = await list_groups(db, cursor, limit, summary, raw=True)
+            encode = encode_group_summary_row if summary else encode_group_row
+            return iter_json_array(rows, encode), cursor_headers(next_page_cursor(rows, limit, key=0))
+        groups = await list_groups(db, cursor, limit, summary)
+        return iter_json_array(groups), cursor_headers(next_page_cursor(groups, limit))
+    return await cached_listing(request, ALL_GROUPS, ("groups", cursor, limit, summary), db, build)
+
+@router.get("/groups/{group_id}/members", response_model=List[User])
+async def list_group_members_route(request: Request, group_id: int, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), current_user: User = Depends(get_current_user), db=Depends(READ_DB_CONNECTION)):
+    """
+    List a group's members one page at a time.
+
+    Pages carry a strong ETag that changes with the group's membership; a request with a
+    matching If-None-Match header is answered with 304 Not Modified.
+
+    Args:
+        request (Request): The incoming request, for its If-None-Match header.
+        group_id (int): The ID of the group.
+        cursor (str, optional): The X-Next-Cursor header of the previous page.
+        limit (int): The maximum number of members in the page.
+        current_user (User): The user requesting the members, automatically injected by dependency.
+        db: The database connection, automatically injected by dependency.
+
+    Returns:
+        List[User]: A page of members as a JSON array; X-Next-Cursor addresses the next page.
 
-@router.post("/groups/{group_id}/members")
+    Raises:
+        HTTPException: If the cursor is invalid.
+    """
+    async def build():
+        if FAST_SERIALIZATION:
+            rows = await list_group_members(group_id, db, cursor, limit, raw=True)
+            return iter_json_array(rows, encode_user_row), cursor_headers(next_page_cursor(rows, limit, key=0))
+        members = await list_group_members(group_id, db, cursor, limit)
+        return iter_json_array(members), cursor_headers(next_page_cursor(members, limit))
+    return await cached_listing(request, group_id, ("members", cursor, limit), db, build)
+
+@router.post("/groups/{group_id}/members", response_model=MembersAdded, dependencies=[Depends(admission_control("add_group_members"))])
 async def add_group_members_route(group_id: int, member_ids: List[int], current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
     """
     Add members to a group.
@@ -69,7 +124,8 @@ async def add_group_members_route(group_id: int, member_ids: List[int], current_
         db: The database connection, automatically injected by dependency.
 
     Returns:
-        dict: A success message indicating that members have been added.
+        MembersAdded: A success message and, for each requested user ID, whether it was added,
+        already a member, or not a known user.
 
     Raises:
         HTTPException: If the user is not a member of the group.
@@ -0,0 +1,38 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from src.utils.db_util import get_pool
+from src.utils.lifecycle_util import READINESS
+
+router = APIRouter()
+
+@router.get("/health")
+async def health_route():
+    """
+    Report that the API process is alive.
+
+    Returns:
+        dict: A static status payload.
+    """
+    return {"status": "ok"}
+
+@router.get("/health/ready")
+async def readiness_route():
+    """
+    Report whether this worker has warmed up and is not shutting down.
+
+    Returns:
+        JSONResponse: 200 with the warm-up time when the worker should receive traffic, 503 otherwise.
+    """
+    if not READINESS.ready:
+        return JSONResponse({"status": "unavailable"}, status_code=503)
+    return {"status": "ready", "ready_after": READINESS.ready_after}
+
+@router.get("/health/db")
+async def db_health_route():
+    """
+    Report connection pool statistics, used to size the pool.
+
+    Returns:
+        dict: In-use, idle and waiting connection counts along with acquire wait times.
+    """
+    return get_pool().stats()
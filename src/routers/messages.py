@@ -1,12 +1,23 @@
-from fastapi import APIRouter, Depends
-from src.utils.db_util import get_db_connection
-from src.services.auth_service import get_current_user
-from src.services.message_service import send_group_message, like_message
+from fastapi import APIRouter, Body, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import Annotated, List, Literal, Optional
+from src.utils.db_util import get_db_connection, acquire_db
+from src.utils.replica_util import READ_DB_CONNECTION
+from src.utils.pagination_util import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, cursor_headers
+from src.utils.stream_util import FAST_SERIALIZATION, encode_item, json_array_response
+from src.utils.request_util import BodyLimitRoute, max_body_size
+from src.services.auth_service import get_current_user, oauth2_scheme
+from src.services.admission_service import admission_control
+from src.services.membership_service import require_group_member
+from src.services.export_service import EXPORT_MEDIA_TYPES, iter_group_export
+from src.services.message_service import (send_group_message, send_group_messages, like_message, list_group_messages,
+                                          search_group_messages, encode_message_row, MESSAGE_BATCH_MAX_BODY_BYTES,
+                                          MESSAGE_BATCH_MAX_COUNT, SEARCH_QUERY_MAX_LENGTH)
 from src.models.schemas import MessageIn, Message, User
 
-router = APIRouter()
+router = APIRouter(route_class=BodyLimitRoute)
 
-@router.post("/groups/{group_id}/messages", response_model=Message)
+@router.post("/groups/{group_id}/messages", response_model=Message, dependencies=[Depends(admission_control("send_group_message"))])
 async def send_group_message_route(group_id: int, message_in: MessageIn, current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
     """
     Send a message to a specific group.
@@ -25,7 +36,104 @@ async def send_group_message_route(group_id: int, message_in: MessageIn, current
     """
     return await send_group_message(group_id, message_in, current_user, db)
 
-@router.post("/messages/{message_id}/likes")
+@router.post("/groups/{group_id}/messages:batch", response_model=List[Message], dependencies=[Depends(admission_control("send_group_messages"))])
+@max_body_size(MESSAGE_BATCH_MAX_BODY_BYTES)
+async def send_group_messages_route(group_id: int, messages_in: Annotated[List[MessageIn], Body(max_length=MESSAGE_BATCH_MAX_COUNT)],
+                                    current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
+    """
+    Send several messages to a specific group in one request.
+
+    A body longer than MESSAGE_BATCH_MAX_BODY_BYTES is rejected while it is read, before it
+    is parsed.
+
+    Args:
+        group_id (int): The ID of the group to which the messages are being sent.
+        messages_in (List[MessageIn]): The messages to send, in order.
+        current_user (User): The user sending the messages, automatically injected by dependency.
+        db: The database connection, automatically injected by dependency.
+
+    Returns:
+        List[Message]: The newly created messages, in the order they were sent.
+
+    Raises:
+        HTTPException: If the batch is empty or exceeds the size limits, the user is not a member
+        of the group, or there is a database error.
+    """
+    return await send_group_messages(group_id, messages_in, current_user, db)
+
+@router.get("/groups/{group_id}/messages", response_model=List[Message])
+async def list_group_messages_route(group_id: int, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), current_user: User = Depends(get_current_user), db=Depends(READ_DB_CONNECTION)):
+    """
+    List a group's messages, newest first, one page at a time.
+
+    Args:
+        group_id (int): The ID of the group whose messages are listed.
+        cursor (str, optional): The X-Next-Cursor (older messages) or X-Prev-Cursor (newer messages) header of a previous page.
+        limit (int): The maximum number of messages in the page.
+        current_user (User): The user listing the messages, automatically injected by dependency.
+        db: The database connection, automatically injected by dependency.
+
+    Returns:
+        List[Message]: The page of messages, streamed as a JSON array. The X-Next-Cursor and
+        X-Prev-Cursor response headers address the neighbouring pages.
+
+    Raises:
+        HTTPException: If the cursor is invalid or the user is not a member of the group.
+    """
+    messages, next_cursor, prev_cursor = await list_group_messages(group_id, current_user, db, cursor, limit, raw=FAST_SERIALIZATION)
+    return json_array_response(messages, headers=cursor_headers(next_cursor, prev_cursor),
+                               encode=encode_message_row if FAST_SERIALIZATION else encode_item)
+
+@router.get("/groups/{group_id}/messages/search", response_model=List[Message])
+async def search_group_messages_route(group_id: int, q: str = Query(..., min_length=1, max_length=SEARCH_QUERY_MAX_LENGTH), cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), current_user: User = Depends(get_current_user), db=Depends(READ_DB_CONNECTION)):
+    """
+    Search a group's messages, best match first, one page at a time.
+
+    Args:
+        group_id (int): The ID of the group whose messages are searched.
+        q (str): The search terms; quoted phrases, "or" and "-word" are supported.
+        cursor (str, optional): The X-Next-Cursor header of a previous page.
+        limit (int): The maximum number of messages in the page.
+        current_user (User): The user searching the messages, automatically injected by dependency.
+        db: The database connection, automatically injected by dependency.
+
+    Returns:
+        List[Message]: The page of matching messages, streamed as a JSON array. The
+        X-Next-Cursor response header addresses the next page.
+
+    Raises:
+        HTTPException: If the cursor is invalid or the user is not a member of the group.
+    """
+    messages, next_cursor = await search_group_messages(group_id, q, current_user, db, cursor, limit, raw=FAST_SERIALIZATION)
+    return json_array_response(messages, headers=cursor_headers(next_cursor),
+                               encode=encode_message_row if FAST_SERIALIZATION else encode_item)
+
+@router.get("/groups/{group_id}/export")
+async def export_group_messages_route(group_id: int, format: Literal["ndjson", "csv"] = "ndjson", token: str = Depends(oauth2_scheme)):
+    """
+    Export a group's whole message history, oldest first.
+
+    Authorization uses a connection only briefly; the export itself streams in batches and
+    holds at most one batch in memory, however long the history is.
+
+    Args:
+        group_id (int): The ID of the group to export.
+        format (str): ``ndjson`` for one JSON object per line, or ``csv`` with a header row.
+        token (str): The access token, automatically injected by dependency.
+
+    Returns:
+        StreamingResponse: The messages' id, user_id, username, content and likes, as an attachment.
+
+    Raises:
+        HTTPException: If the user is not authenticated or not a member of the group.
+    """
+    async with acquire_db() as db:
+        current_user = await get_current_user(token, db)
+        await require_group_member(group_id, current_user.id, db)
+    headers = {"Content-Disposition": f'attachment; filename="group-{group_id}-messages.{format}"'}
+    return StreamingResponse(iter_group_export(group_id, format), media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
+
+@router.post("/messages/{message_id}/likes", dependencies=[Depends(admission_control("like_message"))])
 async def like_message_route(message_id: int, current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
     """
     Like a specific message.
@@ -0,0 +1,43 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from src.utils.db_util import get_pool, run_db
+from src.utils.hash_util import HASHING_POOL
+from src.utils.metrics_util import REGISTRY
+from src.services.auth_service import REVOCATION_STORE
+from src.services.admission_service import LOAD_SHEDDER
+
+router = APIRouter()
+
+DB_POOL_CONNECTIONS = REGISTRY.gauge("db_pool_connections", "Open pooled database connections by state.", ("state",))
+DB_POOL_WAITERS = REGISTRY.gauge("db_pool_waiters", "Requests waiting for a database connection.")
+DB_POOL_MAX_SIZE = REGISTRY.gauge("db_pool_max_connections", "Upper bound on pooled database connections.")
+DB_POOL_ACQUIRED = REGISTRY.counter("db_pool_acquired_total", "Connections checked out of the pool.")
+DB_POOL_TIMEOUTS = REGISTRY.counter("db_pool_timeouts_total", "Checkouts that gave up waiting for a connection.")
+DB_POOL_WAIT = REGISTRY.counter("db_pool_wait_seconds_total", "Time spent waiting for pooled connections.")
+REVOKED_TOKENS = REGISTRY.gauge("revoked_tokens", "Revoked tokens held by the revocation store, including expired ones not yet purged.")
+BCRYPT_PENDING = REGISTRY.gauge("bcrypt_pending", "Password hashes running or queued on the hashing pool.")
+BCRYPT_REJECTED = REGISTRY.counter("bcrypt_rejected_total", "Password hashes shed because the hashing queue was full.")
+ADMISSION_IN_FLIGHT = REGISTRY.gauge("admission_in_flight", "Write requests admitted and still running on this worker.")
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_route():
+    """
+    Expose request, query, connection pool, revocation, password hashing and admission metrics.
+
+    Returns:
+        PlainTextResponse: The metrics in the Prometheus text exposition format.
+    """
+    pool = get_pool().stats()
+    DB_POOL_CONNECTIONS.set(pool["in_use"], "in_use")
+    DB_POOL_CONNECTIONS.set(pool["idle"], "idle")
+    DB_POOL_WAITERS.set(pool["waiters"])
+    DB_POOL_MAX_SIZE.set(pool["max_size"])
+    DB_POOL_ACQUIRED.set(pool["acquired_total"])
+    DB_POOL_TIMEOUTS.set(pool["timeouts_total"])
+    DB_POOL_WAIT.set(pool["wait_seconds_total"])
+    REVOKED_TOKENS.set(await run_db(REVOCATION_STORE.size))
+    hashing = HASHING_POOL.stats()
+    BCRYPT_PENDING.set(hashing["pending"])
+    BCRYPT_REJECTED.set(hashing["rejected_total"])
+    ADMISSION_IN_FLIGHT.set(LOAD_SHEDDER.in_flight)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
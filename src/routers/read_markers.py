@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends
+from typing import List
+from src.utils.db_util import get_db_connection
+from src.utils.replica_util import READ_DB_CONNECTION
+from src.services.auth_service import get_current_user
+from src.services.admission_service import admission_control
+from src.services.read_marker_service import mark_group_read, list_unread_counts
+from src.models.schemas import ReadMarkerIn, ReadMarker, UnreadCount, User
+
+router = APIRouter()
+
+@router.put("/groups/{group_id}/read", response_model=ReadMarker, dependencies=[Depends(admission_control("mark_group_read"))])
+async def mark_group_read_route(group_id: int, marker_in: ReadMarkerIn = ReadMarkerIn(), current_user: User = Depends(get_current_user), db=Depends(get_db_connection)):
+    """
+    Mark a group's messages read up to a message, or all of them.
+
+    Args:
+        group_id (int): The ID of the group.
+        marker_in (ReadMarkerIn): The newest message read; omit the body to mark every message read.
+        current_user (User): The user reading the group, automatically injected by dependency.
+        db: The database connection, automatically injected by dependency.
+
+    Returns:
+        ReadMarker: The user's read position in the group.
+
+    Raises:
+        HTTPException: If the user is not a member of the group or if there is a database error.
+    """
+    return await mark_group_read(group_id, marker_in.message_id, current_user, db)
+
+@router.get("/me/unread", response_model=List[UnreadCount])
+async def list_unread_counts_route(current_user: User = Depends(get_current_user), db=Depends(READ_DB_CONNECTION)):
+    """
+    Count the current user's unread messages per group.
+
+    Args:
+        current_user (User): The user whose unread messages are counted, automatically injected by dependency.
+        db: The database connection, automatically injected by dependency.
+
+    Returns:
+        List[UnreadCount]: One entry per group with unread messages. Counts stop at
+        UNREAD_COUNT_CAP, in which case capped is true.
+    """
+    return await list_unread_counts(current_user, db)
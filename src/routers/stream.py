@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from src.utils.db_util import acquire_db
+from src.services.auth_service import get_current_user
+from src.services.membership_service import require_group_member
+from src.services.stream_service import BROKER
+
+router = APIRouter()
+
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv('STREAM_HEARTBEAT_INTERVAL', '15'))
+
+@router.websocket("/groups/{group_id}/stream")
+async def group_stream_websocket_route(websocket: WebSocket, group_id: int, token: Optional[str] = None):
+    """
+    Stream a group's new messages and like counts over a WebSocket.
+
+    Args:
+        websocket (WebSocket): The client connection.
+        group_id (int): The ID of the group to follow.
+        token (str, optional): The access token, for clients that cannot send an Authorization header.
+
+    Each event is sent as a JSON text frame. The socket is closed with code 1008 if the user is
+    not authenticated or not a member of the group, and with code 1013 if the client falls too
+    far behind the stream.
+    """
+    try:
+        await _authorize(group_id, token or _bearer_token(websocket.headers.get("authorization")))
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    await websocket.accept()
+    subscription = BROKER.subscribe(group_id)
+
+    async def forward():
+        async for event in subscription:
+            await websocket.send_json(event)
+        if subscription.evicted:
+            await websocket.close(code=1013, reason="Client is too slow")
+
+    async def receive():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.ensure_future(forward()), asyncio.ensure_future(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
+
+@router.get("/groups/{group_id}/stream")
+async def group_stream_sse_route(group_id: int, request: Request, token: Optional[str] = None):
+    """
+    Stream a group's new messages and like counts as server-sent events, for clients without WebSockets.
+
+    Args:
+        group_id (int): The ID of the group to follow.
+        request (Request): The client request, carrying the Authorization header.
+        token (str, optional): The access token, for clients such as EventSource that cannot send headers.
+
+    Returns:
+        StreamingResponse: A text/event-stream with one ``data:`` line per event and periodic
+        keep-alive comments. An ``evicted`` event ends the stream if the client falls too far behind.
+
+    Raises:
+        HTTPException: If the user is not authenticated or not a member of the group.
+    """
+    await _authorize(group_id, token or _bearer_token(request.headers.get("authorization")))
+    subscription = BROKER.subscribe(group_id)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_server_sent_events(subscription), media_type="text/event-stream", headers=headers)
+
+async def _authorize(group_id: int, token: Optional[str]):
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    async with acquire_db() as db:
+        current_user = await get_current_user(token, db)
+        await require_group_member(group_id, current_user.id, db)
+    return current_user
+
+def _bearer_token(authorization: Optional[str]) -> Optional[str]:
+    scheme, _, credentials = (authorization or "").partition(" ")
+    return credentials if scheme.lower() == "bearer" and credentials else None
+
+async def _server_sent_events(subscription):
+    try:
+        while True:
+            try:
+                event = await subscription.next(STREAM_HEARTBEAT_INTERVAL)
+            except StopAsyncIteration:
+                if subscription.evicted:
+                    yield b"event: evicted\ndata: {}\n\n"
+                return
+            if event is None:
+                yield b": keep-alive\n\n"
+            else:
+                yield b"data: " + json.dumps(event, separators=(",", ":")).encode('utf-8') + b"\n\n"
+    finally:
+        subscription.close()
@@ -8,7 +8,7 @@ router = APIRouter()
 
 @router.post("/users", response_model=User)
 async def create_user_route(user_in: UserIn, current_user: User = Depends(get_current_admin_user), db=Depends(get_db_connection)):
-     """
+    """
     Create a new user.
 
     Args:
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+from fastapi import HTTPException
+from src.utils.blob_util import BlobStore
+from src.utils.db_util import acquire_db, get_pool, run_db, fetch_one
+from src.utils.ratelimit_util import LoadShedder
+from src.utils.query_util import (INSERT_ATTACHMENT, SELECT_ATTACHMENT, DELETE_UNSENT_ATTACHMENTS, FORGET_REFERENCED_BLOBS,
+                                  SELECT_UNREFERENCED_BLOBS, DELETE_UNREFERENCED_BLOB)
+from src.utils.upload_util import receive_file
+from src.services.membership_service import require_group_member
+from src.models.schemas import Attachment, User
+
+ATTACHMENT_STORE_PATH = os.getenv('ATTACHMENT_STORE_PATH', '/tmp/chat-api-attachments')
+ATTACHMENT_MAX_BYTES = int(os.getenv('ATTACHMENT_MAX_BYTES', str(25 * 1024 * 1024)))
+ATTACHMENT_ACCEL_REDIRECT = os.getenv('ATTACHMENT_ACCEL_REDIRECT', '')
+ATTACHMENT_UPLOADS_MAX_IN_FLIGHT = int(os.getenv('ATTACHMENT_UPLOADS_MAX_IN_FLIGHT', '16'))
+ATTACHMENT_REAP_INTERVAL = float(os.getenv('ATTACHMENT_REAP_INTERVAL', '3600'))
+ATTACHMENT_UNSENT_MAX_AGE = float(os.getenv('ATTACHMENT_UNSENT_MAX_AGE', str(24 * 3600)))
+
+# Arbitrary key for pg_try_advisory_lock, so that one worker of the deployment reaps at a time.
+ATTACHMENT_REAP_LOCK_ID = 4170317
+# Arbitrary first key of the per-blob advisory locks, the second being hashtext(sha256).
+# Uploads commit a blob and record their attachment under a shared lock; the reaper checks
+# and removes an unreferenced blob under an exclusive one, so neither sees the other halfway.
+ATTACHMENT_BLOB_LOCK_CLASS = 4170318
+REAP_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE = BlobStore(ATTACHMENT_STORE_PATH)
+
+# Uploads last as long as their transfer, so they are limited apart from other writes.
+UPLOAD_SHEDDER = LoadShedder(ATTACHMENT_UPLOADS_MAX_IN_FLIGHT, 0, None)
+
+async def upload_attachment(group_id: int, request, current_user: User) -> Attachment:
+    """
+    Store a file uploaded to a group, to be attached to the user's next message there.
+
+    The body is streamed into the blob store, where a file identical to one already stored
+    takes no extra space. A connection is only checked out to store the blob and record the
+    attachment once the upload is complete. At most ATTACHMENT_UPLOADS_MAX_IN_FLIGHT uploads are received
+    at once per worker. The caller checks that the user belongs to the group.
+
+    :param group_id: The ID of the group the file is uploaded to.
+    :param request: The multipart request carrying the file.
+    :param current_user: The currently authenticated user.
+    :return: The new attachment.
+    :raises HTTPException: If the upload is malformed or too large, a database error occurs,
+        or too many uploads are in progress.
+    """
+    UPLOAD_SHEDDER.admit()
+    try:
+        received = await receive_file(request, BLOB_STORE, ATTACHMENT_MAX_BYTES)
+        params = (group_id, current_user.id, received.sha256, received.size, received.content_type, received.filename)
+        try:
+            async with acquire_db() as db:
+                row = await run_db(_insert_attachment, db, received.blob, params)
+        finally:
+            await run_db(received.blob.abort)
+    finally:
+        UPLOAD_SHEDDER.release()
+    return Attachment(id=row[0], group_id=group_id, filename=received.filename, content_type=received.content_type,
+                      size=received.size, sha256=received.sha256)
+
+def _insert_attachment(db, blob, params: tuple):
+    try:
+        with db.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock_shared(%s, hashtext(%s))", (ATTACHMENT_BLOB_LOCK_CLASS, blob.digest))
+            blob.commit()
+            cur.execute(INSERT_ATTACHMENT, params)
+            row = cur.fetchone()
+        db.commit()
+        return row
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+async def get_attachment(attachment_id: int, current_user: User, db) -> Attachment:
+    """
+    Look up an attachment the user may download.
+
+    :param attachment_id: The ID of the attachment.
+    :param current_user: The currently authenticated user.
+    :param db: The database connection.
+    :return: The attachment.
+    :raises HTTPException: If the attachment is not found or the user is not a member of its group.
+    """
+    row = await run_db(fetch_one, db, SELECT_ATTACHMENT, (attachment_id,))
+    if row is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    await require_group_member(row[0], current_user.id, db)
+    return Attachment(id=attachment_id, group_id=row[0], sha256=row[1], size=row[2], content_type=row[3], filename=row[4])
+
+class AttachmentReaper:
+    """
+    Deletes uploads never attached to a message, then the blobs no attachment references.
+
+    Every ``interval`` seconds, uploads older than ``max_age`` seconds are deleted in batches.
+    The blobs of every deleted attachment, including those deleted with their message or
+    group, are then unlinked unless an attachment references them again. Every worker runs
+    a reaper; an advisory lock lets one of them at a time do the work.
+    """
+
+    def __init__(self, store: BlobStore, interval: float = ATTACHMENT_REAP_INTERVAL, max_age: float = ATTACHMENT_UNSENT_MAX_AGE):
+        """
+        :param store: The blob store holding the attachments.
+        :param interval: Seconds between runs; 0 disables reaping.
+        :param max_age: Seconds after which an unsent upload is deleted.
+        """
+        self.store = store
+        self.interval = interval
+        self.max_age = max_age
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the background reaper is running."""
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start reaping periodically on the running event loop."""
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop reaping; a run in progress is abandoned and picked up by the next one."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def reap(self) -> tuple:
+        """
+        Run once, unless another worker is already reaping.
+
+        :return: The number of unsent uploads deleted and of blobs unlinked.
+        """
+        return await run_db(_reap, self.store, self.max_age)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                attachments, blobs = await self.reap()
+            except Exception:
+                logger.exception("Failed to reap attachments")
+                continue
+            if attachments or blobs:
+                logger.info("Deleted %d unsent attachments and %d unreferenced blobs", attachments, blobs)
+
+def _reap(store: BlobStore, max_age: float) -> tuple:
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (ATTACHMENT_REAP_LOCK_ID,))
+            locked = cur.fetchone()[0]
+        conn.commit()
+        if not locked:
+            return 0, 0
+        try:
+            return _delete_unsent_attachments(conn, max_age), _remove_unreferenced_blobs(conn, store)
+        finally:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (ATTACHMENT_REAP_LOCK_ID,))
+            conn.commit()
+    finally:
+        pool.putconn(conn)
+
+def _delete_unsent_attachments(conn, max_age: float) -> int:
+    total = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(DELETE_UNSENT_ATTACHMENTS, {"max_age": max_age, "limit": REAP_BATCH_SIZE})
+            deleted = cur.fetchone()[0]
+        conn.commit()
+        total += deleted
+        if deleted < REAP_BATCH_SIZE:
+            return total
+
+def _remove_unreferenced_blobs(conn, store: BlobStore) -> int:
+    with conn.cursor() as cur:
+        cur.execute(FORGET_REFERENCED_BLOBS)
+    conn.commit()
+    removed = 0
+    after = ""
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(SELECT_UNREFERENCED_BLOBS, {"after": after, "limit": REAP_BATCH_SIZE})
+            digests = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        for digest in digests:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (ATTACHMENT_BLOB_LOCK_CLASS, digest))
+                cur.execute(DELETE_UNREFERENCED_BLOB, {"sha256": digest})
+                if cur.fetchone() is not None:
+                    store.remove(digest)
+                    removed += 1
+            conn.commit()
+        if len(digests) < REAP_BATCH_SIZE:
+            return removed
+        after = digests[-1]
+
+ATTACHMENT_REAPER = AttachmentReaper(BLOB_STORE)
@@ -1,11 +1,15 @@
 import os
-from dotenv import load_dotenv
+import time
 import jwt
-import bcrypt
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from src.utils.db_util import get_db_connection
+from src.utils.db_util import acquire_db, run_db, fetch_one
+from src.utils.replica_util import READ_DB_CONNECTION, is_replica
+from src.utils.query_util import SELECT_AUTH_USER, SELECT_USER_BY_USERNAME
+from src.utils.cache_util import TTLCache
+from src.utils.notify_util import LISTENER, WORKER_ID, notify
+from src.utils.revocation_util import create_revocation_store
 from src.models.schemas import TokenData, User
 
 SECRET_KEY = os.getenv('SECRET_KEY')
@@ -14,7 +18,15 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-BLACKLISTED_TOKENS = set()
+REVOCATION_STORE = create_revocation_store()
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', '60'))
+
+# Maps a verified token to its resolved User. Entries never outlive the token's exp.
+TOKEN_CACHE = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+USER_CHANGED_CHANNEL = "user_changed"
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """
@@ -36,10 +48,68 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db_connection)):
+async def get_user_credentials(username: str, db):
+    """
+    Look up the stored credentials for a username.
+
+    Args:
+        username (str): The username to look up.
+        db: The database connection.
+
+    Returns:
+        tuple: The user's id, username, password hash and admin flag, or None if unknown.
+    """
+    return await run_db(fetch_one, db, SELECT_USER_BY_USERNAME, (username,))
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verify a token's signature and expiry, without looking the user up.
+
+    Args:
+        token (str): The JWT token.
+
+    Returns:
+        dict: The token's claims; ``sub`` is the username.
+
+    Raises:
+        HTTPException: If the token is invalid, expired or has no subject.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        payload = {}
+    if payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+async def get_token_subject(token: str = Depends(oauth2_scheme)) -> str:
+    """
+    Get the username a valid token was issued to, without a database connection.
+
+    The token may still be revoked or name a deleted user; get_current_user checks both.
+
+    Args:
+        token (str): The JWT token.
+
+    Returns:
+        str: The token's subject.
+
+    Raises:
+        HTTPException: If the token is invalid.
+    """
+    return decode_access_token(token)["sub"]
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(READ_DB_CONNECTION)):
     """
     Get the current authenticated user.
 
+    The user is looked up on a read replica when one is configured. A user the replica does
+    not know yet, such as one created moments ago, is looked up again on the primary.
+
     Args:
         token (str): The JWT token.
         db: The database connection.
@@ -56,26 +126,71 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_d
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    if token in BLACKLISTED_TOKENS:
+    if await REVOCATION_STORE.is_revoked(token):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        is_admin: bool = payload.get("is_admin", False)
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username, is_admin=is_admin)
-    except jwt.PyJWTError:
-        raise credentials_exception
-    
-    with db.cursor() as cur:
-        cur.execute("SELECT id, username, is_admin FROM users WHERE username = %s", (token_data.username,))
-        user = cur.fetchone()
-    
+
+    cached_user = TOKEN_CACHE.get(token)
+    if cached_user is not None:
+        return cached_user
+
+    payload = decode_access_token(token)
+    token_data = TokenData(username=payload["sub"], is_admin=payload.get("is_admin", False))
+
+    user = await run_db(fetch_one, db, SELECT_AUTH_USER, (token_data.username,))
+    if user is None and is_replica(db):
+        async with acquire_db() as primary:
+            user = await run_db(fetch_one, primary, SELECT_AUTH_USER, (token_data.username,))
     if user is None:
         raise credentials_exception
-    return User(id=user[0], username=user[1], is_admin=user[2])
+    current_user = User(id=user[0], username=user[1], is_admin=user[2])
+    expires_at = payload.get("exp")
+    TOKEN_CACHE.set(token, current_user, ttl=expires_at - time.time() if expires_at else None)
+    return current_user
+
+async def revoke_token(token: str):
+    """
+    Revoke a token on every worker until it expires and drop it from the token cache.
+
+    Args:
+        token (str): A JWT token that has already been verified.
+    """
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+    expires_at = payload.get("exp") or time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    await REVOCATION_STORE.revoke(token, expires_at)
+    invalidate_token(token)
+
+def invalidate_token(token: str):
+    """
+    Drop a token from the verified-token cache, e.g. on logout.
+
+    Args:
+        token (str): The JWT token.
+    """
+    TOKEN_CACHE.pop(token)
+
+def invalidate_user_tokens(user_id: int):
+    """
+    Drop every cached token that resolves to the given user, e.g. after the user is updated.
+
+    Args:
+        user_id (int): The ID of the user whose cached tokens should be dropped.
+    """
+    TOKEN_CACHE.discard_where(lambda user: user.id == user_id)
+
+def notify_user_changed(cur, user_id: int):
+    """
+    Tell other workers to drop the user's cached tokens once the cursor's transaction commits.
+
+    Args:
+        cur: A cursor of the transaction changing the user.
+        user_id (int): The ID of the user.
+    """
+    notify(cur, USER_CHANGED_CHANNEL, "%s:%s" % (WORKER_ID, user_id))
+
+def _on_user_changed(payload: str):
+    origin, user_id = payload.split(":")
+    if origin != WORKER_ID:
+        invalidate_user_tokens(int(user_id))
 
 async def get_current_admin_user(current_user: User = Depends(get_current_user)):
     """
@@ -93,3 +208,6 @@ async def get_current_admin_user(current_user: User = Depends(get_current_user))
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not authorized")
     return current_user
+
+LISTENER.subscribe(USER_CHANGED_CHANNEL, _on_user_changed)
+LISTENER.on_reconnect(TOKEN_CACHE.clear)
@@ -0,0 +1,98 @@
+import csv
+import io
+import os
+import threading
+from src.utils.db_util import get_pool
+from src.utils.query_util import EXPORT_MESSAGES_CURSOR, EXPORT_MESSAGES_BATCH, SELECT_NEWEST_MESSAGE_ID
+from src.utils.replica_util import DB_REPLICA_DSNS, get_router, is_replica
+from src.utils.stream_util import encode_json
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+EXPORT_REPLICA_CURSORS_MAX = int(os.getenv('EXPORT_REPLICA_CURSORS_MAX', '2'))
+
+EXPORT_COLUMNS = ("id", "user_id", "username", "content", "likes")
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+# A replica export holds its connection until the client has read everything, so only a few
+# may run at once per worker; the others page by keyset like on the primary.
+REPLICA_CURSORS = threading.BoundedSemaphore(max(EXPORT_REPLICA_CURSORS_MAX, 1))
+
+def iter_group_export(group_id: int, export_format: str = "ndjson", batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Yield a group's whole message history, oldest first, one encoded batch at a time.
+
+    Only one batch of rows is held in memory at a time. On a read replica the rows come
+    from a server-side cursor inside one transaction, which holds a replica connection
+    until the client has read everything; at most EXPORT_REPLICA_CURSORS_MAX such exports
+    run at once. Otherwise each batch is a separate keyset query on a primary connection
+    checked out just for it, so the export never holds a transaction, or a connection,
+    while the client is reading. Rows are bounded by the newest message when the export
+    started.
+
+    Blocking: meant to be iterated by a streaming response in a worker thread.
+
+    :param group_id: The ID of the group to export.
+    :param export_format: ``ndjson`` or ``csv``.
+    :param batch_size: The number of rows fetched from the database per round trip.
+    :return: A generator of byte chunks.
+    """
+    encode = _encode_csv if export_format == "csv" else _encode_ndjson
+    if export_format == "csv":
+        yield _encode_csv([EXPORT_COLUMNS])
+    if DB_REPLICA_DSNS and EXPORT_REPLICA_CURSORS_MAX > 0 and REPLICA_CURSORS.acquire(blocking=False):
+        try:
+            conn, pool = get_router().getconn()
+            try:
+                if is_replica(conn):
+                    yield from _iter_cursor(conn, group_id, encode, batch_size)
+                    return
+            finally:
+                pool.putconn(conn)
+        finally:
+            REPLICA_CURSORS.release()
+    yield from _iter_batches(group_id, encode, batch_size)
+
+def _iter_cursor(conn, group_id: int, encode, batch_size: int):
+    with conn.cursor(name=f"export_group_{group_id}") as cur:
+        cur.itersize = batch_size
+        cur.execute(EXPORT_MESSAGES_CURSOR, (group_id,))
+        batch = []
+        for row in cur:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield encode(batch)
+                batch = []
+        if batch:
+            yield encode(batch)
+    conn.rollback()
+
+def _iter_batches(group_id: int, encode, batch_size: int):
+    newest = _fetch_batch(SELECT_NEWEST_MESSAGE_ID, (group_id,))[0][0]
+    last_id = 0
+    while last_id < newest:
+        rows = _fetch_batch(EXPORT_MESSAGES_BATCH, (group_id, last_id, newest, batch_size))
+        if not rows:
+            return
+        yield encode(rows)
+        last_id = rows[-1][0]
+
+def _fetch_batch(query, params):
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        conn.rollback()
+        return rows
+    finally:
+        pool.putconn(conn)
+
+def _encode_ndjson(rows) -> bytes:
+    return b"".join(encode_json(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
@@ -1,7 +1,16 @@
+import os
 from fastapi import HTTPException
-from src.utils.db_util import get_db_connection
-from src.utils.query_util import INSERT_GROUP, INSERT_GROUP_MEMBER, SELECT_GROUP_MEMBER, DELETE_GROUP, SELECT_GROUPS
-from src.models.schemas import GroupIn, Group, User
+from src.utils.db_util import run_db, fetch_all
+from src.utils.query_util import (INSERT_GROUP, INSERT_GROUP_MEMBER, INSERT_GROUP_MEMBERS_BULK, DELETE_GROUP,
+                                  SELECT_GROUPS_PAGE, SELECT_GROUP_SUMMARIES_PAGE, SELECT_GROUP_MEMBERS_PAGE)
+from src.utils.pagination_util import DEFAULT_PAGE_SIZE, decode_cursor
+from src.utils.stream_util import encode_json
+from src.utils.membership_util import MemberSet
+from src.services.membership_service import MEMBERSHIP_INDEX, require_group_member, notify_membership_changed
+from src.services.version_service import bump_group_versions, group_versions_changed
+from src.models.schemas import GroupIn, Group, GroupSummary, MemberAddResult, MembersAdded, User
+
+MEMBER_INSERT_CHUNK_SIZE = int(os.getenv('MEMBER_INSERT_CHUNK_SIZE', '1000'))
 
 async def create_group(group_in: GroupIn, current_user: User, db):
     """
@@ -12,12 +21,20 @@ async def create_group(group_in: GroupIn, current_user: User, db):
     :param db: The database connection.
     :return: The newly created group.
     """
+    new_group = await run_db(_insert_group, db, group_in.name, current_user.id)
+    MEMBERSHIP_INDEX.put(new_group[0], MemberSet([current_user.id]))
+    return Group(id=new_group[0], name=new_group[1], members=[current_user])
+
+def _insert_group(db, name: str, owner_id: int):
     with db.cursor() as cur:
-        cur.execute(INSERT_GROUP, (group_in.name,))
+        cur.execute(INSERT_GROUP, (name,))
         new_group = cur.fetchone()
-        cur.execute(INSERT_GROUP_MEMBER, (new_group[0], current_user.id))
+        cur.execute(INSERT_GROUP_MEMBER, (new_group[0], owner_id))
+        notify_membership_changed(cur, new_group[0])
+        versions = bump_group_versions(cur, [new_group[0]])
         db.commit()
-    return Group(id=new_group[0], name=new_group[1], members=[current_user])
+    group_versions_changed(versions)
+    return new_group
 
 async def delete_group(group_id: int, current_user: User, db):
     """
@@ -29,47 +46,130 @@ async def delete_group(group_id: int, current_user: User, db):
     :return: A message indicating the successful deletion of the group.
     :raises HTTPException: If the user is not a member of the group or the group is not found.
     """
+    await require_group_member(group_id, current_user.id, db)
+    try:
+        await run_db(_delete_group, db, group_id)
+    finally:
+        MEMBERSHIP_INDEX.invalidate(group_id)
+    return {"message": "Group deleted successfully"}
+
+def _delete_group(db, group_id: int):
     with db.cursor() as cur:
-        cur.execute(SELECT_GROUP_MEMBER, (group_id, current_user.id))
-        if not cur.fetchone():
-            raise HTTPException(status_code=403, detail="You are not a member of this group")
         cur.execute(DELETE_GROUP, (group_id,))
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="Group not found")
+        notify_membership_changed(cur, group_id)
+        versions = bump_group_versions(cur, [group_id])
         db.commit()
-    return {"message": "Group deleted successfully"}
+    group_versions_changed(versions)
 
-async def list_groups(db):
+async def list_groups(db, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, summary: bool = False, raw: bool = False):
     """
-    List all groups.
+    List one page of groups, ordered by ID.
 
     :param db: The database connection.
-    :return: A list of all groups.
+    :param cursor: An opaque cursor from a previous page, or None for the first page.
+    :param limit: The maximum number of groups to return.
+    :param summary: Return member counts instead of full member lists.
+    :param raw: Return the database rows, to be encoded with encode_group_row or encode_group_summary_row.
+    :return: A list of groups, or of group summaries if ``summary`` is set.
+    :raises HTTPException: If the cursor is invalid.
     """
-    with db.cursor() as cur:
-        cur.execute(SELECT_GROUPS)
-        groups = []
-        for row in cur.fetchall():
-            members = [User(id=id, username=username, is_admin=is_admin) for id, username, is_admin in zip(row[2], row[3], row[4]) if id is not None]
-            groups.append(Group(id=row[0], name=row[1], members=members))
+    after = decode_cursor(cursor).get("after", 0) if cursor else 0
+    if summary:
+        rows = await run_db(fetch_all, db, SELECT_GROUP_SUMMARIES_PAGE, (after, limit))
+        if raw:
+            return rows
+        return [GroupSummary(id=row[0], name=row[1], member_count=row[2]) for row in rows]
+    rows = await run_db(fetch_all, db, SELECT_GROUPS_PAGE, (after, limit))
+    if raw:
+        return rows
+    groups = []
+    for row in rows:
+        members = [User(id=id, username=username, is_admin=is_admin) for id, username, is_admin in zip(row[2], row[3], row[4]) if id is not None]
+        groups.append(Group(id=row[0], name=row[1], members=members))
     return groups
 
-async def add_group_members(group_id: int, member_ids: list[int], current_user: User, db):
+def encode_group_row(row) -> bytes:
+    """
+    Encode a SELECT_GROUPS_PAGE row as the JSON of the equivalent Group.
+
+    :param row: The database row.
+    :return: The JSON encoding.
+    """
+    members = [{"id": id, "username": username, "is_admin": is_admin}
+               for id, username, is_admin in zip(row[2], row[3], row[4]) if id is not None]
+    return encode_json({"id": row[0], "name": row[1], "members": members})
+
+def encode_group_summary_row(row) -> bytes:
+    """
+    Encode a SELECT_GROUP_SUMMARIES_PAGE row as the JSON of the equivalent GroupSummary.
+
+    :param row: The database row.
+    :return: The JSON encoding.
+    """
+    return encode_json({"id": row[0], "name": row[1], "member_count": row[2]})
+
+async def list_group_members(group_id: int, db, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, raw: bool = False):
+    """
+    List one page of a group's members, ordered by user ID.
+
+    :param group_id: The ID of the group.
+    :param db: The database connection.
+    :param cursor: An opaque cursor from a previous page, or None for the first page.
+    :param limit: The maximum number of members to return.
+    :param raw: Return the database rows, to be encoded with encode_user_row.
+    :return: A list of users.
+    :raises HTTPException: If the cursor is invalid.
+    """
+    after = decode_cursor(cursor).get("after", 0) if cursor else 0
+    rows = await run_db(fetch_all, db, SELECT_GROUP_MEMBERS_PAGE, (group_id, after, limit))
+    if raw:
+        return rows
+    return [User(id=row[0], username=row[1], is_admin=row[2]) for row in rows]
+
+def encode_user_row(row) -> bytes:
+    """
+    Encode a SELECT_GROUP_MEMBERS_PAGE row as the JSON of the equivalent User.
+
+    :param row: The database row.
+    :return: The JSON encoding.
+    """
+    return encode_json({"id": row[0], "username": row[1], "is_admin": row[2]})
+
+async def add_group_members(group_id: int, member_ids: list[int], current_user: User, db, chunk_size: int = MEMBER_INSERT_CHUNK_SIZE):
     """
     Add members to a group.
 
+    Members are inserted with one statement per chunk of ``chunk_size`` ids, each chunk in
+    its own transaction. Ids that are already members or do not belong to a user are skipped
+    rather than failing the whole request.
+
     :param group_id: The ID of the group to add members to.
     :param member_ids: The list of user IDs to add as members.
     :param current_user: The currently authenticated user.
     :param db: The database connection.
-    :return: A message indicating the successful addition of members.
+    :param chunk_size: The number of ids inserted per statement and transaction.
+    :return: A message and the outcome for each requested user ID, in request order.
     :raises HTTPException: If the user is not a member of the group.
     """
+    await require_group_member(group_id, current_user.id, db)
+    requested = list(dict.fromkeys(member_ids))
+    statuses = {}
+    for start in range(0, len(requested), chunk_size):
+        chunk = requested[start:start + chunk_size]
+        statuses.update(await run_db(_insert_group_members, db, group_id, chunk))
+        MEMBERSHIP_INDEX.add_members(group_id, [user_id for user_id in chunk if statuses.get(user_id) == "added"])
+    results = [MemberAddResult(user_id=user_id, status=statuses[user_id]) for user_id in requested]
+    return MembersAdded(message="Members added successfully", results=results)
+
+def _insert_group_members(db, group_id: int, member_ids: list[int]):
     with db.cursor() as cur:
-        cur.execute(SELECT_GROUP_MEMBER, (group_id, current_user.id))
-        if not cur.fetchone():
-            raise HTTPException(status_code=403, detail="You are not a member of this group")
-        for member_id in member_ids:
-            cur.execute(INSERT_GROUP_MEMBER, (group_id, member_id))
+        cur.execute(INSERT_GROUP_MEMBERS_BULK, (member_ids, group_id))
+        statuses = dict(cur.fetchall())
+        notify_membership_changed(cur, group_id)
+        versions = bump_group_versions(cur, [group_id]) if "added" in statuses.values() else None
         db.commit()
-    return {"message": "Members added successfully"}
+    if versions:
+        group_versions_changed(versions)
+    return statuses
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+import psycopg2
+from psycopg2.extras import execute_values
+from src.utils.db_util import PoolTimeout, get_pool, run_db
+from src.utils.query_util import INSERT_MESSAGE_LIKES_BATCH, UPDATE_MESSAGE_LIKES_BATCH
+from src.services.stream_service import like_event, notify_group_event
+
+logger = logging.getLogger(__name__)
+
+LIKE_WRITE_BEHIND = os.getenv('LIKE_WRITE_BEHIND', '1') == '1'
+LIKE_FLUSH_INTERVAL = float(os.getenv('LIKE_FLUSH_INTERVAL', '0.5'))
+LIKE_FLUSH_THRESHOLD = int(os.getenv('LIKE_FLUSH_THRESHOLD', '1000'))
+LIKE_DEDUP = os.getenv('LIKE_DEDUP', '0') == '1'
+
+# Flush failures worth retrying; any other failure would recur, so its likes are dropped.
+TRANSIENT_ERRORS = (psycopg2.OperationalError, PoolTimeout)
+
+class LikeAggregator:
+    """
+    Coalesces likes in memory and writes them to the database in batches.
+
+    Likes are counted per message and flushed every ``flush_interval`` seconds, or as soon
+    as ``flush_threshold`` likes are pending, as one batched UPDATE. A popular message thus
+    costs one row update per flush instead of one locked update and commit per click.
+
+    A batch that fails on a transient error is kept pending and retried on the next flush.
+    A batch the database rejects, e.g. for a message deleted since it was liked, is split
+    until the offending messages are isolated, and only their likes are dropped.
+    """
+
+    def __init__(self, flush_interval: float = LIKE_FLUSH_INTERVAL, flush_threshold: int = LIKE_FLUSH_THRESHOLD, dedup: bool = LIKE_DEDUP):
+        """
+        :param flush_interval: Maximum seconds a like waits before being written.
+        :param flush_threshold: Number of pending likes that triggers an immediate flush.
+        :param dedup: Record who liked what and ignore repeated likes by the same user.
+        """
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.dedup = dedup
+        self._pending = Counter()
+        self._pending_total = 0
+        self._pending_likers = set()
+        self._in_flight = Counter()
+        self._in_flight_likers = set()
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+        self._flush_lock = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the background flusher is running."""
+        return self._task is not None and not self._task.done()
+
+    def add(self, message_id: int, user_id: int, stored_likes: int, already_liked: bool = False) -> int:
+        """
+        Record a like and return the message's running like count.
+
+        :param message_id: The ID of the liked message.
+        :param user_id: The ID of the user liking the message.
+        :param stored_likes: The like count currently stored in the database.
+        :param already_liked: Whether the database already records a like by this user.
+        :return: The stored count plus the likes not yet written.
+        """
+        liker = (message_id, user_id)
+        if not (self.dedup and (already_liked or liker in self._pending_likers or liker in self._in_flight_likers)):
+            self._pending[message_id] += 1
+            self._pending_total += 1
+            if self.dedup:
+                self._pending_likers.add(liker)
+            if self._wakeup is not None and self._pending_total >= self.flush_threshold:
+                self._wakeup.set()
+        return stored_likes + self._pending[message_id] + self._in_flight[message_id]
+
+    def start(self):
+        """Start the background flusher on the running event loop."""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and write every pending like."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._wakeup = None
+        await self.flush()
+
+    async def flush(self):
+        """Write every pending like to the database in one transaction."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._in_flight, self._pending = self._pending, Counter()
+            self._in_flight_likers, self._pending_likers = self._pending_likers, set()
+            self._pending_total = 0
+            try:
+                await self._write(dict(self._in_flight), self._in_flight_likers)
+            finally:
+                self._in_flight = Counter()
+                self._in_flight_likers = set()
+
+    async def _write(self, counts: dict, likers: set):
+        try:
+            await run_db(_write_likes, counts, sorted(likers) if self.dedup else None)
+        except TRANSIENT_ERRORS:
+            logger.exception("Failed to flush %d pending likes, retrying", sum(counts.values()))
+            self._pending.update(counts)
+            self._pending_total += sum(counts.values())
+            self._pending_likers |= likers
+        except (psycopg2.IntegrityError, psycopg2.DataError):
+            if len(counts) == 1:
+                logger.warning("Dropping %d likes of message %d rejected by the database", sum(counts.values()), next(iter(counts)))
+                return
+            message_ids = sorted(counts)
+            for half in (message_ids[:len(message_ids) // 2], message_ids[len(message_ids) // 2:]):
+                half = set(half)
+                await self._write({message_id: counts[message_id] for message_id in half},
+                                  {liker for liker in likers if liker[0] in half})
+        except Exception:
+            logger.exception("Dropping %d likes that failed to flush", sum(counts.values()))
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+def _write_likes(counts: dict, likers: list = None):
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            if likers is not None:
+                inserted = execute_values(cur, INSERT_MESSAGE_LIKES_BATCH, likers, fetch=True)
+                counts = Counter(row[0] for row in inserted)
+            if counts:
+                updated = execute_values(cur, UPDATE_MESSAGE_LIKES_BATCH, sorted(counts.items()), fetch=True)
+                for message_id, group_id, likes in updated:
+                    notify_group_event(cur, group_id, like_event(message_id, group_id, likes))
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+LIKE_AGGREGATOR = LikeAggregator()
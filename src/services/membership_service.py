@@ -0,0 +1,69 @@
+import os
+from fastapi import HTTPException
+from src.utils.db_util import run_db, fetch_all, fetch_one
+from src.utils.membership_util import MembershipIndex, MemberSet
+from src.utils.notify_util import LISTENER, WORKER_ID, notify
+from src.utils.query_util import SELECT_GROUP_MEMBER, SELECT_GROUP_MEMBER_IDS
+from src.utils.replica_util import is_replica
+
+MEMBERSHIP_INDEX_ENABLED = os.getenv('MEMBERSHIP_INDEX_ENABLED', '1') == '1'
+MEMBERSHIP_INDEX_MAX_MEMBERS = int(os.getenv('MEMBERSHIP_INDEX_MAX_MEMBERS', '1000000'))
+MEMBERSHIP_INDEX_TTL = float(os.getenv('MEMBERSHIP_INDEX_TTL', '300'))
+
+MEMBERSHIP_CHANNEL = "group_membership"
+
+MEMBERSHIP_INDEX = MembershipIndex(MEMBERSHIP_INDEX_MAX_MEMBERS, MEMBERSHIP_INDEX_TTL)
+
+async def is_group_member(group_id: int, user_id: int, db) -> bool:
+    """
+    Check whether a user belongs to a group, loading the group into the index on a miss.
+
+    Groups are only loaded from the primary. A replica may not have replayed a membership
+    change yet when its notification arrives, so a miss on a replica connection is answered
+    with an uncached query instead of caching a stale member set.
+
+    :param group_id: The ID of the group.
+    :param user_id: The ID of the user.
+    :param db: The database connection.
+    :return: True if the user is a member of the group.
+    """
+    if not MEMBERSHIP_INDEX_ENABLED:
+        return await run_db(fetch_one, db, SELECT_GROUP_MEMBER, (group_id, user_id)) is not None
+    members = MEMBERSHIP_INDEX.get(group_id)
+    if members is None and is_replica(db):
+        return await run_db(fetch_one, db, SELECT_GROUP_MEMBER, (group_id, user_id)) is not None
+    if members is None:
+        generation = MEMBERSHIP_INDEX.generation()
+        rows = await run_db(fetch_all, db, SELECT_GROUP_MEMBER_IDS, (group_id,))
+        members = MemberSet(row[0] for row in rows)
+        MEMBERSHIP_INDEX.put(group_id, members, generation)
+    return user_id in members
+
+async def require_group_member(group_id: int, user_id: int, db):
+    """
+    Ensure a user belongs to a group.
+
+    :param group_id: The ID of the group.
+    :param user_id: The ID of the user.
+    :param db: The database connection.
+    :raises HTTPException: If the user is not a member of the group.
+    """
+    if not await is_group_member(group_id, user_id, db):
+        raise HTTPException(status_code=403, detail="You are not a member of this group")
+
+def notify_membership_changed(cur, group_id: int):
+    """
+    Tell other workers that a group's membership changed once the cursor's transaction commits.
+
+    :param cur: A cursor of the transaction changing the membership.
+    :param group_id: The ID of the group.
+    """
+    notify(cur, MEMBERSHIP_CHANNEL, "%s:%s" % (WORKER_ID, group_id))
+
+def _on_membership_changed(payload: str):
+    origin, group_id = payload.split(":")
+    if origin != WORKER_ID:
+        MEMBERSHIP_INDEX.invalidate(int(group_id))
+
+LISTENER.subscribe(MEMBERSHIP_CHANNEL, _on_membership_changed)
+LISTENER.on_reconnect(MEMBERSHIP_INDEX.clear)
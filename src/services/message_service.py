@@ -1,51 +1,223 @@
+import os
 from fastapi import HTTPException
-from src.utils.db_util import get_db_connection
-from src.utils.query_util import SELECT_GROUP_MEMBER, INSERT_MESSAGE, SELECT_MESSAGE_GROUP, UPDATE_MESSAGE_LIKES
+from psycopg2.extras import execute_values
+from src.utils.db_util import run_db, fetch_one, fetch_all, execute_atomic
+from src.utils.notify_util import WORKER_ID
+from src.utils.query_util import (SEND_MESSAGE, INSERT_MESSAGES_BATCH, LIKE_MESSAGE, LIKE_MESSAGE_DEDUP, SELECT_MESSAGES_LATEST,
+                                  SELECT_MESSAGES_BEFORE, SELECT_MESSAGES_AFTER, SELECT_MESSAGE_LIKE_STATE,
+                                  SELECT_MESSAGE_LIKE_STATE_DEDUP, SEARCH_MESSAGES, SEARCH_MESSAGES_AFTER)
+from src.utils.pagination_util import DEFAULT_PAGE_SIZE, encode_cursor, decode_cursor
+from src.utils.stream_util import encode_json
+from src.services.membership_service import require_group_member
+from src.services.like_service import LIKE_AGGREGATOR, LIKE_DEDUP
+from src.services.stream_service import (GROUP_EVENTS_CHANNEL, MAX_NOTIFY_PAYLOAD, message_event, like_event, publish_group_event,
+                                         notify_group_events)
 from src.models.schemas import MessageIn, Message, User
 
+MESSAGE_BATCH_MAX_COUNT = int(os.getenv('MESSAGE_BATCH_MAX_COUNT', '100'))
+MESSAGE_BATCH_MAX_BYTES = int(os.getenv('MESSAGE_BATCH_MAX_BYTES', str(256 * 1024)))
+# Leaves room for the JSON around the content and for escaped characters.
+MESSAGE_BATCH_MAX_BODY_BYTES = int(os.getenv('MESSAGE_BATCH_MAX_BODY_BYTES', str(4 * MESSAGE_BATCH_MAX_BYTES)))
+SEARCH_QUERY_MAX_LENGTH = int(os.getenv('SEARCH_QUERY_MAX_LENGTH', '256'))
+ATTACHMENTS_PER_MESSAGE_MAX = int(os.getenv('ATTACHMENTS_PER_MESSAGE_MAX', '10'))
+
+# The largest magnitude of a Postgres real, the type of a search rank.
+REAL_MAX = 3.4028234663852886e38
+
 async def send_group_message(group_id: int, message_in: MessageIn, current_user: User, db):
     """
     Send a message to a group.
 
+    The membership check, the insert, linking the attachments and the notification of the
+    other workers run as one fused statement, so sending costs a single round trip.
+
     :param group_id: The ID of the group to send the message to.
     :param message_in: The input data for creating a message.
     :param current_user: The currently authenticated user.
     :param db: The database connection.
     :return: The newly created message.
-    :raises HTTPException: If the user is not a member of the group or a database error occurs.
+    :raises HTTPException: If the user is not a member of the group, an attachment is not one of the user's
+        unsent uploads to the group, or a database error occurs.
     """
+    attachment_ids = sorted(set(message_in.attachment_ids))
+    if len(attachment_ids) > ATTACHMENTS_PER_MESSAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"A message may have at most {ATTACHMENTS_PER_MESSAGE_MAX} attachments")
+    row = await run_db(_insert_message, db, group_id, current_user.id, message_in.content, attachment_ids)
+    if not row[0]:
+        raise HTTPException(status_code=403, detail="You are not a member of this group")
+    if row[1] is None:
+        raise HTTPException(status_code=400, detail="Attachments must be your own unsent uploads to this group")
+    message = Message(id=row[1], group_id=row[2], content=row[3], likes=row[4], attachment_ids=row[6])
+    publish_group_event(group_id, message_event(message))
+    return message
+
+def _insert_message(db, group_id: int, user_id: int, content: str, attachment_ids: list[int]):
+    params = {"group_id": group_id, "user_id": user_id, "content": content, "attachment_ids": attachment_ids,
+              "channel": GROUP_EVENTS_CHANNEL, "worker": WORKER_ID, "max_payload": MAX_NOTIFY_PAYLOAD}
+    try:
+        return execute_atomic(db, SEND_MESSAGE, params)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+async def send_group_messages(group_id: int, messages_in: list[MessageIn], current_user: User, db):
+    """
+    Send several messages to a group in one transaction.
+
+    Membership is checked once and all messages are inserted with a single multi-row
+    statement, so the batch is stored entirely or not at all.
+
+    :param group_id: The ID of the group to send the messages to.
+    :param messages_in: The messages to create, in order.
+    :param current_user: The currently authenticated user.
+    :param db: The database connection.
+    :return: The newly created messages, in the order they were sent.
+    :raises HTTPException: If the batch is empty, too large or has attachments, the user is not a member of the group,
+        or a database error occurs.
+    """
+    if not messages_in:
+        raise HTTPException(status_code=400, detail="The batch must contain at least one message")
+    if any(message_in.attachment_ids for message_in in messages_in):
+        raise HTTPException(status_code=400, detail="Messages with attachments must be sent one at a time")
+    if len(messages_in) > MESSAGE_BATCH_MAX_COUNT:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {MESSAGE_BATCH_MAX_COUNT} messages")
+    if sum(len(message_in.content.encode('utf-8')) for message_in in messages_in) > MESSAGE_BATCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {MESSAGE_BATCH_MAX_BYTES} bytes of content")
+    await require_group_member(group_id, current_user.id, db)
+    messages = await run_db(_insert_messages, db, group_id, current_user.id, [message_in.content for message_in in messages_in])
+    for message in messages:
+        publish_group_event(group_id, message_event(message))
+    return messages
+
+def _insert_messages(db, group_id: int, user_id: int, contents: list[str]):
     with db.cursor() as cur:
-        cur.execute(SELECT_GROUP_MEMBER, (group_id, current_user.id))
-        if not cur.fetchone():
-            raise HTTPException(status_code=403, detail="You are not a member of this group")
         try:
-            cur.execute(INSERT_MESSAGE, (group_id, current_user.id, message_in.content))
-            new_message = cur.fetchone()
+            rows = execute_values(cur, INSERT_MESSAGES_BATCH, [(group_id, user_id, content) for content in contents],
+                                  page_size=len(contents), fetch=True)
+            messages = [Message(id=row[0], group_id=row[1], content=row[2], likes=row[3]) for row in sorted(rows)]
+            notify_group_events(cur, group_id, [message_event(message) for message in messages])
             db.commit()
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    return Message(id=new_message[0], group_id=new_message[1], content=new_message[2], likes=new_message[3])
+    return messages
 
 async def like_message(message_id: int, current_user: User, db):
     """
     Like a message.
 
+    The existence and membership checks run in the same statement as the like itself, so
+    liking costs a single round trip. While the like aggregator is running the like is
+    counted in memory and written in the next batch; the returned count includes likes
+    that are not written yet.
+
     :param message_id: The ID of the message to like.
     :param current_user: The currently authenticated user.
     :param db: The database connection.
     :return: The updated like count of the message.
     :raises HTTPException: If the message is not found or the user is not a member of the group.
     """
-    with db.cursor() as cur:
-        cur.execute(SELECT_MESSAGE_GROUP, (message_id,))
-        group = cur.fetchone()
-        if not group:
+    params = {"message_id": message_id, "user_id": current_user.id}
+    if LIKE_AGGREGATOR.running:
+        statement = SELECT_MESSAGE_LIKE_STATE_DEDUP if LIKE_AGGREGATOR.dedup else SELECT_MESSAGE_LIKE_STATE
+        state = await run_db(fetch_one, db, statement, params)
+        if not state:
             raise HTTPException(status_code=404, detail="Message not found")
-        cur.execute(SELECT_GROUP_MEMBER, (group[0], current_user.id))
-        if not cur.fetchone():
+        if not state[2]:
             raise HTTPException(status_code=403, detail="You are not a member of this group")
-        cur.execute(UPDATE_MESSAGE_LIKES, (message_id,))
-        new_like_count = cur.fetchone()[0]
-        db.commit()
+        already_liked = LIKE_AGGREGATOR.dedup and state[3]
+        new_like_count = LIKE_AGGREGATOR.add(message_id, current_user.id, state[1], already_liked)
+        publish_group_event(state[0], like_event(message_id, state[0], new_like_count))
+        return {"likes": new_like_count}
+    params.update(channel=GROUP_EVENTS_CHANNEL, worker=WORKER_ID)
+    row = await run_db(execute_atomic, db, LIKE_MESSAGE_DEDUP if LIKE_DEDUP else LIKE_MESSAGE, params)
+    if not row or row[0] is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    if not row[1]:
+        raise HTTPException(status_code=403, detail="You are not a member of this group")
+    group_id, new_like_count = row[0], row[2]
+    publish_group_event(group_id, like_event(message_id, group_id, new_like_count))
     return {"likes": new_like_count}
+
+async def list_group_messages(group_id: int, current_user: User, db, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                              raw: bool = False):
+    """
+    List one page of a group's messages, newest first.
+
+    Pages are addressed by keyset on the message id. A cursor either points at older
+    messages (``before``) or at messages newer than those already seen (``after``).
+
+    :param group_id: The ID of the group whose messages to list.
+    :param current_user: The currently authenticated user.
+    :param db: The database connection.
+    :param cursor: An opaque cursor from a previous page, or None for the latest messages.
+    :param limit: The maximum number of messages to return.
+    :param raw: Return the database rows, to be encoded with encode_message_row, instead of messages.
+    :return: The page of messages, the cursor of the next (older) page and the cursor of the previous (newer) page.
+    :raises HTTPException: If the cursor is invalid or the user is not a member of the group.
+    """
+    position = decode_cursor(cursor) if cursor else {}
+    await require_group_member(group_id, current_user.id, db)
+    if "after" in position:
+        rows = await run_db(fetch_all, db, SELECT_MESSAGES_AFTER, (group_id, position["after"], limit + 1))
+        rows = rows[:limit][::-1]
+        has_older = True
+    elif "before" in position:
+        rows = await run_db(fetch_all, db, SELECT_MESSAGES_BEFORE, (group_id, position["before"], limit + 1))
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        rows = await run_db(fetch_all, db, SELECT_MESSAGES_LATEST, (group_id, limit + 1))
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+    messages = rows if raw else [Message(id=row[0], group_id=row[1], content=row[2], likes=row[3], attachment_ids=row[4])
+                                 for row in rows]
+    if not rows:
+        return messages, None, cursor if "after" in position else None
+    next_cursor = encode_cursor({"before": rows[-1][0]}) if has_older else None
+    prev_cursor = encode_cursor({"after": rows[0][0]})
+    return messages, next_cursor, prev_cursor
+
+async def search_group_messages(group_id: int, query: str, current_user: User, db, cursor: str = None,
+                                limit: int = DEFAULT_PAGE_SIZE, raw: bool = False):
+    """
+    Search a group's messages, best match first, one page at a time.
+
+    The query uses web search syntax (quoted phrases, ``or``, ``-word``) and is matched
+    against the indexed full-text representation of the messages. Pages are addressed by
+    keyset on the rank and the message id.
+
+    :param group_id: The ID of the group whose messages to search.
+    :param query: The search terms.
+    :param current_user: The currently authenticated user.
+    :param db: The database connection.
+    :param cursor: An opaque cursor from a previous page, or None for the best matches.
+    :param limit: The maximum number of messages to return.
+    :param raw: Return the database rows, to be encoded with encode_message_row, instead of messages.
+    :return: The page of messages and the cursor of the next page.
+    :raises HTTPException: If the cursor is invalid or the user is not a member of the group.
+    """
+    position = decode_cursor(cursor, float_keys=("rank",)) if cursor else {}
+    if cursor and (position.keys() != {"rank", "id"} or abs(position["rank"]) > REAL_MAX):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    await require_group_member(group_id, current_user.id, db)
+    params = {"group_id": group_id, "q": query, "limit": limit + 1}
+    if position:
+        params.update(rank=position["rank"], id=position["id"])
+        rows = await run_db(fetch_all, db, SEARCH_MESSAGES_AFTER, params)
+    else:
+        rows = await run_db(fetch_all, db, SEARCH_MESSAGES, params)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    messages = rows if raw else [Message(id=row[0], group_id=row[1], content=row[2], likes=row[3], attachment_ids=row[4])
+                                 for row in rows]
+    next_cursor = encode_cursor({"rank": rows[-1][5], "id": rows[-1][0]}) if has_more else None
+    return messages, next_cursor
+
+def encode_message_row(row) -> bytes:
+    """
+    Encode a message row (id, group_id, content, likes, attachment_ids) as the JSON of the equivalent Message.
+
+    :param row: The database row.
+    :return: The JSON encoding.
+    """
+    return encode_json({"id": row[0], "group_id": row[1], "content": row[2], "likes": row[3], "attachment_ids": row[4]})
@@ -0,0 +1,47 @@
+import os
+from fastapi import HTTPException
+from src.utils.db_util import run_db, fetch_all, execute_atomic
+from src.utils.query_util import MARK_GROUP_READ, SELECT_UNREAD_COUNTS
+from src.models.schemas import ReadMarker, UnreadCount, User
+
+UNREAD_COUNT_CAP = int(os.getenv('UNREAD_COUNT_CAP', '100'))
+
+async def mark_group_read(group_id: int, message_id: int, current_user: User, db):
+    """
+    Move the user's read marker in a group forward.
+
+    The membership check and the update run as one statement. A marker never moves back,
+    nor past the group's newest message.
+
+    :param group_id: The ID of the group.
+    :param message_id: The newest message read, or None to mark the whole group read.
+    :param current_user: The currently authenticated user.
+    :param db: The database connection.
+    :return: The read marker after the update.
+    :raises HTTPException: If the user is not a member of the group or a database error occurs.
+    """
+    row = await run_db(_mark_group_read, db, group_id, message_id, current_user.id)
+    if row is None:
+        raise HTTPException(status_code=403, detail="You are not a member of this group")
+    return ReadMarker(group_id=group_id, last_read_id=row[0])
+
+def _mark_group_read(db, group_id: int, message_id: int, user_id: int):
+    try:
+        return execute_atomic(db, MARK_GROUP_READ, {"group_id": group_id, "message_id": message_id, "user_id": user_id})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+async def list_unread_counts(current_user: User, db, cap: int = UNREAD_COUNT_CAP):
+    """
+    Count the unread messages in each of the user's groups.
+
+    Counting stops at ``cap`` per group, so the cost depends on the number of groups and
+    the cap but not on the length of their history.
+
+    :param current_user: The currently authenticated user.
+    :param db: The database connection.
+    :param cap: The largest count reported for one group.
+    :return: The groups with unread messages, by group ID.
+    """
+    rows = await run_db(fetch_all, db, SELECT_UNREAD_COUNTS, {"user_id": current_user.id, "cap": cap})
+    return [UnreadCount(group_id=row[0], last_read_id=row[1], unread=row[2], capped=row[2] >= cap) for row in rows]
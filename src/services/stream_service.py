@@ -0,0 +1,82 @@
+import json
+import os
+from fastapi.encoders import jsonable_encoder
+from src.utils.notify_util import LISTENER, WORKER_ID, notify, notify_many
+from src.utils.pubsub_util import Broker
+from src.models.schemas import Message
+
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '256'))
+
+GROUP_EVENTS_CHANNEL = "group_events"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more.
+MAX_NOTIFY_PAYLOAD = 7900
+
+BROKER = Broker(STREAM_QUEUE_SIZE)
+
+def message_event(message: Message) -> dict:
+    """
+    Build the event announcing a new message.
+
+    :param message: The new message.
+    :return: The event payload.
+    """
+    return {"type": "message", "message": jsonable_encoder(message)}
+
+def like_event(message_id: int, group_id: int, likes: int) -> dict:
+    """
+    Build the event announcing a message's new like count.
+
+    :param message_id: The ID of the liked message.
+    :param group_id: The ID of the message's group.
+    :param likes: The message's like count.
+    :return: The event payload.
+    """
+    return {"type": "like", "message_id": message_id, "group_id": group_id, "likes": likes}
+
+def publish_group_event(group_id: int, event: dict):
+    """
+    Deliver an event to this worker's subscribers of a group. Must be called from the event loop.
+
+    :param group_id: The ID of the group.
+    :param event: The event payload.
+    """
+    BROKER.publish(group_id, event)
+
+def notify_group_event(cur, group_id: int, event: dict):
+    """
+    Send an event to the other workers once the cursor's transaction commits.
+
+    Events too large for a notification are sent without the message content; clients
+    fetch it through the message history endpoint.
+
+    :param cur: A cursor of the transaction making the change.
+    :param group_id: The ID of the group.
+    :param event: The event payload.
+    """
+    notify(cur, GROUP_EVENTS_CHANNEL, _notification(group_id, event))
+
+def notify_group_events(cur, group_id: int, events: list):
+    """
+    Send several events to the other workers with one statement once the cursor's transaction commits.
+
+    :param cur: A cursor of the transaction making the change.
+    :param group_id: The ID of the group.
+    :param events: The event payloads, in order.
+    """
+    notify_many(cur, GROUP_EVENTS_CHANNEL, [_notification(group_id, event) for event in events])
+
+def _notification(group_id: int, event: dict) -> str:
+    payload = json.dumps({"worker": WORKER_ID, "group_id": group_id, "event": event}, separators=(",", ":"))
+    if len(payload.encode('utf-8')) > MAX_NOTIFY_PAYLOAD and event.get("type") == "message":
+        message = dict(event["message"], content=None)
+        event = dict(event, message=message, truncated=True)
+        payload = json.dumps({"worker": WORKER_ID, "group_id": group_id, "event": event}, separators=(",", ":"))
+    return payload
+
+def _on_group_event(payload: str):
+    notification = json.loads(payload)
+    if notification["worker"] != WORKER_ID:
+        BROKER.publish_threadsafe(notification["group_id"], notification["event"])
+
+LISTENER.subscribe(GROUP_EVENTS_CHANNEL, _on_group_event)
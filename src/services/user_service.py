@@ -1,7 +1,9 @@
-import bcrypt
 from fastapi import HTTPException
-from src.utils.db_util import get_db_connection
-from src.utils.query_util import INSERT_USER, UPDATE_USER
+from src.utils.db_util import run_db
+from src.utils.hash_util import hash_password
+from src.services.auth_service import invalidate_user_tokens, notify_user_changed
+from src.services.version_service import bump_group_versions, group_versions_changed
+from src.utils.query_util import INSERT_USER, UPDATE_USER, SELECT_USER_ID_BY_USERNAME
 from src.models.schemas import UserIn, User
 
 async def create_user(user_in: UserIn, db):
@@ -13,15 +15,19 @@ async def create_user(user_in: UserIn, db):
     :return: The newly created user.
     :raises HTTPException: If the username is already registered.
     """
+    hashed_password = await hash_password(user_in.password)
+    new_user = await run_db(_insert_user, db, user_in, hashed_password)
+    return User(id=new_user[0], username=new_user[1], is_admin=new_user[2])
+
+def _insert_user(db, user_in: UserIn, hashed_password: str):
     with db.cursor() as cur:
-        cur.execute("SELECT id FROM users WHERE username = %s", (user_in.username,))
+        cur.execute(SELECT_USER_ID_BY_USERNAME, (user_in.username,))
         if cur.fetchone():
             raise HTTPException(status_code=400, detail="Username already registered")
-        hashed_password = bcrypt.hashpw(user_in.password.encode(), bcrypt.gensalt()).decode('utf-8')
         cur.execute(INSERT_USER, (user_in.username, hashed_password, user_in.is_admin))
         new_user = cur.fetchone()
         db.commit()
-    return User(id=new_user[0], username=new_user[1], is_admin=new_user[2])
+    return new_user
 
 async def update_user(user_id: int, user_data: UserIn, db):
     """
@@ -33,11 +39,23 @@ async def update_user(user_id: int, user_data: UserIn, db):
     :return: The updated user.
     :raises HTTPException: If the user is not found.
     """
+    hashed_password = await hash_password(user_data.password)
+    updated_user = await run_db(_update_user, db, user_id, user_data, hashed_password)
+    if not updated_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_tokens(user_id)
+    return User(id=updated_user[0], username=updated_user[1], is_admin=updated_user[2])
+
+def _update_user(db, user_id: int, user_data: UserIn, hashed_password: str):
     with db.cursor() as cur:
-        hashed_password = bcrypt.hashpw(user_data.password.encode(), bcrypt.gensalt()).decode('utf-8')
         cur.execute(UPDATE_USER, (user_data.username, hashed_password, user_data.is_admin, user_id))
         updated_user = cur.fetchone()
+        versions = None
+        if updated_user:
+            notify_user_changed(cur, user_id)
+            # Group listings show each member's username and admin flag.
+            versions = bump_group_versions(cur, user_id=user_id)
         db.commit()
-    if not updated_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return User(id=updated_user[0], username=updated_user[1], is_admin=updated_user[2])
+    if versions:
+        group_versions_changed(versions)
+    return updated_user
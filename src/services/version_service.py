@@ -0,0 +1,134 @@
+import os
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from src.utils.cache_util import TTLCache
+from src.utils.db_util import run_db, fetch_one
+from src.utils.etag_util import VersionIndex, make_etag, etag_matches
+from src.utils.notify_util import LISTENER
+from src.utils.query_util import BUMP_GROUP_VERSIONS, SELECT_GROUP_VERSION
+
+LISTING_CACHE_ENABLED = os.getenv('LISTING_CACHE_ENABLED', '1') == '1'
+LISTING_CACHE_SIZE = int(os.getenv('LISTING_CACHE_SIZE', '256'))
+LISTING_CACHE_TTL = float(os.getenv('LISTING_CACHE_TTL', '30'))
+LISTING_CACHE_MAX_BYTES = int(os.getenv('LISTING_CACHE_MAX_BYTES', str(256 * 1024)))
+GROUP_VERSION_TTL = float(os.getenv('GROUP_VERSION_TTL', '300'))
+GROUP_VERSION_CACHE_SIZE = int(os.getenv('GROUP_VERSION_CACHE_SIZE', '100000'))
+
+GROUP_VERSIONS_CHANNEL = "group_versions"
+
+# The version of the listing of all groups; every group change also bumps it.
+ALL_GROUPS = 0
+
+# Groups listed in one version notification before it falls back to "every group".
+NOTIFY_MAX_GROUPS = 500
+
+GROUP_VERSIONS = VersionIndex(GROUP_VERSION_CACHE_SIZE, GROUP_VERSION_TTL)
+LISTING_CACHE = TTLCache(LISTING_CACHE_SIZE, LISTING_CACHE_TTL)
+
+def bump_group_versions(cur, group_ids: list[int] = (), user_id: int = None) -> str:
+    """
+    Give the listings of groups a new version once the cursor's transaction commits.
+
+    The listing of all groups is always bumped. Call ``group_versions_changed`` with the
+    result after committing, so this worker does not serve its old version until the
+    notification comes back.
+
+    :param cur: A cursor of the transaction changing the groups.
+    :param group_ids: The IDs of the changed groups.
+    :param user_id: A user whose details changed, bumping every group the user belongs to.
+    :return: The notification payload.
+    """
+    cur.execute(BUMP_GROUP_VERSIONS, {"group_ids": list(group_ids), "user_id": user_id,
+                                      "channel": GROUP_VERSIONS_CHANNEL, "max_groups": NOTIFY_MAX_GROUPS})
+    version, groups, _ = cur.fetchone()
+    return "%s:%s" % (version, groups)
+
+def group_versions_changed(payload: str):
+    """
+    Record new group versions from a bump_group_versions notification payload.
+
+    :param payload: ``version:group_id,...``, or ``version:*`` when every group may have changed.
+    """
+    version, groups = payload.split(":")
+    if groups == "*":
+        GROUP_VERSIONS.clear()
+        GROUP_VERSIONS.advance([ALL_GROUPS], int(version))
+    else:
+        GROUP_VERSIONS.advance([int(group_id) for group_id in groups.split(",")], int(version))
+
+async def cached_listing(request, group_id: int, key: tuple, db, build) -> Response:
+    """
+    Serve a JSON listing that only changes with a group's version, with ETag and 304 support.
+
+    While this worker receives version notifications, the current version is known without
+    a query, so a client holding the current ETag gets a 304 and other clients get the
+    cached encoding. Otherwise the version is read before and after building the listing,
+    on the same connection, and the listing is only tagged and cached if it did not change
+    in between, so an ETag always denotes the same bytes, even on a lagging replica. A
+    built listing is streamed; its chunks are kept for the cache as they are sent, unless
+    they grow beyond LISTING_CACHE_MAX_BYTES.
+
+    :param request: The incoming request.
+    :param group_id: The group the listing depends on, or ALL_GROUPS.
+    :param key: What distinguishes the listing among the group's listings, e.g. its query parameters.
+    :param db: The database connection.
+    :param build: An async callable returning the listing's headers and an iterable of its
+        encoded chunks, which is only iterated once the version has been read again.
+    :return: The response.
+    """
+    if not LISTING_CACHE_ENABLED:
+        chunks, headers = await build()
+        return StreamingResponse(chunks, media_type="application/json", headers=headers)
+    if_none_match = request.headers.get("if-none-match")
+    version = GROUP_VERSIONS.get(group_id) if LISTENER.connected else None
+    key = (group_id,) + key
+    if version is not None:
+        response = _cached_response(if_none_match, key, version)
+        if response is not None:
+            return response
+    generation = GROUP_VERSIONS.generation()
+    before = (await run_db(fetch_one, db, SELECT_GROUP_VERSION, (group_id,)))[0]
+    if before != version:
+        response = _cached_response(if_none_match, key, before)
+        if response is not None:
+            return response
+    chunks, headers = await build()
+    after = (await run_db(fetch_one, db, SELECT_GROUP_VERSION, (group_id,)))[0]
+    if after != before:
+        return StreamingResponse(chunks, media_type="application/json", headers=headers)
+    if LISTENER.connected:
+        GROUP_VERSIONS.put(group_id, before, generation)
+    return StreamingResponse(_caching(chunks, (before,) + key, headers), media_type="application/json",
+                             headers=_tag_headers(headers, make_etag(before, key)))
+
+def _caching(chunks, cache_key: tuple, headers: dict):
+    kept, size = [], 0
+    for chunk in chunks:
+        if kept is not None:
+            size += len(chunk)
+            if size <= LISTING_CACHE_MAX_BYTES:
+                kept.append(chunk)
+            else:
+                kept = None
+        yield chunk
+    if kept is not None:
+        LISTING_CACHE.set(cache_key, (b"".join(kept), headers))
+
+def _cached_response(if_none_match: str, key: tuple, version: int):
+    etag = make_etag(version, key)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    cached = LISTING_CACHE.get((version,) + key)
+    return None if cached is None else _tagged_response(cached[0], cached[1], etag)
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def _tagged_response(body: bytes, headers: dict, etag: str) -> Response:
+    return Response(body, media_type="application/json", headers=_tag_headers(headers, etag))
+
+def _tag_headers(headers: dict, etag: str) -> dict:
+    return {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+
+LISTENER.subscribe(GROUP_VERSIONS_CHANNEL, group_versions_changed)
+LISTENER.on_reconnect(GROUP_VERSIONS.clear)
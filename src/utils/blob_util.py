@@ -0,0 +1,140 @@
+"""
+Content-addressed blob storage utility module.
+
+Attachments are stored on the local filesystem under the SHA-256 of their content, in a
+two-level fan-out (``ab/cd/abcd…``), so identical uploads share one file. A blob is
+streamed into a temporary file in the same directory tree while it is hashed, then moved
+into place atomically; a reader never sees a partial blob. A writer can be finished, and
+its digest known, before the blob is committed to the store, so the caller can commit it
+under a lock keyed by the digest.
+"""
+import hashlib
+import os
+import tempfile
+
+
+class BlobTooLarge(Exception):
+    """Raised when a blob grows beyond the writer's size limit."""
+
+
+class BlobWriter:
+    """Streams one blob to a temporary file, hashing it as it goes."""
+
+    def __init__(self, store, max_bytes: int):
+        """
+        :param store: The BlobStore the blob is committed to.
+        :param max_bytes: The largest blob accepted.
+        """
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = None
+        self._hash = hashlib.sha256()
+        fd, self._path = tempfile.mkstemp(dir=store.tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        """
+        Append a chunk of the blob.
+
+        :param data: The next bytes of the blob.
+        :raises BlobTooLarge: If the blob now exceeds ``max_bytes``.
+        """
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise BlobTooLarge(f"Blob exceeds {self.max_bytes} bytes")
+        self._hash.update(data)
+        self._file.write(data)
+
+    def finish(self) -> str:
+        """
+        Flush the blob to disk without storing it yet.
+
+        Blocking.
+
+        :return: The blob's SHA-256 as a hex digest.
+        """
+        if self.digest is None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self.digest = self._hash.hexdigest()
+        return self.digest
+
+    def commit(self) -> str:
+        """
+        Finish the blob and move it into the store, unless an identical blob is already there.
+
+        Blocking: flushes the file to disk.
+
+        :return: The blob's SHA-256 as a hex digest.
+        """
+        digest = self.finish()
+        path = self.store.path(digest)
+        if os.path.exists(path):
+            os.unlink(self._path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._path, path)
+        return digest
+
+    def abort(self):
+        """Discard the blob, unless it was committed."""
+        self._file.close()
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class BlobStore:
+    """A directory of blobs named by the SHA-256 of their content."""
+
+    def __init__(self, root: str):
+        """
+        :param root: The directory holding the blobs; created if missing.
+        """
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def writer(self, max_bytes: int) -> BlobWriter:
+        """
+        Start writing a blob.
+
+        :param max_bytes: The largest blob accepted.
+        :return: A writer to stream the blob into.
+        """
+        return BlobWriter(self, max_bytes)
+
+    def relative_path(self, digest: str) -> str:
+        """
+        Return a blob's path relative to the store root.
+
+        :param digest: The blob's SHA-256 as a hex digest.
+        :return: The path, e.g. ``ab/cd/abcd…``.
+        :raises ValueError: If the digest is not a SHA-256 hex digest.
+        """
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError("Invalid blob digest: %r" % digest)
+        return os.path.join(digest[:2], digest[2:4], digest)
+
+    def path(self, digest: str) -> str:
+        """
+        Return the absolute path of a blob.
+
+        :param digest: The blob's SHA-256 as a hex digest.
+        :return: Where the blob is, or would be, stored.
+        """
+        return os.path.join(self.root, self.relative_path(digest))
+
+    def remove(self, digest: str):
+        """
+        Delete a blob, if it exists.
+
+        :param digest: The blob's SHA-256 as a hex digest.
+        """
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
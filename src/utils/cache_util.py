@@ -0,0 +1,120 @@
+"""
+In-process cache utility module.
+
+This module contains a small thread-safe LRU cache with per-entry expiry, used to keep
+hot lookups such as token verification off the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A bounded LRU cache whose entries also expire after a per-entry time to live.
+
+    The entry count never exceeds ``maxsize``; inserting into a full cache evicts the least
+    recently used entry.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: The maximum number of entries held at once.
+        :param ttl: The default time to live of an entry, in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for ``key`` and mark it as recently used.
+
+        :param key: The cache key.
+        :param default: The value returned on a miss or an expired entry.
+        :return: The cached value, or ``default``.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Store ``value`` under ``key``.
+
+        :param key: The cache key.
+        :param value: The value to cache.
+        :param ttl: Time to live for this entry, capped at the cache default.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """
+        Remove ``key`` from the cache.
+
+        :param key: The cache key.
+        :param default: The value returned if the key was not cached.
+        :return: The removed value, or ``default``.
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def discard_where(self, predicate) -> int:
+        """
+        Remove every entry whose value satisfies ``predicate``.
+
+        :param predicate: A callable taking a cached value and returning a bool.
+        :return: The number of entries removed.
+        """
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """
+        Return the cache size and hit/miss counters.
+
+        :return: A dictionary of cache statistics.
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self.maxsize,
+                "hits_total": self.hits,
+                "misses_total": self.misses,
+                "evictions_total": self.evictions,
+            }
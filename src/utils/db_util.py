@@ -1,20 +1,488 @@
+import asyncio
+import contextvars
+import functools
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from fastapi import HTTPException
 import psycopg2
+from psycopg2 import extensions
+from src.utils.metrics_util import REGISTRY, Ewma
+from src.utils.query_util import STATEMENTS, Statement
 
 load_dotenv()
 
-def get_db_connection():
-     """
-    Create and return a connection to the database.
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5.0'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv('DB_POOL_HEALTHCHECK_AFTER', '30.0'))
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', str(DB_POOL_MAX_SIZE)))
+
+DB_QUERY_SECONDS = REGISTRY.histogram("db_query_duration_seconds", "Time spent executing each registered statement.", ("statement",))
+# Recent statement latency, used to shed load while the database is struggling.
+DB_QUERY_LATENCY = Ewma()
+
+# When set to a list, get_db_connection records the connections it hands out in it for as
+# long as they are checked out, so middleware can reuse a request's own connection.
+REQUEST_CONNECTIONS = contextvars.ContextVar("request_connections", default=None)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be acquired within the pool timeout."""
+
+
+class PreparingCursor(extensions.cursor):
+    """
+    A cursor that runs registered statements as server-side prepared statements.
+
+    The first time a connection executes a ``Statement`` it is prepared under its name;
+    later executions on that connection send only ``EXECUTE`` with the parameters, so
+    Postgres skips parsing and planning. Each execution is timed under the statement's
+    name. Plain SQL strings are executed unchanged and untimed.
+    """
+
+    def execute(self, query, vars=None):
+        if not isinstance(query, Statement):
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            if not query.prepare:
+                return super().execute(query, vars)
+            prepared = self.connection.prepared
+            if query.name not in prepared:
+                super().execute(query.prepare_sql)
+                prepared.add(query.name)
+            return super().execute(query.execute_sql, vars)
+        finally:
+            elapsed = time.perf_counter() - started
+            DB_QUERY_SECONDS.observe(elapsed, query.name)
+            DB_QUERY_LATENCY.update(elapsed)
+
+
+class PreparingConnection(extensions.connection):
+    """A connection whose cursors prepare registered statements; tracks what it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Prepared statements live as long as the session; a rollback does not deallocate them.
+        self.prepared = set()
+        self.cursor_factory = PreparingCursor
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of PostgreSQL connections.
+
+    Connections are opened lazily up to ``maxconn`` and handed out in LIFO order so
+    that the hottest connections are reused first. Callers that find the pool
+    exhausted wait up to ``timeout`` seconds for a connection to be returned.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float = DB_POOL_TIMEOUT,
+                 healthcheck_after: float = DB_POOL_HEALTHCHECK_AFTER, connect=psycopg2.connect, **connect_kwargs):
+        """
+        Create the pool and open ``minconn`` connections.
+
+        :param minconn: The number of connections opened up front and kept idle.
+        :param maxconn: The maximum number of connections the pool will ever open.
+        :param timeout: How long, in seconds, getconn waits for a free connection.
+        :param healthcheck_after: Idle time, in seconds, after which a connection is pinged on checkout.
+        :param connect: The factory used to open new connections.
+        :param connect_kwargs: Keyword arguments forwarded to ``connect``.
+        """
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: minconn=%s maxconn=%s" % (minconn, maxconn))
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._connect = connect
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._closed = False
+        self._acquired = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        for _ in range(minconn):
+            self._size += 1
+            try:
+                conn = self._connect(**self._connect_kwargs)
+            except Exception:
+                self._size -= 1
+                raise
+            self._idle.append((conn, time.monotonic()))
+
+    def getconn(self, timeout: float = None):
+        """
+        Check a connection out of the pool.
+
+        :param timeout: Override of the pool timeout for this call.
+        :return: A healthy database connection.
+        :raises PoolTimeout: If no connection became available in time.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            conn, idle_since, reserved = self._checkout(deadline)
+            if reserved:
+                try:
+                    conn = self._connect(**self._connect_kwargs)
+                except Exception:
+                    self._release_slot()
+                    raise
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+            self._record_wait(time.monotonic() - started)
+            return conn
+
+    def putconn(self, conn, close: bool = False):
+        """
+        Return a connection to the pool, rolling back any open transaction.
+
+        :param conn: The connection previously obtained from getconn.
+        :param close: Close the connection instead of keeping it idle.
+        """
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+        if close or conn.closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._size -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Return a snapshot of the pool's sizing statistics.
+
+        :return: A dictionary of gauges and counters describing the pool.
+        """
+        with self._cond:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "acquired_total": self._acquired,
+                "timeouts_total": self._timeouts,
+                "discarded_total": self._discarded,
+                "wait_seconds_total": self._wait_time,
+                "wait_seconds_max": self._max_wait_time,
+            }
+
+    def _checkout(self, deadline: float):
+        with self._cond:
+            self._waiters += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        self._in_use += 1
+                        return conn, idle_since, False
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        self._in_use += 1
+                        return None, None, True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout("Timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._discarded += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _record_wait(self, waited: float):
+        with self._cond:
+            self._acquired += 1
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking database call on the database executor.
+
+    psycopg2 cursors block the calling thread, so services wrap their cursor work in a
+    plain function and await it through this adapter instead of running it on the event loop.
+
+    Args:
+        func: The blocking callable, typically taking the connection as its first argument.
+        *args: Positional arguments forwarded to ``func``.
+        **kwargs: Keyword arguments forwarded to ``func``.
+
+    Returns:
+        The value returned by ``func``. Exceptions raised by ``func`` propagate to the caller.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def fetch_one(db, query: str, params: tuple = None):
+    """
+    Execute a query and return its first row. Meant to be passed to run_db.
 
     Returns:
+        tuple: The first row, or None if the query returned nothing.
+    """
+    with db.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchone()
+
+
+def fetch_all(db, query: str, params: tuple = None):
+    """
+    Execute a query and return all of its rows. Meant to be passed to run_db.
+
+    Returns:
+        list: The result rows.
+    """
+    with db.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
+
+
+def execute_atomic(db, statement: str, params=None):
+    """
+    Execute a single self-contained write statement, commit it and return its first row.
+    Meant to be passed to run_db.
+
+    A fused statement is atomic on its own, so on an idle connection it runs in autocommit
+    mode: one round trip instead of BEGIN, the statement and COMMIT. If the request already
+    has a transaction open, the statement joins it and the transaction is committed.
+
+    Returns:
+        tuple: The first row, or None if the statement returned nothing.
+
+    Raises:
+        psycopg2.Error: If the statement fails; the transaction is rolled back.
+    """
+    if db.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE:
+        db.autocommit = True
+        try:
+            with db.cursor() as cur:
+                cur.execute(statement, params)
+                return cur.fetchone()
+        finally:
+            db.autocommit = False
+    try:
+        with db.cursor() as cur:
+            cur.execute(statement, params)
+            row = cur.fetchone()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return row
+
+
+def get_connect_kwargs() -> dict:
+    """
+    Return the psycopg2.connect arguments configured through the environment.
+
+    Returns:
+        dict: Host, database name and credentials of the application database.
+    """
+    return {
+        "host": os.getenv('DB_HOST'),
+        "database": os.getenv('DB_NAME'),
+        "user": os.getenv('DB_USER'),
+        "password": os.getenv('DB_PASSWORD'),
+    }
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    Returns:
+        ConnectionPool: The shared pool configured from the environment.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, connection_factory=PreparingConnection,
+                                       **get_connect_kwargs())
+    return _pool
+
+
+def prepare_statements(conn) -> int:
+    """
+    Prepare every registered statement on a connection ahead of its first use.
+
+    Statements that fail to prepare, e.g. against a schema that is not migrated yet, are
+    skipped and left to be prepared lazily.
+
+    :param conn: A connection from the pool.
+    :return: The number of statements prepared.
+    """
+    prepared = 0
+    for statement in STATEMENTS.values():
+        if not statement.prepare or statement.name in conn.prepared:
+            continue
+        try:
+            with conn.cursor() as cur:
+                cur.execute(statement.prepare_sql)
+        except psycopg2.Error:
+            conn.rollback()
+            continue
+        conn.prepared.add(statement.name)
+        prepared += 1
+    conn.rollback()
+    return prepared
+
+
+def warm_pool(size: int = DB_POOL_MIN_SIZE) -> int:
+    """
+    Open up to ``size`` pooled connections and prepare the registered statements on each,
+    so the first requests served skip connection setup and PREPARE round trips.
+
+    Args:
+        size: The number of connections to warm, capped at the pool size.
+
+    Returns:
+        int: The number of connections warmed.
+    """
+    pool = get_pool()
+    conns = []
+    try:
+        for _ in range(min(size, pool.maxconn)):
+            conns.append(pool.getconn())
+        for conn in conns:
+            prepare_statements(conn)
+    finally:
+        for conn in conns:
+            pool.putconn(conn)
+    return len(conns)
+
+
+def close_pool():
+    """Close the process-wide connection pool, if one was created."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def get_db_connection():
+    """
+    Check a pooled connection out for the duration of a request.
+
+    Yields:
+        psycopg2.extensions.connection: A connection to the PostgreSQL database. It is rolled
+        back if left mid-transaction and returned to the pool once the request finishes.
+
+    Raises:
+        HTTPException: If no connection became available within the pool timeout.
+    """
+    pool = get_pool()
+    try:
+        conn = pool.getconn()
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database is busy, try again later", headers={"Retry-After": "1"})
+    held = REQUEST_CONNECTIONS.get()
+    if held is not None:
+        held.append(conn)
+    try:
+        yield conn
+    finally:
+        if held is not None:
+            held.remove(conn)
+        pool.putconn(conn)
+
+
+@asynccontextmanager
+async def acquire_db():
+    """
+    Check a pooled connection out for a block of async code, without blocking the event loop.
+
+    Used by long-lived endpoints such as streams, which must not hold a connection for
+    their whole lifetime the way the get_db_connection dependency would.
+
+    Yields:
         psycopg2.extensions.connection: A connection to the PostgreSQL database.
+
+    Raises:
+        HTTPException: If no connection became available within the pool timeout.
     """
-    conn = psycopg2.connect(
-        host=os.getenv('DB_HOST'),
-        database=os.getenv('DB_NAME'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD')
-    )
-    return conn
+    pool = get_pool()
+    try:
+        conn = await run_db(pool.getconn)
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database is busy, try again later", headers={"Retry-After": "1"})
+    try:
+        yield conn
+    finally:
+        await run_db(pool.putconn, conn)
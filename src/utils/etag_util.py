@@ -0,0 +1,122 @@
+"""
+Conditional request utility module.
+
+Listings whose content only changes with a version number are tagged with a strong ETag
+derived from that version and from what identifies the listing. ``VersionIndex`` holds the versions a worker has been told
+about, so that while nothing changes, a conditional request is answered with a 304 and an
+unconditional one from the response cache without touching the database.
+"""
+import hashlib
+import threading
+from src.utils.cache_util import TTLCache
+
+
+def make_etag(version: int, key: tuple) -> str:
+    """
+    Build the strong ETag of a listing at a version.
+
+    The key is hashed into the tag, so that listings sharing a version, such as the pages
+    of one listing, never share an ETag.
+
+    :param version: The listing's version.
+    :param key: What identifies the listing, made of ints, strings, booleans and None.
+    :return: The quoted entity tag.
+    """
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+    return f'"v{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check an If-None-Match header against the current ETag.
+
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, so a ``W/`` prefix
+    added by an intermediary does not defeat the match.
+
+    :param if_none_match: The request header, or None.
+    :param etag: The current entity tag.
+    :return: True if the client's representation is current and a 304 may be sent.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class VersionIndex:
+    """
+    The latest known version of each key, such as a group, learned from change notifications.
+
+    Versions only move forward. A version read from the database is stored with ``put``,
+    which discards it if a notification arrived while it was being read, so a slow reader
+    cannot roll a key back. Entries expire after ``ttl`` seconds as a safety net against
+    lost notifications.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: The maximum number of keys held at once.
+        :param ttl: Seconds after which a version must be read from the database again.
+        """
+        self._versions = TTLCache(maxsize, ttl)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the key's latest known version.
+
+        :param key: The key.
+        :return: The version, or None if it is not known.
+        """
+        return self._versions.get(key)
+
+    def generation(self) -> int:
+        """
+        Return a token to pass to ``put``, taken before reading a version from the database.
+
+        :return: The number of changes recorded so far.
+        """
+        with self._lock:
+            return self._generation
+
+    def put(self, key, version: int, generation: int):
+        """
+        Store a version read from the database, unless the index changed since ``generation``.
+
+        :param key: The key.
+        :param version: The version that was read.
+        :param generation: The value of ``generation()`` before the read.
+        """
+        with self._lock:
+            if generation == self._generation and self._versions.get(key) is None:
+                self._versions.set(key, version)
+
+    def advance(self, keys, version: int):
+        """
+        Record that the keys changed to ``version``.
+
+        :param keys: The keys that changed.
+        :param version: Their new version.
+        """
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                current = self._versions.get(key)
+                if current is None or current < version:
+                    self._versions.set(key, version)
+
+    def clear(self):
+        """Forget every version, e.g. when notifications may have been missed."""
+        with self._lock:
+            self._generation += 1
+            self._versions.clear()
+
+    def stats(self) -> dict:
+        """
+        Return the index size and hit/miss counters.
+
+        :return: A dictionary of statistics.
+        """
+        return self._versions.stats()
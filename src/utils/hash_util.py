@@ -0,0 +1,139 @@
+"""
+Password hashing utility module.
+
+bcrypt is deliberately slow, so hashing and verification run on a dedicated, bounded
+worker pool instead of the event loop. When the pool's queue is full new work is shed
+with a 503 rather than letting a login storm starve every other request.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from fastapi import HTTPException
+from src.utils.metrics_util import REGISTRY
+
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(os.cpu_count() or 1)))
+BCRYPT_MAX_QUEUE = int(os.getenv('BCRYPT_MAX_QUEUE', str(BCRYPT_WORKERS * 16)))
+
+_BCRYPT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BCRYPT_SECONDS = REGISTRY.histogram("bcrypt_duration_seconds", "Time spent hashing or verifying one password.",
+                                    buckets=_BCRYPT_BUCKETS)
+BCRYPT_QUEUE_SECONDS = REGISTRY.histogram("bcrypt_queue_wait_seconds", "Time a password waited for a free hashing thread.",
+                                          buckets=_BCRYPT_BUCKETS)
+
+
+class HashingPool:
+    """
+    A fixed-size thread pool with a bounded queue for CPU-heavy password work.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism across cores
+    without the pickling overhead of a process pool.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        """
+        :param workers: The number of hashing threads, normally the number of cores.
+        :param max_queue: How many calls may wait for a free thread before new ones are rejected.
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._queue_wait = 0.0
+        self._hash_time = 0.0
+
+    async def submit(self, func, *args):
+        """
+        Run ``func`` on the pool and wait for its result.
+
+        A call counts against the queue until its thread is done with it, even if the caller
+        is cancelled meanwhile, since bcrypt cannot be interrupted once started.
+
+        :param func: The blocking callable to run.
+        :param args: Positional arguments forwarded to ``func``.
+        :return: The value returned by ``func``.
+        :raises HTTPException: 503 if the queue is already full.
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"})
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), func, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        """
+        Return queue and timing counters for the pool.
+
+        :return: A dictionary with the current queue depth and cumulative wait and hash times.
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "completed_total": self._completed,
+                "rejected_total": self._rejected,
+                "queue_wait_seconds_total": self._queue_wait,
+                "hash_seconds_total": self._hash_time,
+            }
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _timed(self, submitted: float, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._completed += 1
+                self._queue_wait += started - submitted
+                self._hash_time += finished - started
+            BCRYPT_QUEUE_SECONDS.observe(started - submitted)
+            BCRYPT_SECONDS.observe(finished - started)
+
+
+HASHING_POOL = HashingPool(BCRYPT_WORKERS, BCRYPT_MAX_QUEUE)
+
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a password with a fresh salt on the hashing pool.
+
+    :param password: The plain-text password.
+    :return: The bcrypt hash, as a string.
+    """
+    return await HASHING_POOL.submit(_hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """
+    Check a password against a stored bcrypt hash on the hashing pool.
+
+    :param password: The plain-text password.
+    :param hashed: The stored bcrypt hash.
+    :return: True if the password matches.
+    """
+    return await HASHING_POOL.submit(_verify, password, hashed)
@@ -0,0 +1,106 @@
+"""
+Worker lifecycle utility module.
+
+A worker warms up before it accepts traffic: it opens and prepares its pooled database
+connections and imports the modules the first requests would otherwise load lazily.
+``READINESS`` tracks whether the worker should receive traffic; ``/health/ready`` reports
+it, so load balancers and the ``serve.py`` launcher only route to warm workers and stop
+routing to draining ones.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import time
+from src.utils.db_util import DB_POOL_MIN_SIZE, run_db, warm_pool
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', '1') == '1'
+WARMUP_CONNECTIONS = int(os.getenv('WARMUP_CONNECTIONS', str(max(1, DB_POOL_MIN_SIZE))))
+WARMUP_RETRY_INTERVAL = float(os.getenv('WARMUP_RETRY_INTERVAL', '5'))
+
+# Imported on first use by request handlers; loading them up front keeps that off the first requests.
+WARMUP_MODULES = ("bcrypt", "jwt", "orjson", "psycopg2.extras", "python_multipart")
+
+
+class Readiness:
+    """Whether this worker is warm and not draining, with the time it took to get there."""
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.started = time.monotonic()
+        self.ready_after = None
+
+    def mark_ready(self):
+        if self.draining:
+            return
+        self.ready = True
+        self.ready_after = time.monotonic() - self.started
+
+    def mark_draining(self):
+        self.draining = True
+        self.ready = False
+
+
+READINESS = Readiness()
+
+_retry_task = None
+
+
+async def warm_up(connections: int = WARMUP_CONNECTIONS, retry_interval: float = WARMUP_RETRY_INTERVAL) -> int:
+    """
+    Prepare this worker to serve its first requests at full speed, then mark it ready.
+
+    A database that cannot be reached does not stop the worker from starting, but it is not
+    marked ready either: the warm-up is retried in the background every ``retry_interval``
+    seconds, and ``/health/ready`` keeps answering 503 until it succeeds.
+
+    :param connections: The number of pooled connections to open and prepare.
+    :param retry_interval: Seconds between attempts while the database cannot be reached.
+    :return: The number of connections warmed, 0 while the warm-up is being retried.
+    """
+    global _retry_task
+    if not WARMUP_ENABLED:
+        _mark_ready(0)
+        return 0
+    for name in WARMUP_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    try:
+        warmed = await run_db(warm_pool, connections)
+    except Exception:
+        logger.warning("Database warm-up failed, retrying every %.1f s before reporting ready", retry_interval, exc_info=True)
+        _retry_task = asyncio.get_running_loop().create_task(_retry_warm_up(connections, retry_interval))
+        return 0
+    _mark_ready(warmed)
+    return warmed
+
+
+def cancel_warm_up():
+    """Stop retrying a failed warm-up, e.g. when the worker shuts down."""
+    global _retry_task
+    if _retry_task is not None:
+        _retry_task.cancel()
+        _retry_task = None
+
+
+async def _retry_warm_up(connections: int, retry_interval: float):
+    while not READINESS.draining:
+        await asyncio.sleep(retry_interval)
+        try:
+            warmed = await run_db(warm_pool, connections)
+        except Exception as e:
+            logger.info("Database warm-up failed again: %s", e)
+            continue
+        _mark_ready(warmed)
+        return
+
+
+def _mark_ready(warmed: int):
+    READINESS.mark_ready()
+    if READINESS.ready:
+        logger.info("Worker %d ready in %.3f s with %d warm connections", os.getpid(), READINESS.ready_after, warmed)
@@ -0,0 +1,150 @@
+"""
+Group membership index utility module.
+
+This module contains an in-process index of group members used to authorize writes
+without a database round trip.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class MemberSet:
+    """An immutable, compact set of user ids stored as a sorted array of 64-bit integers."""
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, user_ids):
+        self._ids = array('q', sorted(set(user_ids)))
+
+    def __contains__(self, user_id: int) -> bool:
+        position = bisect_left(self._ids, user_id)
+        return position < len(self._ids) and self._ids[position] == user_id
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def union(self, user_ids) -> "MemberSet":
+        """Return a new set containing these members and ``user_ids``."""
+        return MemberSet(list(self._ids) + list(user_ids))
+
+
+class MembershipIndex:
+    """
+    Maps group ids to their member sets, loaded lazily per group.
+
+    Memory is bounded by the total number of member ids held across all groups; the least
+    recently used groups are evicted first. Entries also expire after ``ttl`` seconds so
+    that a missed invalidation can never be served forever.
+    """
+
+    def __init__(self, max_members: int, ttl: float):
+        """
+        :param max_members: The maximum number of member ids held across all groups.
+        :param ttl: Seconds after which a loaded group is reloaded.
+        """
+        self.max_members = max_members
+        self.ttl = ttl
+        self._groups = OrderedDict()
+        self._size = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, group_id: int):
+        """
+        Return the cached members of a group.
+
+        :param group_id: The ID of the group.
+        :return: The group's MemberSet, or None if it is not loaded.
+        """
+        with self._lock:
+            entry = self._groups.get(group_id)
+            if entry is None or entry[1] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._groups.move_to_end(group_id)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        """
+        Return a token to take before loading a group from the database.
+
+        Passing it back to ``put`` discards the load if any invalidation happened meanwhile.
+        """
+        return self._generation
+
+    def put(self, group_id: int, members: MemberSet, generation: int = None):
+        """
+        Store the members of a group.
+
+        :param group_id: The ID of the group.
+        :param members: The group's members.
+        :param generation: The value of ``generation()`` taken before the members were read.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._store(group_id, members)
+
+    def add_members(self, group_id: int, user_ids):
+        """
+        Add members to a group if it is loaded.
+
+        A load of the group already in progress may have read the members before these were
+        added, so it is discarded as for ``invalidate``.
+        """
+        with self._lock:
+            self._generation += 1
+            entry = self._groups.get(group_id)
+            if entry is not None:
+                self._store(group_id, entry[0].union(user_ids))
+
+    def invalidate(self, group_id: int):
+        """Drop a group so that the next check reloads it."""
+        with self._lock:
+            self._generation += 1
+            entry = self._groups.pop(group_id, None)
+            if entry is not None:
+                self._size -= len(entry[0])
+
+    def clear(self):
+        """Drop every group."""
+        with self._lock:
+            self._generation += 1
+            self._groups.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        """
+        Return the index size and hit/miss counters.
+
+        :return: A dictionary of index statistics.
+        """
+        with self._lock:
+            return {
+                "groups": len(self._groups),
+                "members": self._size,
+                "max_members": self.max_members,
+                "hits_total": self.hits,
+                "misses_total": self.misses,
+            }
+
+    def _store(self, group_id: int, members: MemberSet):
+        previous = self._groups.pop(group_id, None)
+        if previous is not None:
+            self._size -= len(previous[0])
+        if len(members) > self.max_members:
+            return
+        self._groups[group_id] = (members, time.monotonic() + self.ttl)
+        self._size += len(members)
+        while self._size > self.max_members:
+            _, (evicted, _) = self._groups.popitem(last=False)
+            self._size -= len(evicted)
@@ -0,0 +1,218 @@
+"""
+Metrics utility module.
+
+A small, dependency-free implementation of Prometheus counters, gauges and histograms.
+Recording a value is a dictionary lookup, a bisect and an increment under a lock, cheap
+enough to instrument every request and query in production. ``REGISTRY.render()``
+produces the text exposition format served by ``/metrics``.
+"""
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond queries to slow requests.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self._samples(labelvalues, value))
+        return lines
+
+    def _samples(self, labelvalues: tuple, value) -> list:
+        return [f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def set(self, value: float, *labelvalues):
+        """Mirror a total that is counted elsewhere, such as a connection pool's statistics."""
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, typically set from a snapshot when scraped."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(_Metric):
+    """Counts observations into cumulative buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _samples(self, labelvalues: tuple, value) -> list:
+        counts, total = value
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _labels(self.labelnames + ("le",), labelvalues + (_number(bound),))
+            samples.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _labels(self.labelnames, labelvalues)
+        samples.append(f"{self.name}_sum{labels} {_number(total)}")
+        samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class Ewma:
+    """
+    An exponentially weighted moving average of recent samples, such as query latency.
+
+    Updates are unlocked: a lost update under contention only drops one sample.
+    """
+
+    def __init__(self, alpha: float = 0.05):
+        """
+        :param alpha: The weight of each new sample, between 0 and 1.
+        """
+        self.alpha = alpha
+        self.value = 0.0
+        self.updated = 0.0
+
+    def update(self, sample: float):
+        self.value += self.alpha * (sample - self.value)
+        self.updated = time.monotonic()
+
+
+class Registry:
+    """The set of metrics exposed by this process."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        :return: The exposition, ending with a newline.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric name: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending the end of its response.",
+    ("method", "route", "status"))
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware recording every HTTP request's duration by method, route template and status.
+
+    Routes are labelled by their path template (``/groups/{group_id}``) rather than the raw
+    path, so the number of series stays bounded. Streaming responses are timed until their
+    last chunk is sent, files handed to the server with pathsend until they are handed over.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = None
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if (message["type"] == "http.response.body" and not message.get("more_body", False)) or \
+                    message["type"] == "http.response.pathsend":
+                _record(scope, status, started)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            if status is None:
+                _record(scope, 500, started)
+            raise
+
+
+def _record(scope, status: int, started: float):
+    route = scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"],
+                                 getattr(route, "path", "unmatched"), str(status))
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,128 @@
+"""
+Cross-worker notification utility module.
+
+Workers tell each other about changes through Postgres LISTEN/NOTIFY. Writers call
+``notify`` inside their transaction, so the notification is delivered on commit and
+discarded on rollback. Each worker runs one ``NotificationListener`` thread that
+dispatches incoming payloads to the handlers subscribed to their channel.
+"""
+import logging
+import os
+import select
+import threading
+import uuid
+import psycopg2
+from src.utils.db_util import get_connect_kwargs
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker so it can skip notifications it sent itself.
+WORKER_ID = uuid.uuid4().hex[:12]
+
+NOTIFY_RECONNECT_DELAY = float(os.getenv('NOTIFY_RECONNECT_DELAY', '1.0'))
+
+
+def notify(cur, channel: str, payload: str):
+    """
+    Queue a notification on the cursor's transaction; it is sent when the transaction commits.
+
+    :param cur: A cursor of the transaction making the change.
+    :param channel: The channel to notify.
+    :param payload: The payload, at most 8000 bytes.
+    """
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+def notify_many(cur, channel: str, payloads: list):
+    """
+    Queue several notifications on the cursor's transaction with a single statement.
+
+    :param cur: A cursor of the transaction making the change.
+    :param channel: The channel to notify.
+    :param payloads: The payloads, each at most 8000 bytes.
+    """
+    cur.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload", (channel, payloads))
+
+
+class NotificationListener:
+    """A background thread that listens on a dedicated connection and dispatches notifications."""
+
+    def __init__(self, connect_kwargs: dict = None):
+        """
+        :param connect_kwargs: Arguments for psycopg2.connect; defaults to the application database.
+        """
+        self._connect_kwargs = connect_kwargs
+        self._handlers = {}
+        self._reconnect_callbacks = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.connected = False
+
+    def subscribe(self, channel: str, handler):
+        """
+        Call ``handler(payload)`` for every notification on ``channel``.
+
+        Handlers run on the listener thread and must be thread-safe.
+        """
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def on_reconnect(self, callback):
+        """
+        Call ``callback()`` every time the listener (re)connects.
+
+        Notifications sent while disconnected are lost, so caches kept coherent through the
+        listener should drop their state here.
+        """
+        self._reconnect_callbacks.append(callback)
+
+    def start(self):
+        """Start the listener thread if it is not already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="notify-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the listener thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**(self._connect_kwargs or get_connect_kwargs()))
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    for channel in self._handlers:
+                        cur.execute("LISTEN %s" % channel)
+                self.connected = True
+                for callback in self._reconnect_callbacks:
+                    callback()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        self._dispatch(notification.channel, notification.payload)
+            except psycopg2.Error:
+                logger.warning("Notification listener disconnected, retrying", exc_info=True)
+                self._stop.wait(NOTIFY_RECONNECT_DELAY)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+
+    def _dispatch(self, channel: str, payload: str):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Notification handler failed on channel %s", channel)
+
+
+LISTENER = NotificationListener()
@@ -0,0 +1,97 @@
+"""
+Pagination utility module.
+
+Listings are paginated by keyset: a page is addressed by the last key seen rather than
+an offset, so deep pages cost the same as the first one. Keys are handed to clients as
+opaque cursors and returned through response headers.
+"""
+import base64
+import binascii
+import json
+import math
+import os
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '200'))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+
+# Cursor keys are BIGINT columns unless decoded as floats.
+BIGINT_MIN = -2 ** 63
+BIGINT_MAX = 2 ** 63 - 1
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Encode a keyset position as an opaque cursor.
+
+    :param position: The keys identifying the position, e.g. ``{"before": 42}``.
+    :return: A URL-safe cursor string.
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip("=")
+
+
+def decode_cursor(cursor: str, float_keys=()) -> dict:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    :param cursor: The opaque cursor sent by the client.
+    :param float_keys: The keys whose value is a finite number rather than a BIGINT.
+    :return: The keyset position.
+    :raises HTTPException: 400 if the cursor is malformed or holds a value out of range.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw, parse_constant=_reject_constant)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict) or not all(
+            _valid_float(value) if key in float_keys else _valid_bigint(value) for key, value in position.items()):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+def _reject_constant(name: str):
+    raise ValueError("%s is not a valid cursor value" % name)
+
+
+def _valid_bigint(value) -> bool:
+    return type(value) is int and BIGINT_MIN <= value <= BIGINT_MAX
+
+
+def _valid_float(value) -> bool:
+    return type(value) in (int, float) and math.isfinite(value)
+
+
+def next_page_cursor(items: list, limit: int, key="id") -> str:
+    """
+    Return the cursor of the page following ``items`` when paging forward by ``key``.
+
+    :param items: The current page, ordered by ``key`` ascending.
+    :param limit: The page size that was requested.
+    :param key: The attribute of the items the listing is ordered by, or its column index for raw rows.
+    :return: A cursor if the page was full, otherwise None.
+    """
+    if len(items) < limit or not items:
+        return None
+    last = items[-1]
+    return encode_cursor({"after": last[key] if isinstance(key, int) else getattr(last, key)})
+
+
+def cursor_headers(next_cursor: str = None, prev_cursor: str = None) -> dict:
+    """
+    Build the response headers advertising the neighbouring pages.
+
+    :param next_cursor: The cursor of the following page, if any.
+    :param prev_cursor: The cursor of the preceding page, if any.
+    :return: A dictionary of headers.
+    """
+    headers = {}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if prev_cursor:
+        headers[PREV_CURSOR_HEADER] = prev_cursor
+    return headers
@@ -0,0 +1,130 @@
+"""
+In-process publish/subscribe utility module.
+
+A Broker fans events out to every subscriber of a topic. Each subscriber owns a bounded
+queue; a subscriber that falls so far behind that its queue fills up is evicted instead
+of letting it hold memory or slow down publishers.
+"""
+import asyncio
+import threading
+
+
+class Subscription:
+    """A subscriber's view of one topic. Iterate it to receive events."""
+
+    def __init__(self, broker: "Broker", topic, maxsize: int):
+        self.broker = broker
+        self.topic = topic
+        self.evicted = False
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = asyncio.Event()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.next()
+
+    async def next(self, timeout: float = None):
+        """
+        Wait for the next event.
+
+        :param timeout: Seconds to wait before giving up, or None to wait indefinitely.
+        :return: The next event, or None if ``timeout`` elapsed first.
+        :raises StopAsyncIteration: If the subscription was closed and every event was delivered.
+        """
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        if self._closed.is_set():
+            raise StopAsyncIteration
+        getter = asyncio.ensure_future(self._queue.get())
+        closer = asyncio.ensure_future(self._closed.wait())
+        try:
+            await asyncio.wait((getter, closer), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closer.cancel()
+            if not getter.done():
+                getter.cancel()
+        if getter.done() and not getter.cancelled():
+            return getter.result()
+        if self._closed.is_set():
+            raise StopAsyncIteration
+        return None
+
+    def offer(self, event) -> bool:
+        """Queue an event; return False if the queue is full."""
+        if self._closed.is_set():
+            return True
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self, evicted: bool = False):
+        """Stop the subscription; pending events are still delivered."""
+        self.evicted = self.evicted or evicted
+        self._closed.set()
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Fans events out to the subscribers of a topic on one event loop."""
+
+    def __init__(self, queue_size: int):
+        """
+        :param queue_size: The number of undelivered events a subscriber may have before it is evicted.
+        """
+        self.queue_size = queue_size
+        self._topics = {}
+        self._loop = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.evictions = 0
+
+    def subscribe(self, topic) -> Subscription:
+        """
+        Subscribe to ``topic``. Must be called from the event loop that will deliver events.
+
+        :param topic: The topic, e.g. a group ID.
+        :return: A new Subscription.
+        """
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self, topic, self.queue_size)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove a subscription from its topic."""
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
+
+    def publish(self, topic, event):
+        """
+        Deliver ``event`` to every subscriber of ``topic``. Must be called from the event loop.
+
+        Subscribers whose queue is full are evicted.
+        """
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        self.published += 1
+        for subscription in subscribers:
+            if not subscription.offer(event):
+                self.evictions += 1
+                subscription.close(evicted=True)
+
+    def publish_threadsafe(self, topic, event):
+        """Deliver ``event`` from a thread other than the event loop's."""
+        loop = self._loop
+        if loop is not None and topic in self._topics and not loop.is_closed():
+            loop.call_soon_threadsafe(self.publish, topic, event)
+
+    def subscriber_count(self) -> int:
+        """Return the number of active subscriptions across all topics."""
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._topics.values())
@@ -1,24 +1,373 @@
-
 """
 SQL query utility module.
 
-This module contains SQL queries used throughout the application.
+This module is the registry of SQL statements used throughout the application. Each
+statement is a ``Statement``: a plain SQL string that also carries a unique name, so
+pooled connections can prepare it server-side once and execute it by name afterwards.
 """
+import re
+
+STATEMENTS = {}
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+class Statement(str):
+    """
+    A named SQL statement.
+
+    A Statement is a ``str`` holding its psycopg2 SQL, so it can be passed to any cursor.
+    Cursors of pooled connections recognise it and run it as a prepared statement.
+    """
+
+    def __new__(cls, name: str, sql: str, prepare: bool = True):
+        """
+        Create and register a statement.
+
+        :param name: The unique name the statement is prepared under.
+        :param sql: The SQL, using either ``%s`` or ``%(name)s`` placeholders.
+        :param prepare: Whether the statement may be prepared; statements whose text is
+            expanded at runtime, such as ``execute_values`` templates, must not be.
+        :raises ValueError: If a statement with this name is already registered.
+        """
+        if name in STATEMENTS:
+            raise ValueError(f"Duplicate statement name: {name}")
+        statement = super().__new__(cls, sql)
+        statement.name = name
+        statement.prepare = prepare
+        statement.prepare_sql, statement.execute_sql = _prepared_forms(name, sql)
+        STATEMENTS[name] = statement
+        return statement
+
+
+def _prepared_forms(name: str, sql: str):
+    parameters = []
 
-SELECT_USER_BY_USERNAME = "SELECT id, username, password, is_admin FROM users WHERE username = %s"
-INSERT_USER = "INSERT INTO users (username, password, is_admin) VALUES (%s, %s, %s) RETURNING id, username, is_admin"
-UPDATE_USER = "UPDATE users SET username = %s, password = %s, is_admin = %s WHERE id = %s RETURNING id, username, is_admin"
-INSERT_GROUP = "INSERT INTO groups (name) VALUES (%s) RETURNING id, name"
-INSERT_GROUP_MEMBER = "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)"
-SELECT_GROUP_MEMBER = "SELECT user_id FROM group_members WHERE group_id = %s AND user_id = %s"
-DELETE_GROUP = "DELETE FROM groups WHERE id = %s"
-SELECT_GROUPS = """
+    def number(match):
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(0) == "%s":
+            parameters.append("%s")
+            return f"${len(parameters)}"
+        placeholder = f"%({match.group(1)})s"
+        if placeholder not in parameters:
+            parameters.append(placeholder)
+        return f"${parameters.index(placeholder) + 1}"
+
+    prepare_sql = f"PREPARE {name} AS {_PLACEHOLDER.sub(number, sql)}"
+    if "%s" in parameters and len(parameters) != parameters.count("%s"):
+        raise ValueError(f"Statement {name} mixes positional and named placeholders")
+    execute_sql = f"EXECUTE {name} ({', '.join(parameters)})" if parameters else f"EXECUTE {name}"
+    return prepare_sql, execute_sql
+
+
+SELECT_USER_BY_USERNAME = Statement("select_user_by_username", "SELECT id, username, password, is_admin FROM users WHERE username = %s")
+SELECT_AUTH_USER = Statement("select_auth_user", "SELECT id, username, is_admin FROM users WHERE username = %s")
+SELECT_USER_ID_BY_USERNAME = Statement("select_user_id_by_username", "SELECT id FROM users WHERE username = %s")
+INSERT_USER = Statement("insert_user", "INSERT INTO users (username, password, is_admin) VALUES (%s, %s, %s) RETURNING id, username, is_admin")
+UPDATE_USER = Statement("update_user", "UPDATE users SET username = %s, password = %s, is_admin = %s WHERE id = %s RETURNING id, username, is_admin")
+INSERT_GROUP = Statement("insert_group", "INSERT INTO groups (name) VALUES (%s) RETURNING id, name")
+INSERT_GROUP_MEMBER = Statement("insert_group_member", "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s)")
+INSERT_GROUP_MEMBERS_BULK = Statement("insert_group_members_bulk", """
+    WITH requested AS (
+        SELECT DISTINCT unnest(%s::bigint[]) AS user_id
+    ), inserted AS (
+        INSERT INTO group_members (group_id, user_id)
+        SELECT %s, r.user_id FROM requested r JOIN users u ON u.id = r.user_id
+        ON CONFLICT DO NOTHING
+        RETURNING user_id
+    )
+    SELECT r.user_id,
+           CASE WHEN i.user_id IS NOT NULL THEN 'added'
+                WHEN u.id IS NULL THEN 'unknown_user'
+                ELSE 'already_member' END
+    FROM requested r
+    LEFT JOIN inserted i ON i.user_id = r.user_id
+    LEFT JOIN users u ON u.id = r.user_id
+""")
+SELECT_GROUP_MEMBER = Statement("select_group_member", "SELECT user_id FROM group_members WHERE group_id = %s AND user_id = %s")
+SELECT_GROUP_MEMBER_IDS = Statement("select_group_member_ids", "SELECT user_id FROM group_members WHERE group_id = %s")
+DELETE_GROUP = Statement("delete_group", "DELETE FROM groups WHERE id = %s")
+SELECT_GROUPS_PAGE = Statement("select_groups_page", """
     SELECT g.id, g.name, array_agg(u.id), array_agg(u.username), array_agg(u.is_admin)
-    FROM groups g
-    JOIN group_members gm ON g.id = gm.group_id
-    JOIN users u ON gm.user_id = u.id
+    FROM (SELECT id, name FROM groups WHERE id > %s ORDER BY id LIMIT %s) g
+    LEFT JOIN group_members gm ON g.id = gm.group_id
+    LEFT JOIN users u ON gm.user_id = u.id
+    GROUP BY g.id, g.name
+    ORDER BY g.id
+""")
+SELECT_GROUP_SUMMARIES_PAGE = Statement("select_group_summaries_page", """
+    SELECT g.id, g.name, count(gm.user_id)
+    FROM (SELECT id, name FROM groups WHERE id > %s ORDER BY id LIMIT %s) g
+    LEFT JOIN group_members gm ON g.id = gm.group_id
     GROUP BY g.id, g.name
+    ORDER BY g.id
+""")
+SELECT_GROUP_MEMBERS_PAGE = Statement("select_group_members_page", """
+    SELECT u.id, u.username, u.is_admin
+    FROM group_members gm
+    JOIN users u ON gm.user_id = u.id
+    WHERE gm.group_id = %s AND gm.user_id > %s
+    ORDER BY gm.user_id
+    LIMIT %s
+""")
+# Listing versions: group_versions holds the group_version_seq value of the latest change to
+# each group, and to any group under group_id 0. Bumps the groups in %(group_ids)s, those
+# %(user_id)s belongs to and group 0 to one new version, and notifies the workers with
+# "version:group_id,..." ("version:*" beyond %(max_groups)s groups). Returns one row:
+# (version, groups, notified) where groups is the payload's list of groups.
+BUMP_GROUP_VERSIONS = Statement("bump_group_versions", """
+    WITH next AS (
+        SELECT nextval('group_version_seq') AS version
+    ), bumped AS (
+        INSERT INTO group_versions (group_id, version)
+        SELECT DISTINCT g.group_id, next.version
+        FROM unnest(%(group_ids)s::bigint[] || ARRAY(SELECT group_id FROM group_members WHERE user_id = %(user_id)s::bigint)
+                    || 0::bigint) AS g (group_id), next
+        ON CONFLICT (group_id) DO UPDATE SET version = GREATEST(group_versions.version, EXCLUDED.version)
+        RETURNING group_id, version
+    ), changed AS (
+        SELECT max(version) AS version,
+               CASE WHEN count(*) > %(max_groups)s::int THEN '*' ELSE string_agg(group_id::text, ',' ORDER BY group_id) END AS groups
+        FROM bumped
+    ), notified AS (
+        SELECT pg_notify(%(channel)s::text, c.version || ':' || c.groups) FROM changed c
+    )
+    SELECT c.version, c.groups, (SELECT count(*) FROM notified) FROM changed c
+""")
+SELECT_GROUP_VERSION = Statement("select_group_version", "SELECT COALESCE(max(version), 0) FROM group_versions WHERE group_id = %s")
+# Also moves the sender's read marker past the new messages.
+INSERT_MESSAGES_BATCH = Statement("insert_messages_batch", """
+    WITH inserted AS (
+        INSERT INTO messages (group_id, user_id, content) VALUES %s RETURNING id, group_id, user_id, content, likes
+    ), read AS (
+        UPDATE group_members gm SET last_read_id = GREATEST(gm.last_read_id, i.last_id)
+        FROM (SELECT group_id, user_id, max(id) AS last_id FROM inserted GROUP BY group_id, user_id) i
+        WHERE gm.group_id = i.group_id AND gm.user_id = i.user_id
+    )
+    SELECT id, group_id, content, likes FROM inserted
+""", prepare=False)
+INSERT_MESSAGE_LIKES_BATCH = Statement("insert_message_likes_batch", "INSERT INTO message_likes (message_id, user_id) VALUES %s ON CONFLICT DO NOTHING RETURNING message_id",
+                                       prepare=False)
+UPDATE_MESSAGE_LIKES_BATCH = Statement("update_message_likes_batch", "UPDATE messages AS m SET likes = m.likes + v.n FROM (VALUES %s) AS v (id, n) WHERE m.id = v.id RETURNING m.id, m.group_id, m.likes",
+                                       prepare=False)
+# History pages: (id, group_id, content, likes, attachment_ids).
+_MESSAGE_ATTACHMENT_IDS = "ARRAY(SELECT a.id FROM attachments a WHERE a.message_id = m.id ORDER BY a.id)"
+SELECT_MESSAGES_LATEST = Statement("select_messages_latest", f"SELECT m.id, m.group_id, m.content, m.likes, {_MESSAGE_ATTACHMENT_IDS} FROM messages m WHERE m.group_id = %s ORDER BY m.id DESC LIMIT %s")
+SELECT_MESSAGES_BEFORE = Statement("select_messages_before", f"SELECT m.id, m.group_id, m.content, m.likes, {_MESSAGE_ATTACHMENT_IDS} FROM messages m WHERE m.group_id = %s AND m.id < %s ORDER BY m.id DESC LIMIT %s")
+SELECT_MESSAGES_AFTER = Statement("select_messages_after", f"SELECT m.id, m.group_id, m.content, m.likes, {_MESSAGE_ATTACHMENT_IDS} FROM messages m WHERE m.group_id = %s AND m.id > %s ORDER BY m.id ASC LIMIT %s")
+# Export: (id, user_id, username, content, likes) in id order. The cursor variant is
+# declared as a server-side cursor, so it is not prepared.
+EXPORT_MESSAGES_CURSOR = Statement("export_messages_cursor", """
+    SELECT m.id, m.user_id, u.username, m.content, m.likes
+    FROM messages m JOIN users u ON u.id = m.user_id
+    WHERE m.group_id = %s
+    ORDER BY m.id
+""", prepare=False)
+EXPORT_MESSAGES_BATCH = Statement("export_messages_batch", """
+    SELECT m.id, m.user_id, u.username, m.content, m.likes
+    FROM messages m JOIN users u ON u.id = m.user_id
+    WHERE m.group_id = %s AND m.id > %s AND m.id <= %s
+    ORDER BY m.id
+    LIMIT %s
+""")
+SELECT_NEWEST_MESSAGE_ID = Statement("select_newest_message_id", "SELECT COALESCE(max(id), 0) FROM messages WHERE group_id = %s")
+# Attachments are uploaded before the message that references them; message_id is NULL
+# until then.
+INSERT_ATTACHMENT = Statement("insert_attachment", """
+    INSERT INTO attachments (group_id, user_id, sha256, size, content_type, filename)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    RETURNING id
+""")
+SELECT_ATTACHMENT = Statement("select_attachment", "SELECT group_id, sha256, size, content_type, filename FROM attachments WHERE id = %s")
+# Attachment reaping runs rarely, so its statements are not prepared. Deleting attachments
+# records their blobs in unreferenced_blobs (see migration 9).
+# Deletes up to %(limit)s uploads never sent within %(max_age)s seconds; returns how many.
+DELETE_UNSENT_ATTACHMENTS = Statement("delete_unsent_attachments", """
+    WITH deleted AS (
+        DELETE FROM attachments WHERE id IN (
+            SELECT id FROM attachments
+            WHERE message_id IS NULL AND created_at < now() - make_interval(secs => %(max_age)s::float8)
+            ORDER BY created_at
+            LIMIT %(limit)s::int
+        )
+        RETURNING 1
+    )
+    SELECT count(*) FROM deleted
+""", prepare=False)
+# Forgets blobs referenced again by a new upload; deleting that upload will record them again.
+FORGET_REFERENCED_BLOBS = Statement("forget_referenced_blobs", """
+    DELETE FROM unreferenced_blobs u WHERE EXISTS (SELECT 1 FROM attachments a WHERE a.sha256 = u.sha256)
+""", prepare=False)
+# The next %(limit)s blobs after %(after)s that no attachment references any more.
+SELECT_UNREFERENCED_BLOBS = Statement("select_unreferenced_blobs", """
+    SELECT u.sha256 FROM unreferenced_blobs u
+    WHERE u.sha256 > %(after)s::text AND NOT EXISTS (SELECT 1 FROM attachments a WHERE a.sha256 = u.sha256)
+    ORDER BY u.sha256
+    LIMIT %(limit)s::int
+""", prepare=False)
+# Forgets a blob about to be unlinked; returns no row if an attachment references it again.
+DELETE_UNREFERENCED_BLOB = Statement("delete_unreferenced_blob", """
+    DELETE FROM unreferenced_blobs u
+    WHERE u.sha256 = %(sha256)s::text AND NOT EXISTS (SELECT 1 FROM attachments a WHERE a.sha256 = %(sha256)s::text)
+    RETURNING u.sha256
+""", prepare=False)
+# Read markers: group_members.last_read_id is the newest message the member has read.
+# Moves the marker forward to %(message_id)s, or to the group's newest message when it is
+# NULL, never past the newest message. Returns no row when the user is not a member.
+MARK_GROUP_READ = Statement("mark_group_read", """
+    UPDATE group_members gm
+    SET last_read_id = GREATEST(gm.last_read_id, LEAST(COALESCE(%(message_id)s::bigint, newest.id), newest.id))
+    FROM (SELECT COALESCE(max(id), 0) AS id FROM messages WHERE group_id = %(group_id)s::bigint) AS newest
+    WHERE gm.group_id = %(group_id)s::bigint AND gm.user_id = %(user_id)s::bigint
+    RETURNING gm.last_read_id
+""")
+# (group_id, last_read_id, unread) for each of the user's groups with unread messages. Each
+# group's count reads at most %(cap)s index entries past the marker, however long its history.
+SELECT_UNREAD_COUNTS = Statement("select_unread_counts", """
+    SELECT gm.group_id, gm.last_read_id, c.unread
+    FROM group_members gm
+    CROSS JOIN LATERAL (
+        SELECT count(*) AS unread FROM (
+            SELECT 1 FROM messages m WHERE m.group_id = gm.group_id AND m.id > gm.last_read_id ORDER BY m.id LIMIT %(cap)s::int
+        ) AS newer
+    ) AS c
+    WHERE gm.user_id = %(user_id)s::bigint AND c.unread > 0
+    ORDER BY gm.group_id
+""")
+# Full-text search within a group, best match first: (id, group_id, content, likes, attachment_ids, rank).
+# The query is parsed with the same 'simple' configuration that builds messages.content_tsv.
+SEARCH_MESSAGES = Statement("search_messages", f"""
+    SELECT m.id, m.group_id, m.content, m.likes, {_MESSAGE_ATTACHMENT_IDS}, ts_rank(m.content_tsv, q.query) AS rank
+    FROM messages m, websearch_to_tsquery('simple', %(q)s::text) AS q (query)
+    WHERE m.group_id = %(group_id)s::bigint AND m.content_tsv @@ q.query
+    ORDER BY rank DESC, m.id DESC
+    LIMIT %(limit)s::int
+""")
+SEARCH_MESSAGES_AFTER = Statement("search_messages_after", f"""
+    SELECT m.id, m.group_id, m.content, m.likes, {_MESSAGE_ATTACHMENT_IDS}, ts_rank(m.content_tsv, q.query) AS rank
+    FROM messages m, websearch_to_tsquery('simple', %(q)s::text) AS q (query)
+    WHERE m.group_id = %(group_id)s::bigint AND m.content_tsv @@ q.query
+      AND (ts_rank(m.content_tsv, q.query), m.id) < (%(rank)s::real, %(id)s::bigint)
+    ORDER BY rank DESC, m.id DESC
+    LIMIT %(limit)s::int
+""")
+
+# Fused statements: the membership check and the write run as one statement, so each
+# hot endpoint costs a single round trip. They return whether the caller is a member
+# (and, for likes, whether the message exists) so callers keep their 403/404 responses.
+# Every occurrence of a parameter carries the same cast so its prepared type is unambiguous.
+
+# Returns one row: (is_member, id, group_id, content, likes, notified, attachment_ids).
+# The message columns are NULL when the user is not a member, or when any of
+# %(attachment_ids)s is not an unattached upload of the sender's to this group; otherwise
+# those attachments are linked to the message. They are locked while checked, so of two
+# sends claiming the same upload, the second waits for the first and then finds it taken.
+# The attachment ids returned and notified are those actually linked. Notifies the other
+# workers of the new message, dropping its content when the payload would exceed
+# %(max_payload)s bytes, and moves the sender's read marker past it.
+SEND_MESSAGE = Statement("send_message", """
+    WITH member AS (
+        SELECT 1 FROM group_members WHERE group_id = %(group_id)s::bigint AND user_id = %(user_id)s::bigint
+    ), claimable AS (
+        SELECT id FROM attachments
+        WHERE id = ANY (%(attachment_ids)s::bigint[]) AND group_id = %(group_id)s::bigint AND user_id = %(user_id)s::bigint
+          AND message_id IS NULL
+        FOR UPDATE
+    ), inserted AS (
+        INSERT INTO messages (group_id, user_id, content)
+        SELECT %(group_id)s::bigint, %(user_id)s::bigint, %(content)s::text
+        WHERE EXISTS (SELECT 1 FROM member) AND (SELECT count(*) FROM claimable) = cardinality(%(attachment_ids)s::bigint[])
+        RETURNING id, group_id, content, likes
+    ), attached AS (
+        UPDATE attachments a SET message_id = i.id
+        FROM inserted i, claimable c
+        WHERE a.id = c.id
+        RETURNING a.id
+    ), linked AS (
+        SELECT COALESCE(array_agg(id ORDER BY id), '{}') AS ids FROM attached
+    ), read AS (
+        UPDATE group_members gm SET last_read_id = GREATEST(gm.last_read_id, i.id)
+        FROM inserted i
+        WHERE gm.group_id = i.group_id AND gm.user_id = %(user_id)s::bigint
+    ), notified AS (
+        SELECT pg_notify(%(channel)s::text, CASE WHEN octet_length(p.complete) <= %(max_payload)s::int THEN p.complete ELSE p.partial END)
+        FROM inserted i, linked l, LATERAL (
+            SELECT json_build_object('worker', %(worker)s::text, 'group_id', i.group_id, 'event', json_build_object(
+                       'type', 'message',
+                       'message', json_build_object('id', i.id, 'group_id', i.group_id, 'content', i.content, 'likes', i.likes,
+                                                  'attachment_ids', l.ids)))::text AS complete,
+                   json_build_object('worker', %(worker)s::text, 'group_id', i.group_id, 'event', json_build_object(
+                       'type', 'message',
+                       'message', json_build_object('id', i.id, 'group_id', i.group_id, 'content', NULL, 'likes', i.likes,
+                                                  'attachment_ids', l.ids),
+                       'truncated', true))::text AS partial
+        ) p
+    )
+    SELECT EXISTS (SELECT 1 FROM member), i.id, i.group_id, i.content, i.likes, (SELECT count(*) FROM notified),
+           CASE WHEN i.id IS NOT NULL THEN (SELECT ids FROM linked) END
+    FROM (SELECT 1) AS one
+    LEFT JOIN inserted i ON true
+""")
+
+_LIKE_MESSAGE_NOTIFIED = """
+    notified AS (
+        SELECT pg_notify(%(channel)s::text, json_build_object('worker', %(worker)s::text, 'group_id', u.group_id, 'event', json_build_object(
+                   'type', 'like', 'message_id', u.id, 'group_id', u.group_id, 'likes', u.likes))::text)
+        FROM updated u
+    )
 """
-INSERT_MESSAGE = "INSERT INTO messages (group_id, user_id, content) VALUES (%s, %s, %s) RETURNING id, group_id, content, likes"
-SELECT_MESSAGE_GROUP = "SELECT group_id FROM messages WHERE id = %s"
-UPDATE_MESSAGE_LIKES = "UPDATE messages SET likes = likes + 1 WHERE id = %s RETURNING likes"
+
+# Return one row: (group_id, is_member, likes, notified). group_id is NULL when the
+# message does not exist. The like is counted only when the user is a member.
+LIKE_MESSAGE = Statement("like_message", """
+    WITH target AS (
+        SELECT id, group_id, likes FROM messages WHERE id = %(message_id)s::bigint
+    ), member AS (
+        SELECT 1 FROM target t JOIN group_members gm ON gm.group_id = t.group_id AND gm.user_id = %(user_id)s::bigint
+    ), updated AS (
+        UPDATE messages m SET likes = m.likes + 1
+        FROM target t
+        WHERE m.id = t.id AND EXISTS (SELECT 1 FROM member)
+        RETURNING m.id, m.group_id, m.likes
+    ), """ + _LIKE_MESSAGE_NOTIFIED + """
+    SELECT t.group_id, EXISTS (SELECT 1 FROM member), COALESCE((SELECT likes FROM updated), t.likes), (SELECT count(*) FROM notified)
+    FROM (SELECT 1) AS one
+    LEFT JOIN target t ON true
+""")
+# Like LIKE_MESSAGE, but a user's repeated likes of a message are counted once.
+LIKE_MESSAGE_DEDUP = Statement("like_message_dedup", """
+    WITH target AS (
+        SELECT id, group_id, likes FROM messages WHERE id = %(message_id)s::bigint
+    ), member AS (
+        SELECT 1 FROM target t JOIN group_members gm ON gm.group_id = t.group_id AND gm.user_id = %(user_id)s::bigint
+    ), liked AS (
+        INSERT INTO message_likes (message_id, user_id)
+        SELECT t.id, %(user_id)s::bigint FROM target t
+        WHERE EXISTS (SELECT 1 FROM member)
+        ON CONFLICT DO NOTHING
+        RETURNING message_id
+    ), updated AS (
+        UPDATE messages m SET likes = m.likes + 1
+        FROM liked l
+        WHERE m.id = l.message_id
+        RETURNING m.id, m.group_id, m.likes
+    ), """ + _LIKE_MESSAGE_NOTIFIED + """
+    SELECT t.group_id, EXISTS (SELECT 1 FROM member), COALESCE((SELECT likes FROM updated), t.likes), (SELECT count(*) FROM notified)
+    FROM (SELECT 1) AS one
+    LEFT JOIN target t ON true
+""")
+# Read-only variants for the write-behind like aggregator: (group_id, likes, is_member[, already_liked]).
+SELECT_MESSAGE_LIKE_STATE = Statement("select_message_like_state", """
+    SELECT m.group_id, m.likes,
+           EXISTS (SELECT 1 FROM group_members gm WHERE gm.group_id = m.group_id AND gm.user_id = %(user_id)s::bigint)
+    FROM messages m
+    WHERE m.id = %(message_id)s::bigint
+""")
+SELECT_MESSAGE_LIKE_STATE_DEDUP = Statement("select_message_like_state_dedup", """
+    SELECT m.group_id, m.likes,
+           EXISTS (SELECT 1 FROM group_members gm WHERE gm.group_id = m.group_id AND gm.user_id = %(user_id)s::bigint),
+           EXISTS (SELECT 1 FROM message_likes ml WHERE ml.message_id = m.id AND ml.user_id = %(user_id)s::bigint)
+    FROM messages m
+    WHERE m.id = %(message_id)s::bigint
+""")
@@ -0,0 +1,192 @@
+"""
+Admission control utility module.
+
+``RateLimiter`` keeps a token bucket per key (a user and route) in a pluggable backend:
+in memory for a single worker, or in a SQLite file shared by the workers on a host.
+``LoadShedder`` rejects work for everyone while too many requests are in flight or the
+database's recent latency is too high, so a burst degrades into fast 503s instead of a
+queue that times out for every client.
+"""
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException
+
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', '/tmp/chat-api-rate-limits.db')
+RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', '10'))
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '20'))
+
+
+class MemoryRateLimitBackend:
+    """Keeps token buckets in this worker's memory, evicting the least recently used beyond ``max_keys``."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        """
+        :param max_keys: The number of buckets kept; an evicted bucket starts full again.
+        """
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float, now: float) -> float:
+        with self._lock:
+            state = self._buckets.get(key)
+            tokens = burst if state is None else min(burst, state[0] + (now - state[1]) * rate)
+            wait = _consume(tokens, rate, cost)
+            self._buckets[key] = (tokens - cost if wait == 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SqliteRateLimitBackend:
+    """
+    Keeps token buckets in a local SQLite file shared by every worker on the host.
+
+    Every ``purge_every`` takes, buckets idle long enough to have refilled are deleted, so
+    the file does not keep a row for every key ever limited.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, purge_every: int = 1000):
+        """
+        :param path: The SQLite database file; created if missing.
+        :param purge_every: The number of takes between purges of idle buckets; 0 disables them.
+        """
+        self.purge_every = purge_every
+        self._takes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def take(self, key: str, rate: float, burst: float, cost: float, now: float) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                wait = _consume(tokens, rate, cost)
+                self._conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                                   (key, tokens - cost if wait == 0 else tokens, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._takes += 1
+            purge = self.purge_every and self._takes % self.purge_every == 0 and rate > 0
+        if purge:
+            self.purge(before=now - burst / rate)
+        return wait
+
+    def purge(self, before: float) -> int:
+        """Delete buckets untouched since ``before``; they would be full again anyway."""
+        with self._lock:
+            return self._conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (before,)).rowcount
+
+
+def _consume(tokens: float, rate: float, cost: float) -> float:
+    if tokens >= cost:
+        return 0.0
+    return (cost - tokens) / rate if rate > 0 else math.inf
+
+
+class RateLimiter:
+    """Token-bucket rate limiting: ``rate`` requests per second per key, with bursts of up to ``burst``."""
+
+    def __init__(self, backend, rate: float, burst: float):
+        """
+        :param backend: Where the buckets are kept.
+        :param rate: The sustained number of requests per second allowed per key.
+        :param burst: The number of requests a key may make at once after being idle.
+        """
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+
+    async def acquire(self, key: str, cost: float = 1):
+        """
+        Take ``cost`` tokens from the key's bucket.
+
+        :param key: The bucket, e.g. a user id and route.
+        :param cost: The number of tokens the request costs.
+        :raises HTTPException: 429 with Retry-After if the bucket does not hold enough tokens.
+        """
+        now = time.time()
+        if self.backend.blocking:
+            loop = asyncio.get_running_loop()
+            wait = await loop.run_in_executor(None, self.backend.take, key, self.rate, self.burst, cost, now)
+        else:
+            wait = self.backend.take(key, self.rate, self.burst, cost, now)
+        if wait:
+            retry_after = str(max(1, math.ceil(wait))) if wait != math.inf else "60"
+            raise HTTPException(status_code=429, detail="Too many requests, slow down", headers={"Retry-After": retry_after})
+
+
+class LoadShedder:
+    """
+    Admits requests while this worker has capacity and the database is responsive.
+
+    Latency samples older than ``stale_after`` seconds are ignored, so once load has been
+    shed long enough for the database to go quiet, requests are admitted again.
+    """
+
+    def __init__(self, max_in_flight: int, max_latency: float, latency, stale_after: float = 1.0):
+        """
+        :param max_in_flight: Admitted requests allowed at once; 0 disables the limit.
+        :param max_latency: Recent database latency, in seconds, above which requests are shed; 0 disables it.
+        :param latency: An Ewma of database latency.
+        :param stale_after: Seconds after which the latency average no longer counts.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_latency = max_latency
+        self.latency = latency
+        self.stale_after = stale_after
+        self.in_flight = 0
+        self.shed_total = 0
+
+    def admit(self):
+        """
+        Count a request in, or reject it.
+
+        :raises HTTPException: 503 with Retry-After if the worker or the database is overloaded.
+        """
+        if (self.max_in_flight and self.in_flight >= self.max_in_flight) or self._database_slow():
+            self.shed_total += 1
+            raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"})
+        self.in_flight += 1
+
+    def release(self):
+        """Count an admitted request out."""
+        self.in_flight -= 1
+
+    def _database_slow(self) -> bool:
+        return bool(self.max_latency) and self.latency.value > self.max_latency and \
+            time.monotonic() - self.latency.updated < self.stale_after
+
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    """
+    Build a rate limiter for the configured backend.
+
+    :param backend: Either ``memory`` or ``sqlite``.
+    :return: A new RateLimiter.
+    :raises ValueError: If the backend name is unknown.
+    """
+    if backend == 'memory':
+        return RateLimiter(MemoryRateLimitBackend(), RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+    if backend == 'sqlite':
+        return RateLimiter(SqliteRateLimitBackend(RATE_LIMIT_SQLITE_PATH), RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+    raise ValueError("Unknown rate limit backend: %s" % backend)
@@ -0,0 +1,288 @@
+"""
+Read replica routing utility module.
+
+Read-only endpoints take their connection from ``get_read_db_connection``, which hands out
+a connection to a streaming replica when ``DB_REPLICA_DSNS`` is configured and to the
+primary otherwise. Writes always use the primary through ``get_db_connection``.
+
+Read-your-writes: after a successful write request, ``ReadYourWritesMiddleware`` records
+the primary's WAL position (LSN). It is remembered for the client's session (its bearer
+token) on this worker and returned in the ``X-Write-LSN`` header, which clients may send
+back as ``X-Read-After-LSN`` to get the same guarantee from any worker. A read that must
+observe an LSN only goes to a replica that has replayed at least that far; otherwise it
+falls back to the primary.
+"""
+import hashlib
+import itertools
+import os
+import threading
+from fastapi import HTTPException, Request
+import psycopg2
+from src.utils.cache_util import TTLCache
+from psycopg2 import extensions
+from src.utils.db_util import (ConnectionPool, PoolTimeout, PreparingConnection, DB_POOL_MAX_SIZE, REQUEST_CONNECTIONS, get_pool,
+                               get_db_connection, run_db)
+
+DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()]
+REPLICA_SESSION_TTL = float(os.getenv('REPLICA_SESSION_TTL', '60'))
+REPLICA_SESSION_CACHE_SIZE = int(os.getenv('REPLICA_SESSION_CACHE_SIZE', '100000'))
+
+WRITE_LSN_HEADER = "X-Write-LSN"
+READ_AFTER_LSN_HEADER = "X-Read-After-LSN"
+
+WRITE_METHODS = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+
+
+def parse_lsn(value: str) -> int:
+    """
+    Parse a Postgres LSN such as ``16/B374D848`` into an integer.
+
+    :param value: The textual LSN.
+    :return: The LSN as a 64-bit integer, or None if the value is not a valid LSN.
+    """
+    high, _, low = (value or "").strip().partition("/")
+    try:
+        return (int(high, 16) << 32) | int(low, 16)
+    except ValueError:
+        return None
+
+
+def format_lsn(lsn: int) -> str:
+    """
+    Format an integer LSN in Postgres notation.
+
+    :param lsn: The LSN as an integer.
+    :return: The textual LSN.
+    """
+    return "%X/%X" % (lsn >> 32, lsn & 0xFFFFFFFF)
+
+
+class ReplicaConnection(PreparingConnection):
+    """A connection to a read replica."""
+
+
+def is_replica(conn) -> bool:
+    """
+    Return whether a connection was handed out by a replica pool.
+
+    :param conn: A database connection.
+    :return: True for replica connections, False for the primary.
+    """
+    return isinstance(conn, ReplicaConnection)
+
+
+class Replica:
+    """A replica's connection pool along with the latest WAL position it is known to have replayed."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.replayed_lsn = 0
+
+    def caught_up(self, conn, lsn: int) -> bool:
+        """
+        Return whether the replica has replayed ``lsn``, asking it only if not already known.
+
+        :param conn: A connection to this replica.
+        :param lsn: The WAL position the read must observe.
+        :return: True if a read on ``conn`` will see every change up to ``lsn``.
+        """
+        if lsn <= self.replayed_lsn:
+            return True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_last_wal_replay_lsn()::text")
+            row = cur.fetchone()
+        conn.rollback()
+        replayed = parse_lsn(row[0]) if row and row[0] else None
+        if replayed is None:
+            return False
+        self.replayed_lsn = max(self.replayed_lsn, replayed)
+        return lsn <= replayed
+
+
+class ReplicaRouter:
+    """Hands out read connections from the replicas in turn, falling back to the primary."""
+
+    def __init__(self, replicas: list, primary):
+        """
+        :param replicas: The replicas to route reads to.
+        :param primary: A callable returning the primary's connection pool.
+        """
+        self.replicas = replicas
+        self._primary = primary
+        self._next = itertools.cycle(range(len(replicas))) if replicas else None
+        self._lock = threading.Lock()
+
+    def getconn(self, min_lsn: int = None):
+        """
+        Check out a connection suitable for a read.
+
+        :param min_lsn: A WAL position the read must observe, if any.
+        :return: The connection and the pool it must be returned to.
+        :raises PoolTimeout: If neither a replica nor the primary had a free connection.
+        """
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = self.replicas[next(self._next)]
+            try:
+                conn = replica.pool.getconn()
+            except (PoolTimeout, psycopg2.Error):
+                continue
+            try:
+                if not min_lsn or replica.caught_up(conn, min_lsn):
+                    return conn, replica.pool
+            except psycopg2.Error:
+                replica.pool.putconn(conn, close=True)
+                continue
+            replica.pool.putconn(conn)
+        pool = self._primary()
+        return pool.getconn(), pool
+
+    def closeall(self):
+        """Close every replica pool."""
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+
+# Maps a session key to the highest primary LSN written in that session.
+SESSION_LSNS = TTLCache(REPLICA_SESSION_CACHE_SIZE, REPLICA_SESSION_TTL)
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ReplicaRouter:
+    """
+    Return the process-wide replica router, creating its pools on first use.
+
+    Returns:
+        ReplicaRouter: The router over the replicas configured in ``DB_REPLICA_DSNS``.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                # Replica pools open connections lazily, so an unreachable replica only costs a fallback.
+                replicas = [Replica(ConnectionPool(0, DB_POOL_MAX_SIZE, connection_factory=ReplicaConnection, dsn=dsn))
+                            for dsn in DB_REPLICA_DSNS]
+                _router = ReplicaRouter(replicas, get_pool)
+    return _router
+
+
+def close_router():
+    """Close the replica pools, if they were created."""
+    global _router
+    with _router_lock:
+        if _router is not None:
+            _router.closeall()
+            _router = None
+
+
+def session_key(authorization: str) -> str:
+    """
+    Derive the key under which a session's writes are remembered.
+
+    :param authorization: The request's Authorization header.
+    :return: A digest of the header, or None for anonymous requests.
+    """
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode('utf-8')).hexdigest()
+
+
+def required_lsn(request: Request) -> int:
+    """
+    Return the WAL position a read for this request must observe.
+
+    Args:
+        request: The incoming request.
+
+    Returns:
+        int: The larger of the client's X-Read-After-LSN header and the session's last write, or None.
+    """
+    candidates = [parse_lsn(request.headers.get(READ_AFTER_LSN_HEADER, ""))]
+    key = session_key(request.headers.get("Authorization"))
+    if key:
+        candidates.append(SESSION_LSNS.get(key))
+    candidates = [lsn for lsn in candidates if lsn]
+    return max(candidates) if candidates else None
+
+
+def get_read_db_connection(request: Request):
+    """
+    Check out a connection for a read-only request.
+
+    Yields:
+        psycopg2.extensions.connection: A replica connection that has replayed the request's
+        required LSN, or a primary connection if no such replica is available.
+
+    Raises:
+        HTTPException: If no connection became available within the pool timeout.
+    """
+    try:
+        conn, pool = get_router().getconn(required_lsn(request))
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database is busy, try again later", headers={"Retry-After": "1"})
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+# The dependency of read-only endpoints. Without replicas it is get_db_connection itself, so a
+# request whose authentication and handler both need a connection still checks out only one.
+READ_DB_CONNECTION = get_read_db_connection if DB_REPLICA_DSNS else get_db_connection
+
+
+def _current_wal_lsn(conn) -> int:
+    idle = conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_current_wal_lsn()::text")
+        lsn = parse_lsn(cur.fetchone()[0])
+    if idle:
+        conn.rollback()
+    return lsn
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware recording the primary's WAL position after each successful write request.
+
+    The position is read on the primary connection the request itself checked out, which it
+    still holds when its response starts, so recording never waits for another connection.
+    It costs one extra round trip per write and does nothing unless replicas are configured.
+    """
+
+    def __init__(self, app, enabled: bool = None):
+        self.app = app
+        self.enabled = bool(DB_REPLICA_DSNS) if enabled is None else enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        held = []
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start" and 200 <= message["status"] < 300 and held:
+                try:
+                    lsn = await run_db(_current_wal_lsn, held[-1])
+                except psycopg2.Error:
+                    lsn = None
+            else:
+                lsn = None
+            if message["type"] == "http.response.start":
+                if lsn:
+                    headers = dict(scope["headers"])
+                    key = session_key(headers.get(b"authorization", b"").decode('latin-1'))
+                    if key:
+                        SESSION_LSNS.set(key, max(lsn, SESSION_LSNS.get(key) or 0))
+                    message = dict(message, headers=list(message.get("headers", [])) +
+                                   [(WRITE_LSN_HEADER.lower().encode(), format_lsn(lsn).encode())])
+            await send(message)
+
+        token = REQUEST_CONNECTIONS.set(held)
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            REQUEST_CONNECTIONS.reset(token)
@@ -0,0 +1,74 @@
+"""
+Request body utility module.
+
+FastAPI reads and parses a request's body before it resolves any dependency, so a limit
+checked by a dependency or the endpoint only applies once the whole body is in memory.
+Routes of a router built with ``route_class=BodyLimitRoute`` instead read the body of an
+endpoint decorated with ``max_body_size`` through ``LimitedBodyRequest``, which rejects it
+with a 413 as soon as it crosses the limit.
+"""
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+
+
+class LimitedBodyRequest(Request):
+    """A request whose body may be at most ``max_bytes`` long."""
+
+    def __init__(self, scope, receive, max_bytes: int):
+        """
+        :param scope: The ASGI scope of the request.
+        :param receive: The ASGI receive channel of the request.
+        :param max_bytes: The largest body accepted.
+        """
+        super().__init__(scope, receive)
+        self.max_bytes = max_bytes
+
+    async def body(self) -> bytes:
+        """
+        Read the body, stopping at the limit.
+
+        :return: The body.
+        :raises HTTPException: 413 if the body is longer than the limit.
+        """
+        if not hasattr(self, "_body"):
+            declared = self.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > self.max_bytes:
+                self._too_large()
+            chunks, size = [], 0
+            async for chunk in self.stream():
+                size += len(chunk)
+                if size > self.max_bytes:
+                    self._too_large()
+                chunks.append(chunk)
+            self._body = b"".join(chunks)
+        return self._body
+
+    def _too_large(self):
+        raise HTTPException(status_code=413, detail=f"The request body may be at most {self.max_bytes} bytes")
+
+
+class BodyLimitRoute(APIRoute):
+    """A route that reads the body of an endpoint decorated with ``max_body_size`` through LimitedBodyRequest."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        max_bytes = getattr(self.endpoint, "max_body_bytes", None)
+        if max_bytes is None:
+            return handler
+
+        async def limited_handler(request: Request):
+            return await handler(LimitedBodyRequest(request.scope, request.receive, max_bytes))
+        return limited_handler
+
+
+def max_body_size(max_bytes: int):
+    """
+    Limit the size of an endpoint's request body; its router must use BodyLimitRoute.
+
+    :param max_bytes: The largest body accepted.
+    :return: A decorator to apply below the route decorator.
+    """
+    def decorator(endpoint):
+        endpoint.max_body_bytes = max_bytes
+        return endpoint
+    return decorator
@@ -0,0 +1,311 @@
+"""
+Token revocation utility module.
+
+Revoked tokens are recorded in a pluggable backend shared by every worker and evicted
+once they expire. Each worker keeps a Bloom filter of the revocations it has seen, so the
+common check for a token that was never revoked is answered in memory without I/O; only
+filter hits are confirmed against the backend.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from fastapi import HTTPException
+from src.utils.db_util import PoolTimeout, get_pool, run_db
+
+REVOCATION_BACKEND = os.getenv('REVOCATION_BACKEND', 'memory')
+REVOCATION_SQLITE_PATH = os.getenv('REVOCATION_SQLITE_PATH', '/tmp/chat-api-revocations.db')
+REVOCATION_SYNC_INTERVAL = float(os.getenv('REVOCATION_SYNC_INTERVAL', '1.0'))
+REVOCATION_PURGE_INTERVAL = float(os.getenv('REVOCATION_PURGE_INTERVAL', '60.0'))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv('REVOCATION_BLOOM_CAPACITY', '100000'))
+
+# Revocations re-read behind the sync cursor. Postgres hands out sequence numbers before
+# commit, so a revocation may become visible after one with a higher number was read.
+REVOCATION_SEQ_OVERLAP = 100
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings with a configurable false-positive rate."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        :param capacity: The number of items the filter is sized for.
+        :param error_rate: The false-positive rate expected at ``capacity`` items.
+        """
+        self.capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def add(self, item: str):
+        """Add ``item`` to the filter."""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+
+class MemoryRevocationBackend:
+    """Keeps revocations in process memory. Only suitable for a single worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._log = []
+
+    def add(self, token_hash: str, expires_at: float):
+        with self._lock:
+            self._entries[token_hash] = expires_at
+            self._log.append(token_hash)
+
+    def contains(self, token_hash: str, now: float) -> bool:
+        return self._entries.get(token_hash, 0) > now
+
+    def changes_since(self, cursor: int):
+        with self._lock:
+            return self._log[cursor:], len(self._log)
+
+    def active(self, now: float) -> list:
+        with self._lock:
+            return [token_hash for token_hash, expires_at in self._entries.items() if expires_at > now]
+
+    def purge(self, now: float) -> int:
+        with self._lock:
+            expired = [token_hash for token_hash, expires_at in self._entries.items() if expires_at <= now]
+            for token_hash in expired:
+                del self._entries[token_hash]
+            self._log = list(self._entries)
+        return len(expired)
+
+    def count(self) -> int:
+        return len(self._entries)
+
+
+class SqliteRevocationBackend:
+    """Keeps revocations in a local SQLite file shared by every worker on the host."""
+
+    def __init__(self, path: str):
+        """
+        :param path: The SQLite database file; created if missing.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_tokens ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, token_hash TEXT NOT NULL UNIQUE, expires_at REAL NOT NULL)"
+        )
+
+    def add(self, token_hash: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO revoked_tokens (token_hash, expires_at) VALUES (?, ?)", (token_hash, expires_at)
+            )
+
+    def contains(self, token_hash: str, now: float) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM revoked_tokens WHERE token_hash = ? AND expires_at > ?", (token_hash, now)
+            ).fetchone()
+        return row is not None
+
+    def changes_since(self, cursor: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, token_hash FROM revoked_tokens WHERE seq > ? ORDER BY seq", (cursor,)
+            ).fetchall()
+        return [token_hash for _, token_hash in rows], rows[-1][0] if rows else cursor
+
+    def active(self, now: float) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT token_hash FROM revoked_tokens WHERE expires_at > ?", (now,)).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self, now: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (now,)).rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM revoked_tokens").fetchone()[0]
+
+
+class PostgresRevocationBackend:
+    """
+    Keeps revocations in the application database, shared by every worker on every host.
+
+    The revoked_tokens table is created by the schema migrations. Sequence numbers are not
+    assigned in commit order, so ``changes_since`` re-reads the last REVOCATION_SEQ_OVERLAP
+    numbers below the cursor to pick up revocations that committed late. Every call checks
+    out its own connection, since it must not commit a request's transaction; when the pool
+    is exhausted the request is answered with a 503.
+    """
+
+    def __init__(self, pool=None):
+        """
+        :param pool: The connection pool to use; defaults to the process-wide pool.
+        """
+        self._pool = pool
+
+    def add(self, token_hash: str, expires_at: float):
+        self._execute(
+            "INSERT INTO revoked_tokens (token_hash, expires_at) VALUES (%s, %s) "
+            "ON CONFLICT (token_hash) DO UPDATE SET expires_at = EXCLUDED.expires_at, seq = DEFAULT",
+            (token_hash, expires_at), commit=True
+        )
+
+    def contains(self, token_hash: str, now: float) -> bool:
+        return bool(self._execute(
+            "SELECT 1 FROM revoked_tokens WHERE token_hash = %s AND expires_at > %s", (token_hash, now)
+        ))
+
+    def changes_since(self, cursor: int):
+        rows = self._execute("SELECT seq, token_hash FROM revoked_tokens WHERE seq > %s ORDER BY seq",
+                             (cursor - REVOCATION_SEQ_OVERLAP,))
+        return [token_hash for _, token_hash in rows], max(rows[-1][0], cursor) if rows else cursor
+
+    def active(self, now: float) -> list:
+        return [row[0] for row in self._execute("SELECT token_hash FROM revoked_tokens WHERE expires_at > %s", (now,))]
+
+    def purge(self, now: float) -> int:
+        return self._execute("DELETE FROM revoked_tokens WHERE expires_at <= %s", (now,), commit=True)
+
+    def count(self) -> int:
+        return self._execute("SELECT count(*) FROM revoked_tokens")[0][0]
+
+    def _execute(self, query: str, params: tuple = None, commit: bool = False):
+        pool = self._pool or get_pool()
+        try:
+            conn = pool.getconn()
+        except PoolTimeout:
+            raise HTTPException(status_code=503, detail="Database is busy, try again later", headers={"Retry-After": "1"})
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                if commit:
+                    conn.commit()
+                    return cur.rowcount
+                return cur.fetchall()
+        finally:
+            pool.putconn(conn)
+
+
+class RevocationStore:
+    """
+    Records revoked tokens until they expire and answers whether a token was revoked.
+
+    Revocations made by other workers become visible after at most ``sync_interval`` seconds.
+    Checks that find a sync due while one is running wait for it instead of starting their own.
+    """
+
+    def __init__(self, backend, sync_interval: float = REVOCATION_SYNC_INTERVAL,
+                 purge_interval: float = REVOCATION_PURGE_INTERVAL, bloom_capacity: int = REVOCATION_BLOOM_CAPACITY):
+        """
+        :param backend: The backend holding the authoritative set of revocations.
+        :param sync_interval: Seconds between pulls of other workers' revocations into the filter.
+        :param purge_interval: Seconds between evictions of expired revocations.
+        :param bloom_capacity: The initial number of revocations the filter is sized for.
+        """
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(bloom_capacity)
+        self._cursor = 0
+        self._last_sync = float('-inf')
+        self._last_purge = time.time()
+        self._syncing = None
+
+    async def revoke(self, token: str, expires_at: float):
+        """
+        Revoke ``token`` until ``expires_at``.
+
+        :param token: The raw token.
+        :param expires_at: The token's expiry as a Unix timestamp; the revocation is dropped afterwards.
+        """
+        token_hash = _hash_token(token)
+        await run_db(self.backend.add, token_hash, expires_at)
+        # A sync holds the lock across backend calls, so it is never taken on the event loop.
+        await run_db(self._remember, token_hash)
+
+    async def is_revoked(self, token: str) -> bool:
+        """
+        Check whether ``token`` has been revoked.
+
+        :param token: The raw token.
+        :return: True if the token was revoked and has not yet expired.
+        """
+        if time.monotonic() - self._last_sync >= self.sync_interval:
+            if self._syncing is None or self._syncing.done():
+                self._syncing = asyncio.ensure_future(run_db(self.sync))
+            await asyncio.shield(self._syncing)
+        token_hash = _hash_token(token)
+        if token_hash not in self._bloom:
+            return False
+        return await run_db(self.backend.contains, token_hash, time.time())
+
+    def sync(self):
+        """Pull new revocations into the filter and evict expired ones when due."""
+        now = time.time()
+        with self._lock:
+            self._last_sync = time.monotonic()
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                self.backend.purge(now)
+                _, self._cursor = self.backend.changes_since(self._cursor)
+                active = self.backend.active(now)
+                self._bloom = BloomFilter(max(self._bloom.capacity, 2 * len(active)))
+                for token_hash in active:
+                    self._bloom.add(token_hash)
+                return
+            token_hashes, self._cursor = self.backend.changes_since(self._cursor)
+            token_hashes = [token_hash for token_hash in token_hashes if token_hash not in self._bloom]
+            if self._bloom.count + len(token_hashes) > self._bloom.capacity:
+                self._last_purge = float('-inf')
+            for token_hash in token_hashes:
+                self._bloom.add(token_hash)
+
+    def _remember(self, token_hash: str):
+        with self._lock:
+            self._bloom.add(token_hash)
+
+    def size(self) -> int:
+        """
+        Return the number of revocations currently held by the backend.
+
+        :return: The revoked token count, including entries not yet purged.
+        """
+        return self.backend.count()
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def create_revocation_store(backend: str = REVOCATION_BACKEND) -> RevocationStore:
+    """
+    Build a revocation store for the configured backend.
+
+    :param backend: One of ``memory``, ``sqlite`` or ``postgres``.
+    :return: A new RevocationStore.
+    :raises ValueError: If the backend name is unknown.
+    """
+    if backend == 'memory':
+        return RevocationStore(MemoryRevocationBackend())
+    if backend == 'sqlite':
+        return RevocationStore(SqliteRevocationBackend(REVOCATION_SQLITE_PATH))
+    if backend == 'postgres':
+        return RevocationStore(PostgresRevocationBackend())
+    raise ValueError("Unknown revocation backend: %s" % backend)
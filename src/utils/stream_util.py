@@ -0,0 +1,69 @@
+"""
+Streaming response utility module.
+
+List endpoints encode their items one at a time into a JSON array instead of building
+the whole document in memory first.
+
+With ``FAST_SERIALIZATION`` enabled, list endpoints skip building pydantic models and
+encode database rows directly with orjson through ``encode_json``. The row encoders live next to the services that build the equivalent models.
+"""
+import json
+import os
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+STREAM_CHUNK_ITEMS = 64
+FAST_SERIALIZATION = os.getenv('FAST_SERIALIZATION', '0') == '1'
+
+
+def encode_json(value) -> bytes:
+    """
+    Encode plain JSON data (dicts, lists, strings, numbers, booleans and None).
+
+    :param value: The data to encode.
+    :return: The compact JSON encoding.
+    """
+    return orjson.dumps(value)
+
+
+def encode_item(item) -> bytes:
+    """
+    Encode a single item, typically a pydantic model, as JSON.
+
+    :param item: The item to encode.
+    :return: The JSON encoding of the item.
+    """
+    return json.dumps(jsonable_encoder(item), separators=(",", ":")).encode('utf-8')
+
+
+def iter_json_array(items, encode=encode_item):
+    """
+    Yield a JSON array of ``items`` in chunks of encoded items.
+
+    :param items: An iterable of items.
+    :param encode: Callable encoding one item to JSON bytes.
+    :return: A generator of byte chunks.
+    """
+    chunk = [b"["]
+    for position, item in enumerate(items):
+        if position:
+            chunk.append(b",")
+        chunk.append(encode(item))
+        if len(chunk) >= STREAM_CHUNK_ITEMS:
+            yield b"".join(chunk)
+            chunk = []
+    chunk.append(b"]")
+    yield b"".join(chunk)
+
+
+def json_array_response(items, headers: dict = None, encode=encode_item) -> StreamingResponse:
+    """
+    Stream ``items`` to the client as a JSON array.
+
+    :param items: An iterable of items.
+    :param headers: Extra response headers, e.g. pagination cursors.
+    :param encode: Callable encoding one item to JSON bytes.
+    :return: A streaming JSON response.
+    """
+    return StreamingResponse(iter_json_array(items, encode), media_type="application/json", headers=headers)
@@ -0,0 +1,134 @@
+"""
+Streaming upload utility module.
+
+``receive_file`` parses a ``multipart/form-data`` request body as it arrives and streams
+its ``file`` part straight into a blob writer, so an upload is never buffered in memory
+and an oversized one is rejected as soon as it crosses the limit instead of after it has
+been read in full.
+"""
+import asyncio
+import os
+from typing import NamedTuple
+from fastapi import HTTPException
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from src.utils.blob_util import BlobStore, BlobTooLarge, BlobWriter
+
+UPLOAD_FIELD = "file"
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+MAX_FILENAME_LENGTH = 255
+
+
+class ReceivedFile(NamedTuple):
+    """A file received from an upload, to be committed to the store or aborted through ``blob``."""
+    sha256: str
+    size: int
+    filename: str
+    content_type: str
+    blob: BlobWriter
+
+
+class _FileReceiver:
+    """Multipart parser callbacks collecting the upload field's data for the blob writer."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = []
+        self.filename = None
+        self.content_type = None
+        self.received = False
+        self._in_file = False
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def flush(self):
+        """Write the collected data to the blob. Blocking."""
+        data, self.pending = b"".join(self.pending), []
+        self.writer.write(data)
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        if options.get(b"name") != UPLOAD_FIELD.encode() or b"filename" not in options:
+            return
+        if self.received:
+            raise HTTPException(status_code=400, detail="Upload one file per request")
+        self._in_file = True
+        self.received = True
+        filename = os.path.basename(options[b"filename"].decode("utf-8", "replace").replace("\\", "/"))
+        self.filename = filename[:MAX_FILENAME_LENGTH] or UPLOAD_FIELD
+        content_type = self._headers.get(b"content-type", b"").decode("latin-1").strip()
+        self.content_type = content_type or DEFAULT_CONTENT_TYPE
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.pending.append(data[start:end])
+
+    def _on_part_end(self):
+        self._in_file = False
+
+
+async def receive_file(request, store: BlobStore, max_bytes: int) -> ReceivedFile:
+    """
+    Receive the ``file`` field of a multipart upload; other fields are ignored.
+
+    Each chunk of the body is parsed as it arrives and the file's part of it written to a
+    blob writer off the event loop. The blob is finished but not committed, so that the
+    caller decides when it enters the store.
+
+    :param request: The incoming request.
+    :param store: The blob store receiving the file.
+    :param max_bytes: The largest file accepted.
+    :return: The received file.
+    :raises HTTPException: 415 if the body is not multipart/form-data, 413 if the file is too large,
+        or 400 if the body is malformed or has no file.
+    """
+    media_type, options = parse_options_header(request.headers.get("content-type"))
+    if media_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=415, detail="Upload the file as multipart/form-data")
+    loop = asyncio.get_running_loop()
+    receiver = _FileReceiver(await loop.run_in_executor(None, store.writer, max_bytes))
+    parser = MultipartParser(options[b"boundary"], receiver.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if receiver.pending:
+                await loop.run_in_executor(None, receiver.flush)
+        parser.finalize()
+        if not receiver.received:
+            raise HTTPException(status_code=400, detail=f"The upload has no '{UPLOAD_FIELD}' file")
+        digest = await loop.run_in_executor(None, receiver.writer.finish)
+    except BlobTooLarge:
+        receiver.writer.abort()
+        raise HTTPException(status_code=413, detail=f"Files may be at most {max_bytes} bytes")
+    except MultipartParseError:
+        receiver.writer.abort()
+        raise HTTPException(status_code=400, detail="Malformed multipart body")
+    except BaseException:
+        receiver.writer.abort()
+        raise
+    return ReceivedFile(digest, receiver.writer.size, receiver.filename, receiver.content_type, receiver.writer)
@@ -0,0 +1,4 @@
+import os
+
+# Tokens are signed with SECRET_KEY, read when auth_service is imported.
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-of-at-least-32-bytes')
@@ -0,0 +1,153 @@
+import unittest
+import asyncio
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+from fastapi import HTTPException
+from src.utils.blob_util import BlobStore
+from src.utils.query_util import INSERT_ATTACHMENT, DELETE_UNSENT_ATTACHMENTS, SELECT_UNREFERENCED_BLOBS, DELETE_UNREFERENCED_BLOB
+from src.services import attachment_service
+from src.services.attachment_service import AttachmentReaper, upload_attachment
+from src.utils.ratelimit_util import LoadShedder
+from src.models.schemas import User
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.db.executed.append((query, params))
+        self.rows = self.db.answer(query, params)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+class FakeDatabase:
+    """Answers the reaper's statements from in-memory attachments and unreferenced blobs."""
+
+    def __init__(self, locked: bool = True):
+        self.locked = locked
+        self.unsent = 0
+        self.referenced = set()
+        self.unreferenced = set()
+        self.executed = []
+        self.blob_locks = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def answer(self, query, params):
+        if "pg_try_advisory_lock" in str(query):
+            return [(self.locked,)]
+        if "pg_advisory_xact_lock" in str(query):
+            self.blob_locks.append(params[1])
+        if query is DELETE_UNSENT_ATTACHMENTS:
+            deleted = min(self.unsent, params["limit"])
+            self.unsent -= deleted
+            return [(deleted,)]
+        if query is SELECT_UNREFERENCED_BLOBS:
+            digests = sorted(d for d in self.unreferenced - self.referenced if d > params["after"])
+            return [(d,) for d in digests[:params["limit"]]]
+        if query is DELETE_UNREFERENCED_BLOB:
+            if params["sha256"] in self.unreferenced - self.referenced:
+                self.unreferenced.discard(params["sha256"])
+                return [(params["sha256"],)]
+        return []
+
+class TestAttachmentReaper(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = BlobStore(self.tmp.name)
+        self.db = FakeDatabase()
+        pool = MagicMock()
+        pool.getconn.return_value = self.db
+        patcher = patch.object(attachment_service, "get_pool", return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(attachment_service, "REAP_BATCH_SIZE", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reaper = AttachmentReaper(self.store, interval=0, max_age=60)
+
+    def blob(self, data: bytes) -> str:
+        writer = self.store.writer(1024)
+        writer.write(data)
+        return writer.commit()
+
+    def test_deletes_unsent_uploads_in_batches_and_unreferenced_blobs(self):
+        self.db.unsent = 5
+        unreferenced = [self.blob(b"a"), self.blob(b"b"), self.blob(b"c")]
+        referenced = self.blob(b"e")
+        self.db.unreferenced = set(unreferenced) | {referenced}
+        self.db.referenced = {referenced}
+
+        self.assertEqual(asyncio.run(self.reaper.reap()), (5, 3))
+        self.assertEqual(self.db.unsent, 0)
+        self.assertEqual(sum(query is DELETE_UNSENT_ATTACHMENTS for query, _ in self.db.executed), 3)
+        for digest in unreferenced:
+            self.assertFalse(os.path.exists(self.store.path(digest)))
+        self.assertTrue(os.path.exists(self.store.path(referenced)))
+        self.assertEqual(self.db.unreferenced, {referenced})
+        self.assertEqual(sorted(self.db.blob_locks), sorted(unreferenced))
+        self.assertIn("pg_advisory_unlock", str(self.db.executed[-1][0]))
+
+    def test_skips_while_another_worker_reaps(self):
+        self.db.locked = False
+        self.db.unsent = 1
+        self.assertEqual(asyncio.run(self.reaper.reap()), (0, 0))
+        self.assertEqual(self.db.unsent, 1)
+        self.assertEqual(len(self.db.executed), 1)
+
+class TestUploadAttachment(unittest.TestCase):
+    def test_blob_is_committed_under_its_lock(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = BlobStore(tmp.name)
+        writer = store.writer(1024)
+        writer.write(b"hello")
+        digest = writer.finish()
+        db = MagicMock()
+        cursor = db.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = lambda query, params: self.assertEqual(
+            os.path.exists(store.path(digest)), query is INSERT_ATTACHMENT)
+        cursor.fetchone.return_value = (7,)
+
+        self.assertEqual(attachment_service._insert_attachment(db, writer, (1, 1, digest, 5, "text/plain", "a.txt")), (7,))
+        self.assertIn("pg_advisory_xact_lock_shared", cursor.execute.call_args_list[0][0][0])
+        self.assertEqual(cursor.execute.call_args_list[0][0][1][1], digest)
+        self.assertIs(cursor.execute.call_args_list[1][0][0], INSERT_ATTACHMENT)
+        db.commit.assert_called_once()
+        writer.abort()
+        self.assertTrue(os.path.exists(store.path(digest)))
+
+    def test_uploads_have_their_own_limit(self):
+        shedder = LoadShedder(1, 0, None)
+        shedder.admit()
+        user = User(id=1, username="a", is_admin=False)
+        with patch.object(attachment_service, "UPLOAD_SHEDDER", shedder), \
+                patch.object(attachment_service, "receive_file") as receive_file:
+            with self.assertRaises(HTTPException) as context:
+                asyncio.run(upload_attachment(1, MagicMock(), user))
+        self.assertEqual(context.exception.status_code, 503)
+        receive_file.assert_not_called()
+        self.assertEqual(shedder.in_flight, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,18 +3,23 @@ import asyncio
 from unittest.mock import Mock, patch
 from datetime import datetime, timedelta
 from fastapi import HTTPException
-from src.services.auth_service import create_access_token, get_current_user
+from src.services.auth_service import (create_access_token, get_current_user, get_token_subject, invalidate_token, invalidate_user_tokens, TOKEN_CACHE,
+                                       USER_CHANGED_CHANNEL, notify_user_changed, _on_user_changed)
+from src.utils.notify_util import WORKER_ID
 from src.models.schemas import User, TokenData
 import jwt
 
 class TestAuthService(unittest.TestCase):
+    def setUp(self):
+        TOKEN_CACHE.clear()
+
     def test_create_access_token(self):
         data = {"sub": "testuser"}
         token = create_access_token(data)
         self.assertIsInstance(token, str)
 
     @patch('src.services.auth_service.jwt.decode')
-    @patch('src.services.auth_service.get_db_connection')
+    @patch('src.services.auth_service.READ_DB_CONNECTION')
     def test_get_current_user_success(self, mock_db, mock_jwt_decode):
         mock_jwt_decode.return_value = {"sub": "testuser", "is_admin": False}
         mock_cursor = Mock()
@@ -33,5 +38,56 @@ class TestAuthService(unittest.TestCase):
         self.assertEqual(context.exception.status_code, 401)
         self.assertEqual(context.exception.detail, "Could not validate credentials")
 
+    def test_get_token_subject_without_database(self):
+        token = create_access_token({"sub": "testuser"})
+        self.assertEqual(asyncio.run(get_token_subject(token)), "testuser")
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_token_subject(create_access_token({"is_admin": True})))
+        self.assertEqual(context.exception.status_code, 401)
+
+    @patch('src.services.auth_service.jwt.decode')
+    def test_get_current_user_cached(self, mock_jwt_decode):
+        mock_jwt_decode.return_value = {"sub": "testuser", "is_admin": False}
+        db = Mock()
+        mock_cursor = Mock()
+        mock_cursor.fetchone.return_value = (1, "testuser", False)
+        db.cursor.return_value.__enter__ = Mock(return_value=mock_cursor)
+        db.cursor.return_value.__exit__ = Mock(return_value=False)
+
+        first = asyncio.run(get_current_user("fake_token", db))
+        second = asyncio.run(get_current_user("fake_token", db))
+        self.assertEqual(first, second)
+        self.assertEqual(mock_cursor.execute.call_count, 1)
+        self.assertEqual(mock_jwt_decode.call_count, 1)
+        self.assertEqual(TOKEN_CACHE.stats()["hits_total"], 1)
+
+    def test_cache_entry_bounded_by_token_expiry(self):
+        token = create_access_token({"sub": "testuser"}, expires_delta=timedelta(seconds=-1))
+        db = Mock()
+        with self.assertRaises(HTTPException):
+            asyncio.run(get_current_user(token, db))
+        self.assertEqual(len(TOKEN_CACHE), 0)
+
+    def test_invalidation(self):
+        TOKEN_CACHE.set("token_a", User(id=1, username="a", is_admin=False))
+        TOKEN_CACHE.set("token_b", User(id=1, username="a", is_admin=False))
+        TOKEN_CACHE.set("token_c", User(id=2, username="c", is_admin=False))
+        invalidate_token("token_c")
+        invalidate_user_tokens(1)
+        self.assertEqual(len(TOKEN_CACHE), 0)
+
+    def test_user_change_from_another_worker_drops_its_tokens(self):
+        TOKEN_CACHE.set("token_a", User(id=1, username="a", is_admin=True))
+        TOKEN_CACHE.set("token_c", User(id=2, username="c", is_admin=False))
+        _on_user_changed("%s:1" % WORKER_ID)
+        self.assertEqual(len(TOKEN_CACHE), 2)
+        _on_user_changed("otherworker:1")
+        self.assertIsNone(TOKEN_CACHE.get("token_a"))
+        self.assertIsNotNone(TOKEN_CACHE.get("token_c"))
+
+        cur = Mock()
+        notify_user_changed(cur, 1)
+        cur.execute.assert_called_once_with("SELECT pg_notify(%s, %s)", (USER_CHANGED_CHANNEL, "%s:1" % WORKER_ID))
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
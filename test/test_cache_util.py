@@ -0,0 +1,41 @@
+import unittest
+import time
+from src.utils.cache_util import TTLCache
+
+class TestTTLCache(unittest.TestCase):
+    def test_get_and_set(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["hits_total"], 1)
+        self.assertEqual(cache.stats()["misses_total"], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()["evictions_total"], 1)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        cache.set("b", 2, ttl=-5)
+        self.assertEqual(len(cache), 0)
+
+    def test_discard_where(self):
+        cache = TTLCache(maxsize=4, ttl=60)
+        for key, value in [("a", 1), ("b", 2), ("c", 1)]:
+            cache.set(key, value)
+        self.assertEqual(cache.discard_where(lambda value: value == 1), 2)
+        self.assertEqual(cache.get("b"), 2)
+
+if __name__ == '__main__':
+    unittest.main()
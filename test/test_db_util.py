@@ -0,0 +1,155 @@
+import unittest
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, Mock, patch
+import psycopg2
+from psycopg2 import extensions
+from src.utils.db_util import ConnectionPool, PoolTimeout, run_db, execute_atomic, prepare_statements
+from src.utils.query_util import STATEMENTS, SEND_MESSAGE
+from src.services.auth_service import get_current_user
+from src.services.group_service import list_groups
+from src.models.schemas import User
+
+def make_connection():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+class TestConnectionPool(unittest.TestCase):
+    def test_reuses_returned_connection(self):
+        connect = Mock(side_effect=make_connection)
+        pool = ConnectionPool(0, 2, connect=connect)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(connect.call_count, 1)
+
+    def test_opens_min_connections_up_front(self):
+        connect = Mock(side_effect=make_connection)
+        pool = ConnectionPool(2, 4, connect=connect)
+        self.assertEqual(connect.call_count, 2)
+        self.assertEqual(pool.stats()["idle"], 2)
+
+    def test_timeout_when_exhausted(self):
+        pool = ConnectionPool(0, 1, timeout=0.05, connect=make_connection)
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()["timeouts_total"], 1)
+
+    def test_waiter_receives_returned_connection(self):
+        pool = ConnectionPool(0, 1, timeout=2, connect=make_connection)
+        conn = pool.getconn()
+        threading.Timer(0.05, pool.putconn, (conn,)).start()
+        self.assertIs(pool.getconn(), conn)
+        self.assertGreater(pool.stats()["wait_seconds_max"], 0)
+
+    def test_rolls_back_open_transaction_on_return(self):
+        pool = ConnectionPool(0, 1, connect=make_connection)
+        conn = pool.getconn()
+        conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INERROR
+        pool.putconn(conn)
+        conn.rollback.assert_called_once()
+
+    def test_discards_unhealthy_connection_on_checkout(self):
+        pool = ConnectionPool(0, 1, healthcheck_after=0, connect=make_connection)
+        stale = pool.getconn()
+        stale.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.OperationalError()
+        pool.putconn(stale)
+        fresh = pool.getconn()
+        self.assertIsNot(fresh, stale)
+        stale.close.assert_called()
+        self.assertEqual(pool.stats()["size"], 1)
+        self.assertEqual(pool.stats()["discarded_total"], 1)
+
+    def test_stats_track_in_use(self):
+        pool = ConnectionPool(0, 3, connect=make_connection)
+        first = pool.getconn()
+        pool.getconn()
+        pool.putconn(first)
+        stats = pool.stats()
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["idle"], 1)
+        self.assertEqual(stats["size"], 2)
+
+class TestAsyncDatabaseLayer(unittest.TestCase):
+    def test_run_db_propagates_result_and_errors(self):
+        self.assertEqual(asyncio.run(run_db(lambda a, b: a + b, 1, 2)), 3)
+        with self.assertRaises(ValueError):
+            asyncio.run(run_db(Mock(side_effect=ValueError())))
+
+    @patch('src.services.auth_service.jwt.decode')
+    def test_slow_query_does_not_stall_other_requests(self, mock_jwt_decode):
+        mock_jwt_decode.return_value = {"sub": "testuser", "is_admin": False}
+        slow_db = MagicMock()
+        slow_cursor = slow_db.cursor.return_value.__enter__.return_value
+        slow_cursor.execute.side_effect = lambda *args: time.sleep(0.5)
+        slow_cursor.fetchall.return_value = []
+        fast_db = MagicMock()
+        fast_db.cursor.return_value.__enter__.return_value.fetchone.return_value = (1, "testuser", False)
+
+        async def scenario():
+            finished = []
+            async def slow():
+                await list_groups(slow_db)
+                finished.append("slow")
+            async def fast():
+                await asyncio.sleep(0.05)
+                user = await get_current_user("unrelated_token", fast_db)
+                finished.append("fast")
+                return user
+            started = time.monotonic()
+            _, user = await asyncio.gather(slow(), fast())
+            return finished, user, time.monotonic() - started
+
+        finished, user, elapsed = asyncio.run(scenario())
+        self.assertEqual(finished, ["fast", "slow"])
+        self.assertIsInstance(user, User)
+        self.assertLess(elapsed, 0.9)
+
+class TestExecuteAtomic(unittest.TestCase):
+    def test_idle_connection_runs_in_autocommit(self):
+        conn = make_connection()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchone.side_effect = lambda: (conn.autocommit,)
+        self.assertEqual(execute_atomic(conn, "SELECT 1"), (True,))
+        self.assertFalse(conn.autocommit)
+        conn.commit.assert_not_called()
+
+    def test_open_transaction_is_committed(self):
+        conn = make_connection()
+        conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+        conn.cursor.return_value.__enter__.return_value.fetchone.return_value = (1,)
+        self.assertEqual(execute_atomic(conn, "SELECT 1"), (1,))
+        conn.commit.assert_called_once()
+
+    def test_failure_rolls_back_open_transaction(self):
+        conn = make_connection()
+        conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+        conn.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.Error("boom")
+        with self.assertRaises(psycopg2.Error):
+            execute_atomic(conn, "SELECT 1")
+        conn.rollback.assert_called_once()
+
+class TestPrepareStatements(unittest.TestCase):
+    def test_prepares_each_statement_once_and_skips_failures(self):
+        conn = make_connection()
+        conn.prepared = {SEND_MESSAGE.name}
+        cursor = conn.cursor.return_value.__enter__.return_value
+        failing = next(statement for statement in STATEMENTS.values() if statement.prepare and statement is not SEND_MESSAGE)
+
+        def execute(sql):
+            if sql == failing.prepare_sql:
+                raise psycopg2.ProgrammingError("column does not exist")
+
+        cursor.execute.side_effect = execute
+        expected = {name for name, statement in STATEMENTS.items() if statement.prepare} - {SEND_MESSAGE.name, failing.name}
+        self.assertEqual(prepare_statements(conn), len(expected))
+        self.assertEqual(conn.prepared, expected | {SEND_MESSAGE.name})
+        self.assertNotIn(SEND_MESSAGE.prepare_sql, [call[0][0] for call in cursor.execute.call_args_list])
+        self.assertEqual(prepare_statements(conn), 0)
+
+if __name__ == '__main__':
+    unittest.main()
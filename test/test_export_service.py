@@ -0,0 +1,71 @@
+import unittest
+import json
+import threading
+from unittest.mock import MagicMock, patch
+from src.services import export_service
+from src.services.export_service import iter_group_export
+from src.utils.query_util import EXPORT_MESSAGES_BATCH, EXPORT_MESSAGES_CURSOR
+
+ROWS = [(1, 5, "alice", "hello", 0), (2, 6, "bob", 'say "hi", ok', 2), (3, 5, "alice", "bye", 1)]
+
+class TestExportService(unittest.TestCase):
+    @patch('src.services.export_service.get_pool')
+    def test_primary_export_pages_by_keyset(self, mock_get_pool):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = [[(3,)], ROWS[:2], ROWS[2:]]
+        mock_get_pool.return_value.getconn.return_value = conn
+
+        chunks = list(iter_group_export(9, "ndjson", batch_size=2))
+        self.assertEqual(len(chunks), 2)
+        lines = b"".join(chunks).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], [1, 2, 3])
+        self.assertEqual(json.loads(lines[1])["username"], "bob")
+        self.assertEqual(cursor.execute.call_args_list[1][0], (EXPORT_MESSAGES_BATCH, (9, 0, 3, 2)))
+        self.assertEqual(cursor.execute.call_args_list[2][0], (EXPORT_MESSAGES_BATCH, (9, 2, 3, 2)))
+        # Every batch gets its own checkout and ends its transaction before being yielded.
+        self.assertEqual(mock_get_pool.return_value.putconn.call_count, 3)
+        self.assertEqual(conn.rollback.call_count, 3)
+
+    @patch('src.services.export_service.get_pool')
+    def test_csv_export_quotes_content(self, mock_get_pool):
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value.fetchall.side_effect = [[(2,)], ROWS[:2]]
+        mock_get_pool.return_value.getconn.return_value = conn
+
+        text = b"".join(iter_group_export(9, "csv")).decode('utf-8')
+        self.assertEqual(text.splitlines(), ["id,user_id,username,content,likes", "1,5,alice,hello,0", '2,6,bob,"say ""hi"", ok",2'])
+
+    def test_replica_export_uses_server_side_cursor(self):
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.__iter__.return_value = iter(ROWS)
+        router, pool = MagicMock(), MagicMock()
+        router.getconn.return_value = (conn, pool)
+        with patch.object(export_service, "DB_REPLICA_DSNS", ["replica"]), \
+                patch.object(export_service, "get_router", return_value=router), \
+                patch.object(export_service, "is_replica", return_value=True):
+            chunks = list(iter_group_export(9, "ndjson", batch_size=2))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(conn.cursor.call_args[1], {"name": "export_group_9"})
+        self.assertEqual(cursor.itersize, 2)
+        cursor.execute.assert_called_once_with(EXPORT_MESSAGES_CURSOR, (9,))
+        pool.putconn.assert_called_once_with(conn)
+
+    @patch('src.services.export_service.get_pool')
+    def test_replica_cursors_are_capped(self, mock_get_pool):
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value.fetchall.side_effect = [[(2,)], ROWS[:2]]
+        mock_get_pool.return_value.getconn.return_value = conn
+        router = MagicMock()
+        with patch.object(export_service, "DB_REPLICA_DSNS", ["replica"]), \
+                patch.object(export_service, "get_router", return_value=router), \
+                patch.object(export_service, "REPLICA_CURSORS", threading.BoundedSemaphore(1)) as cursors:
+            cursors.acquire()
+            chunks = list(iter_group_export(9, "ndjson", batch_size=2))
+        self.assertEqual(len(chunks), 1)
+        router.getconn.assert_not_called()
+        conn.cursor.assert_called_with()
+
+if __name__ == '__main__':
+    unittest.main()
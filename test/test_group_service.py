@@ -1,15 +1,22 @@
 import unittest
 import asyncio
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock
 from fastapi import HTTPException
-from src.services.group_service import create_group, delete_group, list_groups
-from src.models.schemas import GroupIn, Group, User
+from src.services.group_service import create_group, delete_group, list_groups, list_group_members, add_group_members
+from src.utils.pagination_util import encode_cursor, next_page_cursor, decode_cursor
+from src.services.membership_service import MEMBERSHIP_INDEX
+from src.services.version_service import GROUP_VERSIONS
+from src.models.schemas import GroupIn, Group, GroupSummary, User
 
 class TestGroupService(unittest.TestCase):
-    @patch('src.services.group_service.get_db_connection')
-    def test_create_group_success(self, mock_db):
+    def setUp(self):
+        MEMBERSHIP_INDEX.clear()
+        GROUP_VERSIONS.clear()
+
+    def test_create_group_success(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
-        mock_cursor.fetchone.return_value = (1, "testgroup")
+        mock_cursor.fetchone.side_effect = [(1, "testgroup"), (5, "0,1", 1)]
         mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
 
         group_in = GroupIn(name="testgroup")
@@ -17,30 +24,33 @@ class TestGroupService(unittest.TestCase):
         group = asyncio.run(create_group(group_in, current_user, mock_db()))
         self.assertIsInstance(group, Group)
         self.assertEqual(group.name, "testgroup")
+        self.assertEqual(GROUP_VERSIONS.get(0), 5)
+        self.assertEqual(GROUP_VERSIONS.get(1), 5)
 
-    @patch('src.services.group_service.get_db_connection')
-    def test_delete_group_success(self, mock_db):
+    def test_delete_group_success(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
-        mock_cursor.fetchone.return_value = (1,)  # User is a member
+        mock_cursor.fetchall.return_value = [(1,)]  # User is a member
         mock_cursor.rowcount = 1  # Group was deleted
+        mock_cursor.fetchone.return_value = (6, "0,1", 1)
         mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
 
         current_user = User(id=1, username="testuser", is_admin=False)
         result = asyncio.run(delete_group(1, current_user, mock_db()))
         self.assertEqual(result, {"message": "Group deleted successfully"})
 
-    @patch('src.services.group_service.get_db_connection')
-    def test_delete_group_not_member(self, mock_db):
+    def test_delete_group_not_member(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
-        mock_cursor.fetchone.return_value = None  # User is not a member
+        mock_cursor.fetchall.return_value = []  # User is not a member
         mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
 
         current_user = User(id=1, username="testuser", is_admin=False)
         with self.assertRaises(HTTPException):
             asyncio.run(delete_group(1, current_user, mock_db()))
 
-    @patch('src.services.group_service.get_db_connection')
-    def test_list_groups(self, mock_db):
+    def test_list_groups(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
         mock_cursor.fetchall.return_value = [
             (1, "group1", [1], ["user1"], [False]),
@@ -55,5 +65,69 @@ class TestGroupService(unittest.TestCase):
         self.assertEqual(groups[0].name, "group1")
         self.assertEqual(len(groups[1].members), 2)
 
+    def test_list_groups_page(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.return_value = [(3, "group3", [None], [None], [None]), (4, "group4", [1], ["user1"], [False])]
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        groups = asyncio.run(list_groups(mock_db(), encode_cursor({"after": 2}), limit=2))
+        self.assertEqual(mock_cursor.execute.call_args[0][1], (2, 2))
+        self.assertEqual(groups[0].members, [])
+        self.assertEqual(decode_cursor(next_page_cursor(groups, 2)), {"after": 4})
+        self.assertIsNone(next_page_cursor(groups, 3))
+
+    def test_list_groups_summary(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.return_value = [(1, "group1", 5000)]
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        groups = asyncio.run(list_groups(mock_db(), summary=True))
+        self.assertIsInstance(groups[0], GroupSummary)
+        self.assertEqual(groups[0].member_count, 5000)
+
+    def test_list_group_members(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.return_value = [(7, "user7", False)]
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        members = asyncio.run(list_group_members(1, mock_db(), encode_cursor({"after": 6}), limit=10))
+        self.assertEqual(mock_cursor.execute.call_args[0][1], (1, 6, 10))
+        self.assertEqual(members, [User(id=7, username="user7", is_admin=False)])
+
+    def test_add_group_members_chunked(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.side_effect = [
+            [(1,)],  # User is a member
+            [(2, "added"), (3, "already_member")],
+            [(4, "unknown_user")],
+        ]
+        mock_cursor.fetchone.return_value = (7, "0,1", 1)
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        result = asyncio.run(add_group_members(1, [2, 3, 2, 4], current_user, mock_db(), chunk_size=2))
+        self.assertEqual(result.message, "Members added successfully")
+        self.assertEqual([(r.user_id, r.status) for r in result.results], [(2, "added"), (3, "already_member"), (4, "unknown_user")])
+        self.assertEqual(mock_db.return_value.commit.call_count, 2)
+        self.assertIn(2, MEMBERSHIP_INDEX.get(1))
+        self.assertNotIn(4, MEMBERSHIP_INDEX.get(1))
+        self.assertEqual(mock_cursor.fetchone.call_count, 1)  # Only the chunk that added a member bumps the version
+        self.assertEqual(GROUP_VERSIONS.get(1), 7)
+
+    def test_add_group_members_not_member(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.return_value = []
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(add_group_members(1, [2], current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 403)
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
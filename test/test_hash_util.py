@@ -0,0 +1,72 @@
+import unittest
+import asyncio
+import threading
+from fastapi import HTTPException
+from src.utils.hash_util import HashingPool, hash_password, verify_password
+
+class TestHashUtil(unittest.TestCase):
+    def test_hash_and_verify_password(self):
+        async def scenario():
+            hashed = await hash_password("secret")
+            return hashed, await verify_password("secret", hashed), await verify_password("wrong", hashed)
+
+        hashed, matches, mismatches = asyncio.run(scenario())
+        self.assertNotEqual(hashed, "secret")
+        self.assertTrue(matches)
+        self.assertFalse(mismatches)
+
+    def test_full_queue_sheds_load(self):
+        pool = HashingPool(workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def scenario():
+            running = [asyncio.ensure_future(pool.submit(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            try:
+                await pool.submit(release.wait)
+            finally:
+                release.set()
+                await asyncio.gather(*running)
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(scenario())
+        self.assertEqual(context.exception.status_code, 503)
+        stats = pool.stats()
+        self.assertEqual(stats["rejected_total"], 1)
+        self.assertEqual(stats["completed_total"], 2)
+        self.assertEqual(stats["pending"], 0)
+
+    def test_cancelled_call_counts_until_its_thread_finishes(self):
+        pool = HashingPool(workers=1, max_queue=0)
+        release = threading.Event()
+
+        async def scenario():
+            running = asyncio.ensure_future(pool.submit(release.wait))
+            await asyncio.sleep(0.05)
+            running.cancel()
+            await asyncio.sleep(0)
+            try:
+                self.assertEqual(pool.stats()["pending"], 1)
+                with self.assertRaises(HTTPException):
+                    await pool.submit(release.wait)
+            finally:
+                release.set()
+            await asyncio.sleep(0.05)
+            self.assertEqual(pool.stats()["pending"], 0)
+            self.assertTrue(await pool.submit(release.wait))
+
+        asyncio.run(scenario())
+
+    def test_stats_split_queue_wait_from_hash_time(self):
+        pool = HashingPool(workers=1, max_queue=4)
+
+        async def scenario():
+            await asyncio.gather(*(pool.submit(threading.Event().wait, 0.05) for _ in range(3)))
+
+        asyncio.run(scenario())
+        stats = pool.stats()
+        self.assertGreaterEqual(stats["hash_seconds_total"], 0.15)
+        self.assertGreaterEqual(stats["queue_wait_seconds_total"], 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+from src.utils import lifecycle_util
+from src.utils.lifecycle_util import Readiness, cancel_warm_up, warm_up
+from src.routers.health import readiness_route
+
+class TestLifecycle(unittest.TestCase):
+    def setUp(self):
+        self.readiness = Readiness()
+        patcher = patch.object(lifecycle_util, "READINESS", self.readiness)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("src.routers.health.READINESS", self.readiness)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('src.utils.lifecycle_util.warm_pool', return_value=2)
+    def test_warm_up_marks_ready(self, mock_warm_pool):
+        self.assertEqual(asyncio.run(readiness_route()).status_code, 503)
+        self.assertEqual(asyncio.run(warm_up(2)), 2)
+        mock_warm_pool.assert_called_once_with(2)
+        response = asyncio.run(readiness_route())
+        self.assertEqual(response["status"], "ready")
+        self.readiness.mark_draining()
+        self.assertEqual(asyncio.run(readiness_route()).status_code, 503)
+
+    @patch('src.utils.lifecycle_util.warm_pool', side_effect=[OSError("database unavailable"), OSError("database unavailable"), 2])
+    def test_worker_is_not_ready_until_warm_up_succeeds(self, mock_warm_pool):
+        async def scenario():
+            with self.assertLogs(lifecycle_util.logger, "WARNING"):
+                self.assertEqual(await warm_up(2, retry_interval=0.01), 0)
+            self.assertEqual((await readiness_route()).status_code, 503)
+            for _ in range(100):
+                if self.readiness.ready:
+                    break
+                await asyncio.sleep(0.01)
+
+        asyncio.run(scenario())
+        self.assertTrue(self.readiness.ready)
+        self.assertEqual(mock_warm_pool.call_count, 3)
+
+    @patch('src.utils.lifecycle_util.warm_pool', side_effect=OSError("database unavailable"))
+    def test_draining_worker_stops_retrying(self, mock_warm_pool):
+        async def scenario():
+            with self.assertLogs(lifecycle_util.logger, "WARNING"):
+                await warm_up(2, retry_interval=0.01)
+            self.readiness.mark_draining()
+            cancel_warm_up()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+        self.assertFalse(self.readiness.ready)
+        self.assertEqual(mock_warm_pool.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
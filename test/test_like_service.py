@@ -0,0 +1,85 @@
+import unittest
+import asyncio
+import psycopg2
+from unittest.mock import patch
+from src.services.like_service import LikeAggregator
+
+class TestLikeAggregator(unittest.TestCase):
+    def test_running_count_includes_pending_likes(self):
+        aggregator = LikeAggregator()
+        self.assertEqual(aggregator.add(1, 1, 10), 11)
+        self.assertEqual(aggregator.add(1, 2, 10), 12)
+        self.assertEqual(aggregator.add(2, 1, 0), 1)
+
+    def test_dedup_ignores_repeated_likes(self):
+        aggregator = LikeAggregator(dedup=True)
+        self.assertEqual(aggregator.add(1, 1, 10), 11)
+        self.assertEqual(aggregator.add(1, 1, 10), 11)
+        self.assertEqual(aggregator.add(1, 2, 10, already_liked=True), 11)
+
+    @patch('src.services.like_service._write_likes')
+    def test_flush_coalesces_increments(self, mock_write):
+        aggregator = LikeAggregator()
+        for user_id in range(5):
+            aggregator.add(1, user_id, 0)
+        aggregator.add(2, 1, 0)
+        asyncio.run(aggregator.flush())
+        mock_write.assert_called_once_with({1: 5, 2: 1}, None)
+        self.assertEqual(aggregator.add(1, 1, 5), 6)
+
+    @patch('src.services.like_service._write_likes')
+    def test_failed_flush_keeps_likes_pending(self, mock_write):
+        mock_write.side_effect = [psycopg2.OperationalError("database down"), None]
+        aggregator = LikeAggregator()
+        aggregator.add(1, 1, 0)
+        asyncio.run(aggregator.flush())
+        self.assertEqual(aggregator.add(2, 1, 0), 1)
+        asyncio.run(aggregator.flush())
+        self.assertEqual(mock_write.call_count, 2)
+        self.assertEqual(mock_write.call_args[0][0], {1: 1, 2: 1})
+
+    @patch('src.services.like_service._write_likes')
+    def test_rejected_likes_are_dropped(self, mock_write):
+        def write(counts, likers):
+            if 2 in counts:
+                raise psycopg2.errors.ForeignKeyViolation("message 2 was deleted")
+        mock_write.side_effect = write
+        aggregator = LikeAggregator(dedup=True)
+        for message_id in (1, 2, 3):
+            aggregator.add(message_id, 7, 0)
+        with self.assertLogs('src.services.like_service', 'WARNING'):
+            asyncio.run(aggregator.flush())
+        written = [call[0] for call in mock_write.call_args_list if 2 not in call[0][0]]
+        self.assertEqual(written, [({1: 1}, [(1, 7)]), ({3: 1}, [(3, 7)])])
+        mock_write.reset_mock()
+        asyncio.run(aggregator.flush())
+        mock_write.assert_not_called()
+
+    @patch('src.services.like_service._write_likes')
+    def test_threshold_triggers_flush_and_stop_drains(self, mock_write):
+        aggregator = LikeAggregator(flush_interval=60, flush_threshold=3)
+
+        async def scenario():
+            aggregator.start()
+            for user_id in range(3):
+                aggregator.add(1, user_id, 0)
+            await asyncio.sleep(0.1)
+            aggregator.add(2, 1, 0)
+            await aggregator.stop()
+
+        asyncio.run(scenario())
+        self.assertEqual([call[0][0] for call in mock_write.call_args_list], [{1: 3}, {2: 1}])
+        self.assertFalse(aggregator.running)
+
+    @patch('src.services.like_service.get_pool')
+    def test_write_likes_batches_into_one_transaction(self, mock_get_pool):
+        from src.services.like_service import _write_likes
+        conn = mock_get_pool.return_value.getconn.return_value
+        with patch('src.services.like_service.execute_values') as mock_execute_values:
+            _write_likes({2: 1, 1: 4})
+        self.assertEqual(mock_execute_values.call_args[0][2], [(1, 4), (2, 1)])
+        conn.commit.assert_called_once()
+        mock_get_pool.return_value.putconn.assert_called_once_with(conn)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+from src.services.membership_service import MEMBERSHIP_INDEX, is_group_member, require_group_member, _on_membership_changed
+from src.utils.membership_util import MembershipIndex, MemberSet
+from src.utils.notify_util import WORKER_ID
+from src.utils.replica_util import ReplicaConnection
+
+class TestMembershipIndex(unittest.TestCase):
+    def test_member_set(self):
+        members = MemberSet([5, 1, 3, 3])
+        self.assertEqual(len(members), 3)
+        self.assertIn(3, members)
+        self.assertNotIn(2, members)
+        self.assertIn(2, members.union([2]))
+
+    def test_bounded_by_total_members(self):
+        index = MembershipIndex(max_members=4, ttl=60)
+        index.put(1, MemberSet([1, 2]))
+        index.put(2, MemberSet([1, 2]))
+        index.get(1)
+        index.put(3, MemberSet([3]))
+        self.assertIsNotNone(index.get(1))
+        self.assertIsNone(index.get(2))
+        self.assertLessEqual(index.stats()["members"], 4)
+
+    def test_stale_load_is_discarded(self):
+        index = MembershipIndex(max_members=10, ttl=60)
+        generation = index.generation()
+        index.invalidate(1)
+        index.put(1, MemberSet([1]), generation)
+        self.assertIsNone(index.get(1))
+
+    def test_load_racing_added_members_is_discarded(self):
+        index = MembershipIndex(max_members=10, ttl=60)
+        generation = index.generation()
+        index.add_members(1, [2])
+        index.put(1, MemberSet([1]), generation)
+        self.assertIsNone(index.get(1))
+
+    def test_group_outgrowing_the_index_is_dropped(self):
+        index = MembershipIndex(max_members=3, ttl=60)
+        index.put(1, MemberSet([1, 2]))
+        index.add_members(1, [3, 4])
+        self.assertIsNone(index.get(1))
+        self.assertEqual(index.stats()["members"], 0)
+
+class TestMembershipService(unittest.TestCase):
+    def setUp(self):
+        MEMBERSHIP_INDEX.clear()
+        self.db = MagicMock()
+        self.cursor = self.db.cursor.return_value.__enter__.return_value
+        self.cursor.fetchall.return_value = [(1,), (2,)]
+
+    def test_group_loaded_once(self):
+        async def scenario():
+            return [await is_group_member(1, user_id, self.db) for user_id in (1, 2, 3)]
+
+        self.assertEqual(asyncio.run(scenario()), [True, True, False])
+        self.assertEqual(self.cursor.execute.call_count, 1)
+
+    def test_replica_reads_are_not_cached(self):
+        replica = MagicMock(spec=ReplicaConnection)
+        cursor = replica.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (1,)
+        self.assertTrue(asyncio.run(is_group_member(1, 1, replica)))
+        self.assertEqual(cursor.execute.call_args[0][1], (1, 1))
+        self.assertIsNone(MEMBERSHIP_INDEX.get(1))
+        asyncio.run(is_group_member(1, 1, self.db))
+        self.assertTrue(asyncio.run(is_group_member(1, 2, replica)))
+        self.assertEqual(cursor.execute.call_count, 1)
+
+    def test_not_member_raises(self):
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(require_group_member(1, 3, self.db))
+        self.assertEqual(context.exception.status_code, 403)
+
+    def test_notification_from_other_worker_invalidates(self):
+        asyncio.run(is_group_member(1, 1, self.db))
+        _on_membership_changed("%s:1" % WORKER_ID)
+        self.assertIsNotNone(MEMBERSHIP_INDEX.get(1))
+        _on_membership_changed("otherworker:1")
+        self.assertIsNone(MEMBERSHIP_INDEX.get(1))
+
+if __name__ == '__main__':
+    unittest.main()
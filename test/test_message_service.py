@@ -1,15 +1,23 @@
 import unittest
+import base64
 import asyncio
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 from fastapi import HTTPException
-from src.services.message_service import send_group_message, like_message
+from src.services.message_service import (send_group_message, send_group_messages, like_message, list_group_messages, search_group_messages,
+                                          MESSAGE_BATCH_MAX_COUNT)
+from src.utils.pagination_util import decode_cursor, encode_cursor
+from src.services.membership_service import MEMBERSHIP_INDEX
+from src.utils.query_util import SEND_MESSAGE, SEARCH_MESSAGES, SEARCH_MESSAGES_AFTER
 from src.models.schemas import MessageIn, Message, User
 
 class TestMessageService(unittest.TestCase):
-    @patch('src.services.message_service.get_db_connection')
-    def test_send_group_message_success(self, mock_db):
+    def setUp(self):
+        MEMBERSHIP_INDEX.clear()
+
+    def test_send_group_message_success(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
-        mock_cursor.fetchone.side_effect = [(1,), (1, 1, "test message", 0)]
+        mock_cursor.fetchone.return_value = (True, 1, 1, "test message", 0, 1, [])
         mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
 
         message_in = MessageIn(content="test message")
@@ -17,37 +25,190 @@ class TestMessageService(unittest.TestCase):
         message = asyncio.run(send_group_message(1, message_in, current_user, mock_db()))
         self.assertIsInstance(message, Message)
         self.assertEqual(message.content, "test message")
+        self.assertEqual(mock_cursor.execute.call_count, 1)
+        self.assertEqual(mock_cursor.execute.call_args[0][0], SEND_MESSAGE)
 
-    @patch('src.services.message_service.get_db_connection')
-    def test_send_group_message_not_member(self, mock_db):
+    def test_send_group_message_not_member(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
-        mock_cursor.fetchone.return_value = None  # User is not a member
+        mock_cursor.fetchone.return_value = (False, None, None, None, None, 0, None)  # User is not a member
         mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
 
         message_in = MessageIn(content="test message")
         current_user = User(id=1, username="testuser", is_admin=False)
-        with self.assertRaises(HTTPException):
+        with self.assertRaises(HTTPException) as context:
             asyncio.run(send_group_message(1, message_in, current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 403)
+
+    def test_send_group_message_with_attachments(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchone.return_value = (True, 1, 1, "see attached", 0, 1, [7, 8])
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        message = asyncio.run(send_group_message(1, MessageIn(content="see attached", attachment_ids=[8, 7, 8]), current_user, mock_db()))
+        self.assertEqual(message.attachment_ids, [7, 8])
+        self.assertEqual(mock_cursor.execute.call_args[0][1]["attachment_ids"], [7, 8])
 
-    @patch('src.services.message_service.get_db_connection')
-    def test_like_message_success(self, mock_db):
+        mock_cursor.fetchone.return_value = (True, None, None, None, None, 0, None)  # Not the user's unsent uploads
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(send_group_message(1, MessageIn(content="see attached", attachment_ids=[9]), current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_like_message_success(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
-        mock_cursor.fetchone.side_effect = [(1,), (1,), (5,)]
+        mock_cursor.fetchone.return_value = (1, True, 5, 1)
         mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
 
         current_user = User(id=1, username="testuser", is_admin=False)
         result = asyncio.run(like_message(1, current_user, mock_db()))
         self.assertEqual(result, {"likes": 5})
+        self.assertEqual(mock_cursor.execute.call_count, 1)
+
+    def test_like_message_not_member(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchone.return_value = (1, False, 4, 0)
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(like_message(1, current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 403)
 
-    @patch('src.services.message_service.get_db_connection')
-    def test_like_message_not_found(self, mock_db):
+    def test_like_message_not_found(self):
+        mock_db = MagicMock()
         mock_cursor = Mock()
-        mock_cursor.fetchone.return_value = None  # Message not found
+        mock_cursor.fetchone.return_value = (None, False, None, 0)  # Message not found
         mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
 
         current_user = User(id=1, username="testuser", is_admin=False)
-        with self.assertRaises(HTTPException):
+        with self.assertRaises(HTTPException) as context:
             asyncio.run(like_message(1, current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 404)
+
+    def test_list_group_messages_latest(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.side_effect = [[(1,)], [(3, 1, "c", 0, []), (2, 1, "b", 0, [5]), (1, 1, "a", 0, [])]]
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        messages, next_cursor, prev_cursor = asyncio.run(list_group_messages(1, current_user, mock_db(), limit=2))
+        self.assertEqual([message.id for message in messages], [3, 2])
+        self.assertEqual(messages[1].attachment_ids, [5])
+        self.assertEqual(decode_cursor(next_cursor), {"before": 2})
+        self.assertEqual(decode_cursor(prev_cursor), {"after": 3})
+        self.assertEqual(mock_cursor.execute.call_args[0][1], (1, 3))
+
+    def test_list_group_messages_after(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.side_effect = [[(1,)], [(4, 1, "d", 0, []), (5, 1, "e", 0, [])]]
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        cursor = encode_cursor({"after": 3})
+        messages, next_cursor, prev_cursor = asyncio.run(list_group_messages(1, current_user, mock_db(), cursor, limit=2))
+        self.assertEqual([message.id for message in messages], [5, 4])
+        self.assertEqual(decode_cursor(next_cursor), {"before": 4})
+        self.assertEqual(decode_cursor(prev_cursor), {"after": 5})
+        self.assertEqual(mock_cursor.execute.call_args[0][1], (1, 3, 3))
+
+    def test_list_group_messages_invalid_cursor(self):
+        mock_db = MagicMock()
+        current_user = User(id=1, username="testuser", is_admin=False)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(list_group_messages(1, current_user, mock_db(), encode_cursor({"before": "x"})))
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_decode_cursor_rejects_values_out_of_range(self):
+        self.assertEqual(decode_cursor(encode_cursor({"before": 2 ** 63 - 1})), {"before": 2 ** 63 - 1})
+        raw_cursors = [b'{"before":NaN}', b'{"before":Infinity}', b'{"before":1e999}', b'{"before":1.5}',
+                       b'{"before":9223372036854775808}', b'{"before":true}', b'[1]']
+        for raw in raw_cursors:
+            with self.assertRaises(HTTPException) as context:
+                decode_cursor(base64.urlsafe_b64encode(raw).decode())
+            self.assertEqual(context.exception.status_code, 400)
+            self.assertEqual(context.exception.detail, "Invalid cursor")
+
+    def test_list_group_messages_not_member(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.return_value = []
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(list_group_messages(1, current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 403)
+
+    def test_search_group_messages_pages_by_rank(self):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.side_effect = [[(1,)], [(7, 1, "cats", 0, [], 0.5), (3, 1, "cats cats", 0, [], 0.25), (9, 1, "cat", 0, [], 0.25)]]
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+
+        current_user = User(id=1, username="testuser", is_admin=False)
+        messages, next_cursor = asyncio.run(search_group_messages(1, "cats", current_user, mock_db(), limit=2))
+        self.assertEqual([message.id for message in messages], [7, 3])
+        self.assertEqual(decode_cursor(next_cursor, float_keys=("rank",)), {"rank": 0.25, "id": 3})
+        self.assertIs(mock_cursor.execute.call_args[0][0], SEARCH_MESSAGES)
+        self.assertEqual(mock_cursor.execute.call_args[0][1], {"group_id": 1, "q": "cats", "limit": 3})
+
+        mock_cursor.fetchall.side_effect = [[(9, 1, "cat", 0, [], 0.25)]]
+        messages, next_cursor = asyncio.run(search_group_messages(1, "cats", current_user, mock_db(), next_cursor, limit=2))
+        self.assertEqual([message.id for message in messages], [9])
+        self.assertIsNone(next_cursor)
+        self.assertIs(mock_cursor.execute.call_args[0][0], SEARCH_MESSAGES_AFTER)
+        self.assertEqual(mock_cursor.execute.call_args[0][1], {"group_id": 1, "q": "cats", "limit": 3, "rank": 0.25, "id": 3})
+
+    def test_search_group_messages_rejects_foreign_cursor(self):
+        mock_db = MagicMock()
+        current_user = User(id=1, username="testuser", is_admin=False)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(search_group_messages(1, "cats", current_user, mock_db(), encode_cursor({"before": 3})))
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_search_group_messages_rejects_cursor_out_of_range(self):
+        mock_db = MagicMock()
+        current_user = User(id=1, username="testuser", is_admin=False)
+        raw_cursors = [b'{"rank":NaN,"id":3}', b'{"rank":1e300,"id":3}', b'{"rank":0.5,"id":2.5}',
+                       b'{"rank":0.5,"id":99999999999999999999}', b'{"rank":"0.5","id":3}']
+        for raw in raw_cursors:
+            with self.assertRaises(HTTPException) as context:
+                asyncio.run(search_group_messages(1, "cats", current_user, mock_db(), base64.urlsafe_b64encode(raw).decode()))
+            self.assertEqual(context.exception.status_code, 400)
+        mock_db.return_value.cursor.assert_not_called()
+
+    @patch('src.services.message_service.execute_values')
+    def test_send_group_messages_success(self, mock_execute_values):
+        mock_db = MagicMock()
+        mock_cursor = Mock()
+        mock_cursor.fetchall.return_value = [(1,)]
+        mock_db.return_value.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_execute_values.return_value = [(11, 1, "second", 0), (10, 1, "first", 0)]
+
+        messages_in = [MessageIn(content="first"), MessageIn(content="second")]
+        current_user = User(id=1, username="testuser", is_admin=False)
+        messages = asyncio.run(send_group_messages(1, messages_in, current_user, mock_db()))
+        self.assertEqual([message.content for message in messages], ["first", "second"])
+        self.assertEqual(mock_execute_values.call_args[0][2], [(1, 1, "first"), (1, 1, "second")])
+        self.assertEqual(mock_execute_values.call_count, 1)
+        mock_db.return_value.commit.assert_called_once()
+
+    def test_send_group_messages_too_large(self):
+        mock_db = MagicMock()
+        current_user = User(id=1, username="testuser", is_admin=False)
+        messages_in = [MessageIn(content="x")] * (MESSAGE_BATCH_MAX_COUNT + 1)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(send_group_messages(1, messages_in, current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 413)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(send_group_messages(1, [], current_user, mock_db()))
+        self.assertEqual(context.exception.status_code, 400)
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import asyncio
+from types import SimpleNamespace
+from src.utils.metrics_util import Registry, RequestTimingMiddleware, HTTP_REQUEST_SECONDS
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = Registry()
+        histogram = registry.histogram("query_seconds", "Query time.", ("statement",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, "select")
+        histogram.observe(0.5, "select")
+        histogram.observe(2.0, "select")
+        text = registry.render()
+        self.assertIn('query_seconds_bucket{statement="select",le="0.1"} 1', text)
+        self.assertIn('query_seconds_bucket{statement="select",le="1"} 2', text)
+        self.assertIn('query_seconds_bucket{statement="select",le="+Inf"} 3', text)
+        self.assertIn('query_seconds_count{statement="select"} 3', text)
+        self.assertIn('query_seconds_sum{statement="select"} 2.55', text)
+        self.assertIn("# TYPE query_seconds histogram", text)
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        counter = registry.counter("logins_total", "Logins.")
+        gauge = registry.gauge("connections", "Connections.", ("state",))
+        counter.inc()
+        counter.inc(amount=2)
+        gauge.set(3, "idle")
+        text = registry.render()
+        self.assertIn("logins_total 3\n", text)
+        self.assertIn('connections{state="idle"} 3\n', text)
+        with self.assertRaises(ValueError):
+            registry.counter("logins_total", "Again.")
+
+    def test_middleware_records_route_template(self):
+        async def app(scope, receive, send):
+            scope["route"] = SimpleNamespace(path="/groups/{group_id}")
+            await send({"type": "http.response.start", "status": 204, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            pass
+
+        scope = {"type": "http", "method": "DELETE", "path": "/groups/7"}
+        asyncio.run(RequestTimingMiddleware(app)(scope, None, send))
+        self.assertIn('http_request_duration_seconds_count{method="DELETE",route="/groups/{group_id}",status="204"} 1',
+                      "\n".join(HTTP_REQUEST_SECONDS.render()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import json
+import os
+import unittest
+import uuid
+import psycopg2
+from src.migrations.runner import migrate, rollback, current_version
+from src.migrations.versions import MIGRATIONS, Migration, OnlineStep
+from src.utils.query_util import STATEMENTS
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+class FakeDatabase:
+    """Records executed migration scripts and tracks schema_migrations rows in memory."""
+
+    def __init__(self, results=(), fail_on: str = None):
+        self.applied = set()
+        self.scripts = []
+        self.autocommit = False
+        self.results = list(results)
+        self.fail_on = fail_on
+        self._row = None
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self._row = None
+        if query.startswith("SELECT coalesce(max(version)"):
+            self._row = (max(self.applied, default=0),)
+        elif query.startswith("SELECT 1 FROM schema_migrations"):
+            self._row = (1,) if params[0] in self.applied else None
+        elif query.startswith("INSERT INTO schema_migrations"):
+            self.applied.add(params[0])
+        elif query.startswith("DELETE FROM schema_migrations"):
+            self.applied.discard(params[0])
+        elif not query.lstrip().startswith(("CREATE TABLE IF NOT EXISTS schema_migrations", "SELECT pg_advisory")):
+            if query == self.fail_on:
+                raise psycopg2.OperationalError("connection lost")
+            self.scripts.append((query, params, self.autocommit) if params or self.autocommit else query)
+            self._row = self.results.pop(0) if params and self.results else (None,)
+
+    def fetchone(self):
+        return self._row
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+MIGRATIONS_UNDER_TEST = [Migration(1, "one", "up 1", "down 1"), Migration(2, "two", "up 2", "down 2"), Migration(3, "three", "up 3", "down 3")]
+
+class TestMigrationRunner(unittest.TestCase):
+    def test_versions_are_ordered_and_reversible(self):
+        versions = [migration.version for migration in MIGRATIONS]
+        self.assertEqual(versions, sorted(set(versions)))
+        self.assertTrue(all(migration.down.strip() for migration in MIGRATIONS))
+
+    def test_migrate_applies_pending_in_order(self):
+        db = FakeDatabase()
+        db.applied.add(1)
+        self.assertEqual(migrate(db, migrations=MIGRATIONS_UNDER_TEST), [2, 3])
+        self.assertEqual(db.scripts, ["up 2", "up 3"])
+        self.assertEqual(migrate(db, migrations=MIGRATIONS_UNDER_TEST), [])
+
+    def test_rollback_reverts_down_to_target(self):
+        db = FakeDatabase()
+        migrate(db, target=2, migrations=MIGRATIONS_UNDER_TEST)
+        self.assertEqual(rollback(db, 0, migrations=MIGRATIONS_UNDER_TEST), [2, 1])
+        self.assertEqual(db.scripts, ["up 1", "up 2", "down 2", "down 1"])
+        self.assertEqual(current_version(db), 0)
+
+    def test_online_steps_run_before_the_version_is_recorded(self):
+        online = (OnlineStep("fill", batched=True), OnlineStep("index", autocommit=True))
+        migrations = [Migration(1, "one", "up 1", "down 1", online=online)]
+        db = FakeDatabase(results=[(10,), (20,), (None,)], fail_on="index")
+        with self.assertRaises(psycopg2.OperationalError):
+            migrate(db, migrations=migrations)
+        self.assertEqual(db.applied, set())
+        self.assertFalse(db.autocommit)
+        self.assertEqual(db.scripts, ["up 1", ("fill", {"after": 0}, False), ("fill", {"after": 10}, False),
+                                      ("fill", {"after": 20}, False)])
+
+        db.scripts, db.fail_on = [], None
+        self.assertEqual(migrate(db, migrations=migrations), [1])
+        self.assertEqual(db.scripts, ["up 1", ("fill", {"after": 0}, False), ("index", None, True)])
+        self.assertEqual(migrate(db, migrations=migrations), [])
+
+# Representative parameters for every prepared statement. A new statement must be added
+# here so its plan is checked.
+STATEMENT_PARAMS = {
+    "select_user_by_username": ("user42",),
+    "select_auth_user": ("user42",),
+    "select_user_id_by_username": ("user42",),
+    "insert_user": ("new_user", "x", False),
+    "update_user": ("user42", "x", False, 42),
+    "insert_group": ("new_group",),
+    "insert_group_member": (1, 42),
+    "insert_group_members_bulk": ([41, 42, 43], 1),
+    "select_group_member": (1, 42),
+    "select_group_member_ids": (1,),
+    "delete_group": (1,),
+    "select_groups_page": (0, 51),
+    "select_group_summaries_page": (0, 51),
+    "select_group_members_page": (1, 0, 51),
+    "select_messages_latest": (1, 51),
+    "select_messages_before": (1, 100000, 51),
+    "select_messages_after": (1, 1000, 51),
+    "send_message": {"group_id": 1, "user_id": 42, "content": "hello", "attachment_ids": [1, 2], "channel": "group_events",
+                     "worker": "test", "max_payload": 7900},
+    "like_message": {"message_id": 1, "user_id": 42, "channel": "group_events", "worker": "test"},
+    "like_message_dedup": {"message_id": 1, "user_id": 42, "channel": "group_events", "worker": "test"},
+    "select_message_like_state": {"message_id": 1, "user_id": 42},
+    "select_message_like_state_dedup": {"message_id": 1, "user_id": 42},
+    "export_messages_batch": (1, 0, 300000, 1000),
+    "select_newest_message_id": (1,),
+    "mark_group_read": {"group_id": 1, "user_id": 42, "message_id": None},
+    "select_unread_counts": {"user_id": 42, "cap": 100},
+    "search_messages": {"group_id": 1, "q": "42", "limit": 51},
+    "search_messages_after": {"group_id": 1, "q": "42", "limit": 51, "rank": 0.1, "id": 100000},
+    "insert_attachment": (1, 42, "0" * 64, 10, "text/plain", "notes.txt"),
+    "select_attachment": (1,),
+    "bump_group_versions": {"group_ids": [1], "user_id": None, "channel": "group_versions", "max_groups": 500},
+    "select_group_version": (0,),
+}
+
+SEED = """
+    INSERT INTO users (username, password) SELECT 'user' || i, 'x' FROM generate_series(1, 100000) i;
+    INSERT INTO groups (name) SELECT 'group' || i FROM generate_series(1, 5000) i;
+    INSERT INTO group_members (group_id, user_id)
+        SELECT g, (g * 7919 + k * 104729) % 100000 + 1 FROM generate_series(1, 5000) g, generate_series(1, 20) k
+        ON CONFLICT DO NOTHING;
+    INSERT INTO messages (group_id, user_id, content)
+        SELECT i % 5000 + 1, i % 100000 + 1, 'message ' || i FROM generate_series(1, 300000) i;
+    INSERT INTO message_likes (message_id, user_id) SELECT i, i % 100000 + 1 FROM generate_series(1, 100000) i;
+    INSERT INTO attachments (group_id, user_id, message_id, sha256, size, content_type, filename)
+        SELECT i % 5000 + 1, i % 100000 + 1, i * 3, md5(i::text), 10, 'text/plain', 'file' || i FROM generate_series(1, 100000) i;
+    INSERT INTO group_versions (group_id, version) SELECT i, i + 1 FROM generate_series(0, 5000) i;
+    ANALYZE;
+"""
+
+def seq_scans(plan: dict) -> list:
+    found = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL is not set")
+class TestMigrationsOnPostgres(unittest.TestCase):
+    """Runs against a scratch schema of a local Postgres, e.g. TEST_DATABASE_URL=postgresql://localhost/chat_test."""
+
+    def setUp(self):
+        self.conn = psycopg2.connect(TEST_DATABASE_URL)
+        self.schema = "migration_test_" + uuid.uuid4().hex[:8]
+        with self.conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {self.schema}")
+            cur.execute(f"SET search_path TO {self.schema}")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.rollback()
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {self.schema} CASCADE")
+        self.conn.commit()
+        self.conn.close()
+
+    def test_up_down_up(self):
+        self.assertEqual(migrate(self.conn), [migration.version for migration in MIGRATIONS])
+        self.assertEqual(current_version(self.conn), MIGRATIONS[-1].version)
+        rollback(self.conn, 0)
+        self.assertEqual(current_version(self.conn), 0)
+        migrate(self.conn)
+        self.assertEqual(current_version(self.conn), MIGRATIONS[-1].version)
+
+    def test_hot_queries_use_indexes(self):
+        migrate(self.conn)
+        with self.conn.cursor() as cur:
+            cur.execute(SEED)
+        self.conn.commit()
+        prepared = {name for name, statement in STATEMENTS.items() if statement.prepare}
+        self.assertEqual(prepared - set(STATEMENT_PARAMS), set(), "statements without plan check parameters")
+        degraded = {}
+        with self.conn.cursor() as cur:
+            for name in sorted(prepared):
+                cur.execute("EXPLAIN (FORMAT JSON) " + STATEMENTS[name], STATEMENT_PARAMS[name])
+                plan = cur.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                scans = seq_scans(plan[0]["Plan"])
+                if scans:
+                    degraded[name] = scans
+        self.assertEqual(degraded, {}, "queries planned with sequential scans")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import asyncio
+import threading
+from src.utils.pubsub_util import Broker
+
+class TestBroker(unittest.TestCase):
+    def test_fan_out_to_topic_subscribers(self):
+        broker = Broker(queue_size=10)
+
+        async def scenario():
+            first, second, other = broker.subscribe(1), broker.subscribe(1), broker.subscribe(2)
+            broker.publish(1, {"n": 1})
+            received = [await first.next(0.1), await second.next(0.1), await other.next(0.01)]
+            for subscription in (first, second, other):
+                subscription.close()
+            return received
+
+        self.assertEqual(asyncio.run(scenario()), [{"n": 1}, {"n": 1}, None])
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_slow_consumer_is_evicted(self):
+        broker = Broker(queue_size=2)
+
+        async def scenario():
+            slow = broker.subscribe(1)
+            for n in range(3):
+                broker.publish(1, n)
+            return [event async for event in slow], slow.evicted
+
+        self.assertEqual(asyncio.run(scenario()), ([0, 1], True))
+        self.assertEqual(broker.evictions, 1)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_publish_from_another_thread(self):
+        broker = Broker(queue_size=10)
+
+        async def scenario():
+            subscription = broker.subscribe(1)
+            threading.Thread(target=broker.publish_threadsafe, args=(1, "event")).start()
+            return await subscription.next(1)
+
+        self.assertEqual(asyncio.run(scenario()), "event")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from src.utils.query_util import Statement, STATEMENTS, SELECT_MESSAGES_BEFORE, SEND_MESSAGE, INSERT_MESSAGES_BATCH
+
+class TestStatement(unittest.TestCase):
+    def test_positional_placeholders_are_numbered(self):
+        self.assertEqual(SELECT_MESSAGES_BEFORE.execute_sql, "EXECUTE select_messages_before (%s, %s, %s)")
+        self.assertIn("m.group_id = $1 AND m.id < $2 ORDER BY m.id DESC LIMIT $3", SELECT_MESSAGES_BEFORE.prepare_sql)
+        self.assertTrue(SELECT_MESSAGES_BEFORE.prepare_sql.startswith("PREPARE select_messages_before AS SELECT"))
+
+    def test_named_placeholders_share_a_number(self):
+        self.assertTrue(SEND_MESSAGE.execute_sql.startswith("EXECUTE send_message (%(group_id)s, %(user_id)s, %(attachment_ids)s, %(content)s"))
+        self.assertEqual(SEND_MESSAGE.prepare_sql.count("$1::bigint"), 3)
+        self.assertNotIn("%(", SEND_MESSAGE.prepare_sql)
+
+    def test_statement_is_plain_sql(self):
+        self.assertIsInstance(SEND_MESSAGE, str)
+        self.assertIn("WITH member AS", SEND_MESSAGE)
+        self.assertFalse(INSERT_MESSAGES_BATCH.prepare)
+
+    def test_registry(self):
+        self.assertIs(STATEMENTS["send_message"], SEND_MESSAGE)
+        with self.assertRaises(ValueError):
+            Statement("send_message", "SELECT 1")
+        statement = Statement("test_literal_percent", "SELECT %s LIKE 'a%%'")
+        self.addCleanup(STATEMENTS.pop, "test_literal_percent")
+        self.assertEqual(statement.prepare_sql, "PREPARE test_literal_percent AS SELECT $1 LIKE 'a%'")
+        with self.assertRaises(ValueError):
+            Statement("test_mixed", "SELECT %s, %(a)s")
+
+if __name__ == '__main__':
+    unittest.main()
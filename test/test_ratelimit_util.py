@@ -0,0 +1,106 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+from unittest.mock import patch
+from fastapi import HTTPException
+from src.utils.metrics_util import Ewma
+from src.utils.ratelimit_util import MemoryRateLimitBackend, SqliteRateLimitBackend, RateLimiter, LoadShedder, create_rate_limiter
+from src.services import admission_service
+
+class TestRateLimiter(unittest.TestCase):
+    def test_bucket_allows_burst_then_refills(self):
+        backend = MemoryRateLimitBackend()
+        self.assertEqual(backend.take("1:like", 1.0, 2, 1, now=100.0), 0)
+        self.assertEqual(backend.take("1:like", 1.0, 2, 1, now=100.0), 0)
+        self.assertAlmostEqual(backend.take("1:like", 1.0, 2, 1, now=100.0), 1.0)
+        self.assertEqual(backend.take("2:like", 1.0, 2, 1, now=100.0), 0)
+        self.assertEqual(backend.take("1:like", 1.0, 2, 1, now=101.0), 0)
+
+    def test_memory_backend_evicts_least_recently_used(self):
+        backend = MemoryRateLimitBackend(max_keys=2)
+        backend.take("a", 1.0, 1, 1, now=0.0)
+        backend.take("b", 1.0, 1, 1, now=0.0)
+        backend.take("c", 1.0, 1, 1, now=0.0)
+        self.assertEqual(list(backend._buckets), ["b", "c"])
+
+    def test_acquire_raises_429_with_retry_after(self):
+        limiter = RateLimiter(MemoryRateLimitBackend(), rate=0.5, burst=1)
+
+        async def run():
+            await limiter.acquire("1:send")
+            await limiter.acquire("1:send")
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(run())
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.headers["Retry-After"], "2")
+
+    def test_sqlite_backend_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "buckets.db")
+            first, second = SqliteRateLimitBackend(path), SqliteRateLimitBackend(path)
+            self.assertEqual(first.take("1:send", 1.0, 1, 1, now=100.0), 0)
+            self.assertAlmostEqual(second.take("1:send", 1.0, 1, 1, now=100.5), 0.5)
+            self.assertEqual(second.purge(before=200.0), 1)
+            limiter = RateLimiter(first, rate=1.0, burst=1)
+            asyncio.run(limiter.acquire("2:send"))
+
+    def test_sqlite_backend_purges_refilled_buckets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SqliteRateLimitBackend(os.path.join(directory, "buckets.db"), purge_every=2)
+            backend.take("1:send", 1.0, 5, 1, now=100.0)
+            backend.take("2:send", 1.0, 5, 1, now=103.0)
+            backend.take("3:send", 1.0, 5, 1, now=106.0)
+            backend.take("4:send", 1.0, 5, 1, now=107.0)
+            self.assertEqual(backend.purge(before=1000.0), 3)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_rate_limiter("redis")
+
+class TestLoadShedder(unittest.TestCase):
+    def test_sheds_beyond_max_in_flight(self):
+        shedder = LoadShedder(max_in_flight=1, max_latency=0, latency=Ewma())
+        shedder.admit()
+        with self.assertRaises(HTTPException) as ctx:
+            shedder.admit()
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(ctx.exception.headers["Retry-After"], "1")
+        shedder.release()
+        shedder.admit()
+        self.assertEqual(shedder.shed_total, 1)
+
+    def test_sheds_while_database_latency_is_recent_and_high(self):
+        latency = Ewma(alpha=1.0)
+        shedder = LoadShedder(max_in_flight=0, max_latency=0.5, latency=latency, stale_after=1.0)
+        latency.update(2.0)
+        with self.assertRaises(HTTPException):
+            shedder.admit()
+        latency.updated = time.monotonic() - 5
+        shedder.admit()
+        self.assertEqual(shedder.in_flight, 1)
+
+class TestAdmissionControl(unittest.TestCase):
+    def test_rate_limited_request_does_not_take_a_slot(self):
+        shedder = LoadShedder(max_in_flight=1, max_latency=0, latency=Ewma())
+        limiter = RateLimiter(MemoryRateLimitBackend(), rate=1.0, burst=1)
+        admit = admission_service.admission_control("send_group_message")
+
+        async def run():
+            dependency = admit("alice")
+            await dependency.__anext__()
+            self.assertEqual(shedder.in_flight, 1)
+            await dependency.aclose()
+            self.assertEqual(shedder.in_flight, 0)
+            with self.assertRaises(HTTPException) as ctx:
+                await admit("alice").__anext__()
+            self.assertEqual(ctx.exception.status_code, 429)
+            self.assertEqual(shedder.in_flight, 0)
+
+        with patch.object(admission_service, "LOAD_SHEDDER", shedder), patch.object(admission_service, "RATE_LIMITER", limiter):
+            asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+import asyncio
+from unittest.mock import MagicMock, Mock, patch
+from fastapi import HTTPException
+from src.services.read_marker_service import mark_group_read, list_unread_counts
+from src.utils.query_util import MARK_GROUP_READ, SELECT_UNREAD_COUNTS
+from src.models.schemas import User
+
+class TestReadMarkerService(unittest.TestCase):
+    @patch('src.services.read_marker_service.execute_atomic')
+    def test_mark_group_read(self, mock_execute):
+        mock_execute.return_value = (42,)
+        current_user = User(id=1, username="testuser", is_admin=False)
+        marker = asyncio.run(mark_group_read(7, None, current_user, Mock()))
+        self.assertEqual((marker.group_id, marker.last_read_id), (7, 42))
+        self.assertIs(mock_execute.call_args[0][1], MARK_GROUP_READ)
+        self.assertEqual(mock_execute.call_args[0][2], {"group_id": 7, "message_id": None, "user_id": 1})
+
+    @patch('src.services.read_marker_service.execute_atomic')
+    def test_mark_group_read_not_member(self, mock_execute):
+        mock_execute.return_value = None
+        current_user = User(id=1, username="testuser", is_admin=False)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(mark_group_read(7, 40, current_user, Mock()))
+        self.assertEqual(context.exception.status_code, 403)
+
+    def test_list_unread_counts_flags_capped_groups(self):
+        db = MagicMock()
+        cursor = db.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [(1, 10, 3), (2, 0, 100)]
+        current_user = User(id=5, username="testuser", is_admin=False)
+        counts = asyncio.run(list_unread_counts(current_user, db, cap=100))
+        self.assertEqual([(c.group_id, c.unread, c.capped) for c in counts], [(1, 3, False), (2, 100, True)])
+        cursor.execute.assert_called_once_with(SELECT_UNREAD_COUNTS, {"user_id": 5, "cap": 100})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import asyncio
+import os
+import uuid
+from unittest.mock import MagicMock, patch
+from psycopg2 import extensions
+from src.utils.db_util import ConnectionPool, PoolTimeout, get_db_connection
+from src.utils.replica_util import (Replica, ReplicaRouter, ReadYourWritesMiddleware, SESSION_LSNS, parse_lsn, format_lsn,
+                                    session_key)
+
+TEST_PRIMARY_URL = os.getenv('TEST_PRIMARY_URL')
+TEST_REPLICA_URL = os.getenv('TEST_REPLICA_URL')
+
+def make_replica(replayed: str):
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value.fetchone.return_value = (replayed,)
+    pool = MagicMock()
+    pool.getconn.return_value = conn
+    return Replica(pool), conn
+
+class TestReplicaRouting(unittest.TestCase):
+    def setUp(self):
+        SESSION_LSNS.clear()
+        self.primary = MagicMock()
+
+    def test_lsn_round_trip(self):
+        self.assertEqual(parse_lsn("16/B374D848"), (0x16 << 32) | 0xB374D848)
+        self.assertEqual(format_lsn(parse_lsn("16/B374D848")), "16/B374D848")
+        self.assertIsNone(parse_lsn("garbage"))
+        self.assertIsNone(parse_lsn(""))
+
+    def test_reads_without_lsn_go_to_replica(self):
+        replica, conn = make_replica("0/10")
+        router = ReplicaRouter([replica], lambda: self.primary)
+        self.assertEqual(router.getconn(), (conn, replica.pool))
+        conn.cursor.assert_not_called()
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        replica, conn = make_replica("0/10")
+        router = ReplicaRouter([replica], lambda: self.primary)
+        result = router.getconn(parse_lsn("0/20"))
+        self.assertEqual(result, (self.primary.getconn.return_value, self.primary))
+        replica.pool.putconn.assert_called_once_with(conn)
+
+    def test_caught_up_replica_is_remembered(self):
+        replica, conn = make_replica("0/30")
+        router = ReplicaRouter([replica], lambda: self.primary)
+        self.assertEqual(router.getconn(parse_lsn("0/20"))[0], conn)
+        self.assertEqual(router.getconn(parse_lsn("0/25"))[0], conn)
+        self.assertEqual(conn.cursor.call_count, 1)
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        replica, _ = make_replica("0/30")
+        replica.pool.getconn.side_effect = PoolTimeout()
+        router = ReplicaRouter([replica], lambda: self.primary)
+        self.assertIs(router.getconn()[1], self.primary)
+
+    @patch('src.utils.db_util.get_pool')
+    def test_middleware_records_session_lsn_on_request_connection(self, mock_get_pool):
+        conn = MagicMock()
+        conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+        conn.cursor.return_value.__enter__.return_value.fetchone.return_value = ("0/1234",)
+        mock_get_pool.return_value.getconn.return_value = conn
+
+        async def app(scope, receive, send):
+            dependency = get_db_connection()
+            next(dependency)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+            dependency.close()
+
+        sent = []
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "headers": [(b"authorization", b"Bearer abc")]}
+        asyncio.run(ReadYourWritesMiddleware(app, enabled=True)(scope, None, send))
+        self.assertIn((b"x-write-lsn", b"0/1234"), sent[0]["headers"])
+        self.assertEqual(SESSION_LSNS.get(session_key("Bearer abc")), 0x1234)
+        mock_get_pool.return_value.getconn.assert_called_once()
+        conn.rollback.assert_called_once()
+
+    def test_middleware_skips_requests_without_connection(self):
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        sent = []
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "headers": []}
+        asyncio.run(ReadYourWritesMiddleware(app, enabled=True)(scope, None, send))
+        self.assertEqual(sent[0]["headers"], [])
+
+@unittest.skipUnless(TEST_PRIMARY_URL and TEST_REPLICA_URL, "TEST_PRIMARY_URL and TEST_REPLICA_URL are not set")
+class TestReplicaRoutingOnPostgres(unittest.TestCase):
+    """Runs against a local primary and a streaming replica of it."""
+
+    def setUp(self):
+        self.primary = ConnectionPool(0, 2, dsn=TEST_PRIMARY_URL)
+        self.router = ReplicaRouter([Replica(ConnectionPool(0, 2, dsn=TEST_REPLICA_URL))], lambda: self.primary)
+        self.table = "replica_test_" + uuid.uuid4().hex[:8]
+
+    def tearDown(self):
+        conn = self.primary.getconn()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {self.table}")
+        conn.commit()
+        self.primary.putconn(conn)
+        self.primary.closeall()
+        self.router.closeall()
+
+    def test_reads_see_own_writes(self):
+        conn = self.primary.getconn()
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE TABLE {self.table} (id int)")
+            conn.commit()
+            for value in range(20):
+                cur.execute(f"INSERT INTO {self.table} VALUES (%s)", (value,))
+                conn.commit()
+                cur.execute("SELECT pg_current_wal_lsn()::text")
+                lsn = parse_lsn(cur.fetchone()[0])
+                conn.rollback()
+                read, pool = self.router.getconn(lsn)
+                try:
+                    with read.cursor() as read_cur:
+                        read_cur.execute(f"SELECT count(*) FROM {self.table} WHERE id = %s", (value,))
+                        self.assertEqual(read_cur.fetchone()[0], 1)
+                    read.rollback()
+                finally:
+                    pool.putconn(read)
+        self.primary.putconn(conn)
+
+    def test_reads_without_lsn_use_replica(self):
+        read, pool = self.router.getconn()
+        try:
+            with read.cursor() as cur:
+                cur.execute("SELECT pg_is_in_recovery()")
+                self.assertTrue(cur.fetchone()[0])
+            read.rollback()
+        finally:
+            pool.putconn(read)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+import asyncio
+from fastapi import HTTPException
+from src.utils.request_util import LimitedBodyRequest
+
+def limited_request(chunks: list, max_bytes: int, content_length: int = None):
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+    received = []
+
+    async def receive():
+        received.append(messages[len(received)])
+        return received[-1]
+
+    return LimitedBodyRequest({"type": "http", "method": "POST", "headers": headers}, receive, max_bytes), received
+
+class TestLimitedBodyRequest(unittest.TestCase):
+    def test_body_within_limit(self):
+        request, _ = limited_request([b'[{"content":', b'"hi"}]'], max_bytes=18)
+        self.assertEqual(asyncio.run(request.json()), [{"content": "hi"}])
+
+    def test_reading_stops_at_the_limit(self):
+        request, received = limited_request([b"x" * 10] * 100, max_bytes=25)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(request.body())
+        self.assertEqual(context.exception.status_code, 413)
+        self.assertEqual(len(received), 3)
+
+    def test_declared_length_over_the_limit_is_rejected_unread(self):
+        request, received = limited_request([b"x" * 100], max_bytes=25, content_length=100)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(request.body())
+        self.assertEqual(context.exception.status_code, 413)
+        self.assertEqual(received, [])
+
+if __name__ == '__main__':
+    unittest.main()
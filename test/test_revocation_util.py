@@ -0,0 +1,103 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import time
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+from src.utils.db_util import PoolTimeout
+from src.utils.revocation_util import (BloomFilter, MemoryRevocationBackend, SqliteRevocationBackend, PostgresRevocationBackend,
+                                       RevocationStore, REVOCATION_SEQ_OVERLAP)
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        items = ["token-%d" % i for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add("token-%d" % i)
+        false_positives = sum("other-%d" % i in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+class TestRevocationStore(unittest.TestCase):
+    def test_revoke_and_check(self):
+        store = RevocationStore(MemoryRevocationBackend())
+
+        async def scenario():
+            await store.revoke("revoked", time.time() + 60)
+            return await store.is_revoked("revoked"), await store.is_revoked("valid")
+
+        self.assertEqual(asyncio.run(scenario()), (True, False))
+
+    def test_expired_revocations_are_evicted(self):
+        backend = MemoryRevocationBackend()
+        store = RevocationStore(backend, purge_interval=0)
+
+        async def scenario():
+            await store.revoke("expired", time.time() - 1)
+            await store.revoke("live", time.time() + 60)
+            store.sync()
+            return await store.is_revoked("expired"), await store.is_revoked("live")
+
+        self.assertEqual(asyncio.run(scenario()), (False, True))
+        self.assertEqual(store.size(), 1)
+
+    def test_revocation_visible_across_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "revocations.db")
+            first_worker = RevocationStore(SqliteRevocationBackend(path), sync_interval=0)
+            second_worker = RevocationStore(SqliteRevocationBackend(path), sync_interval=0)
+
+            async def scenario():
+                before = await second_worker.is_revoked("token")
+                await first_worker.revoke("token", time.time() + 60)
+                return before, await second_worker.is_revoked("token")
+
+            self.assertEqual(asyncio.run(scenario()), (False, True))
+
+class TestRevocationSync(unittest.TestCase):
+    def test_concurrent_checks_share_one_sync(self):
+        class CountingBackend(MemoryRevocationBackend):
+            syncs = 0
+
+            def changes_since(self, cursor: int):
+                CountingBackend.syncs += 1
+                time.sleep(0.05)
+                return super().changes_since(cursor)
+
+        store = RevocationStore(CountingBackend(), sync_interval=60)
+
+        async def scenario():
+            return await asyncio.gather(*(store.is_revoked("token-%d" % i) for i in range(10)))
+
+        self.assertEqual(asyncio.run(scenario()), [False] * 10)
+        self.assertEqual(CountingBackend.syncs, 1)
+
+    def test_postgres_sync_rereads_revocations_committed_late(self):
+        pool = MagicMock()
+        cursor = pool.getconn.return_value.cursor.return_value.__enter__.return_value
+        # seq 7 is read before seq 6, assigned earlier, commits.
+        cursor.fetchall.side_effect = [[(7, "b")], [(6, "a"), (7, "b")]]
+        store = RevocationStore(PostgresRevocationBackend(pool), sync_interval=0)
+        store.sync()
+        store.sync()
+        self.assertEqual(store._cursor, 7)
+        self.assertIn("a", store._bloom)
+        self.assertEqual(store._bloom.count, 2)
+        self.assertEqual(cursor.execute.call_args[0][1], (7 - REVOCATION_SEQ_OVERLAP,))
+
+    def test_postgres_pool_exhaustion_is_a_503(self):
+        pool = MagicMock()
+        pool.getconn.side_effect = PoolTimeout("Timed out waiting for a database connection")
+        store = RevocationStore(PostgresRevocationBackend(pool), sync_interval=0)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(store.is_revoked("token"))
+        self.assertEqual(context.exception.status_code, 503)
+
+if __name__ == '__main__':
+    unittest.main()
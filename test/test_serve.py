@@ -0,0 +1,110 @@
+import unittest
+import http.client
+import os
+import threading
+import time
+from unittest.mock import patch
+import serve
+from serve import Arbiter, bind_socket, worker_max_requests
+
+def fake_worker(max_requests: int = None, status: int = 200):
+    """Build a worker that reports ready, then answers every request with ``status`` until it has served ``max_requests``."""
+    def worker(sock, ready_fd):
+        os.write(ready_fd, b"%d\n" % os.getpid())
+        served = 0
+        while max_requests is None or served < max_requests:
+            conn, _ = sock.accept()
+            with conn:
+                conn.recv(65536)
+                conn.sendall(b"HTTP/1.1 %d Fake\r\nContent-Length: 0\r\nConnection: close\r\n\r\n" % status)
+            served += 1
+    return worker
+
+def get(sock):
+    conn = http.client.HTTPConnection("127.0.0.1", sock.getsockname()[1], timeout=5)
+    try:
+        conn.request("GET", "/health/ready")
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+class TestWorkerMaxRequests(unittest.TestCase):
+    def test_limit_with_jitter(self):
+        self.assertIsNone(worker_max_requests(0, 10))
+        limits = {worker_max_requests(100, 10) for _ in range(200)}
+        self.assertTrue(limits <= set(range(100, 111)))
+        self.assertGreater(len(limits), 1)
+        self.assertEqual(worker_max_requests(100, 0), 100)
+
+@unittest.skipUnless(hasattr(os, "fork"), "os.fork is not available")
+class TestArbiter(unittest.TestCase):
+    def setUp(self):
+        self.sock = bind_socket("127.0.0.1", 0)
+        for name, value in (("STARTED", time.monotonic()), ("READY_TIMEOUT", 10.0), ("GRACEFUL_TIMEOUT", 1.0)):
+            patcher = patch.object(serve, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_arbiter(self, arbiter: Arbiter, until, timeout: float = 10.0):
+        """Run the arbiter in this thread until ``until()`` holds, then drain it; return its log."""
+        self.spawned = []
+        self.probed = threading.Event()
+        spawn, first_request = arbiter.spawn, arbiter._first_request
+        arbiter.spawn = lambda: self.spawned.append(spawn()) or self.spawned[-1]
+        arbiter._first_request = lambda: (first_request(), self.probed.set())[0]
+
+        def stop():
+            deadline = time.monotonic() + timeout
+            while not until() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            arbiter.stopping = True
+
+        stopper = threading.Thread(target=stop)
+        stopper.start()
+        with self.assertLogs("serve", "INFO") as logs:
+            self.assertEqual(arbiter.run(), 0)
+        stopper.join()
+        return "\n".join(logs.output)
+
+    def test_preforks_workers_and_serves_first_request(self):
+        arbiter = Arbiter(self.sock, 2, worker=fake_worker())
+        logs = self.run_arbiter(arbiter, self.probed_is_set)
+        self.assertEqual(len(self.spawned), 2)
+        self.assertIn("2 of 2 workers ready", logs)
+        self.assertIn("First request served", logs)
+        self.assertEqual(arbiter.workers, {})
+        for pid in self.spawned:
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+
+    def test_replaces_workers_that_exit(self):
+        # Each worker exits after one request, as with WORKER_MAX_REQUESTS=1; the first
+        # worker's request is the launcher's own probe.
+        arbiter = Arbiter(self.sock, 1, worker=fake_worker(max_requests=1))
+        statuses = []
+        requests = threading.Thread(target=lambda: statuses.extend(get(self.sock) for _ in range(2)))
+
+        def until():
+            if self.probed.is_set() and requests.ident is None:
+                requests.start()
+            return len(self.spawned) >= 4
+
+        logs = self.run_arbiter(arbiter, until)
+        requests.join()
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(len(set(self.spawned)), 4)
+        self.assertIn("replacing it", logs)
+
+    def test_unready_workers_are_reported(self):
+        arbiter = Arbiter(self.sock, 1, worker=fake_worker(status=503))
+        with patch.object(serve, "READY_TIMEOUT", 0.5):
+            logs = self.run_arbiter(arbiter, self.probed_is_set)
+        self.assertIn("1 of 1 workers ready", logs)
+        self.assertIn("No request served within", logs)
+        self.assertEqual(len(self.spawned), 1)
+
+    def probed_is_set(self) -> bool:
+        return self.probed.is_set()
+
+if __name__ == '__main__':
+    unittest.main()
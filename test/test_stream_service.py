@@ -0,0 +1,33 @@
+import unittest
+import json
+from unittest.mock import Mock, patch
+from src.services.stream_service import notify_group_event, message_event, like_event, _on_group_event, GROUP_EVENTS_CHANNEL
+from src.utils.notify_util import WORKER_ID
+from src.models.schemas import Message
+
+class TestStreamService(unittest.TestCase):
+    def test_notify_group_event(self):
+        cursor = Mock()
+        notify_group_event(cursor, 1, like_event(5, 1, 3))
+        channel, payload = cursor.execute.call_args[0][1]
+        self.assertEqual(channel, GROUP_EVENTS_CHANNEL)
+        self.assertEqual(json.loads(payload)["event"], {"type": "like", "message_id": 5, "group_id": 1, "likes": 3})
+
+    def test_large_message_sent_without_content(self):
+        cursor = Mock()
+        message = Message(id=1, group_id=1, content="x" * 10000, likes=0)
+        notify_group_event(cursor, 1, message_event(message))
+        event = json.loads(cursor.execute.call_args[0][1][1])["event"]
+        self.assertTrue(event["truncated"])
+        self.assertIsNone(event["message"]["content"])
+        self.assertEqual(event["message"]["id"], 1)
+
+    @patch('src.services.stream_service.BROKER')
+    def test_events_from_other_workers_are_published(self, mock_broker):
+        _on_group_event(json.dumps({"worker": WORKER_ID, "group_id": 1, "event": {}}))
+        mock_broker.publish_threadsafe.assert_not_called()
+        _on_group_event(json.dumps({"worker": "other", "group_id": 1, "event": {"type": "like"}}))
+        mock_broker.publish_threadsafe.assert_called_once_with(1, {"type": "like"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import json
+import asyncio
+from unittest.mock import MagicMock
+from src.utils.stream_util import iter_json_array, encode_item
+from src.services.group_service import list_groups, encode_group_row, encode_group_summary_row
+from src.services.message_service import encode_message_row
+from src.models.schemas import User, Message
+
+class TestStreamUtil(unittest.TestCase):
+    def test_empty_array(self):
+        self.assertEqual(b"".join(iter_json_array([])), b"[]")
+
+    def test_items_streamed_in_chunks(self):
+        users = [User(id=i, username="user%d" % i, is_admin=False) for i in range(200)]
+        chunks = list(iter_json_array(users))
+        self.assertGreater(len(chunks), 1)
+        decoded = json.loads(b"".join(chunks))
+        self.assertEqual(len(decoded), 200)
+        self.assertEqual(decoded[5], {"id": 5, "username": "user5", "is_admin": False})
+
+    def test_row_encoders_match_models(self):
+        db = MagicMock()
+        cursor = db.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [(1, "g\u00e9", [1, 2], ["a", "b"], [True, False]), (2, "empty", [None], [None], [None])]
+        models = asyncio.run(list_groups(db))
+        rows = asyncio.run(list_groups(db, raw=True))
+        self.assertEqual(json.loads(b"".join(iter_json_array(rows, encode_group_row))), json.loads(b"".join(iter_json_array(models))))
+        self.assertEqual(json.loads(encode_group_summary_row((1, "g", 3))), {"id": 1, "name": "g", "member_count": 3})
+        message = Message(id=1, group_id=2, content="hi", likes=3, attachment_ids=[4])
+        self.assertEqual(json.loads(encode_message_row((1, 2, "hi", 3, [4]))), json.loads(encode_item(message)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import asyncio
+import os
+import tempfile
+from fastapi import HTTPException
+from src.utils.blob_util import BlobStore, BlobTooLarge
+from src.utils.upload_util import receive_file
+
+BOUNDARY = "testboundary"
+
+class FakeRequest:
+    def __init__(self, body: bytes, content_type: str = f"multipart/form-data; boundary={BOUNDARY}", chunk_size: int = 7):
+        self.headers = {"content-type": content_type}
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+def multipart(*parts) -> bytes:
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if filename:
+            body += b"Content-Type: text/plain\r\n"
+        body += b"\r\n" + content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = BlobStore(self.tmp.name)
+
+    def write(self, data: bytes, max_bytes: int = 1024) -> str:
+        writer = self.store.writer(max_bytes)
+        writer.write(data)
+        return writer.commit()
+
+    def test_identical_blobs_share_a_file(self):
+        digest = self.write(b"hello")
+        self.assertEqual(digest, "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824")
+        self.assertEqual(self.write(b"hello"), digest)
+        with open(self.store.path(digest), "rb") as f:
+            self.assertEqual(f.read(), b"hello")
+        self.assertEqual(self.store.relative_path(digest), os.path.join("2c", "f2", digest))
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+    def test_writer_enforces_limit(self):
+        writer = self.store.writer(4)
+        writer.write(b"abcd")
+        with self.assertRaises(BlobTooLarge):
+            writer.write(b"e")
+        writer.abort()
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+    def test_finished_blob_is_stored_on_commit(self):
+        writer = self.store.writer(1024)
+        writer.write(b"hello")
+        digest = writer.finish()
+        self.assertFalse(os.path.exists(self.store.path(digest)))
+        self.assertEqual(writer.commit(), digest)
+        self.assertTrue(os.path.exists(self.store.path(digest)))
+        writer.abort()
+        self.assertTrue(os.path.exists(self.store.path(digest)))
+        self.store.remove(digest)
+        self.assertFalse(os.path.exists(self.store.path(digest)))
+        self.store.remove(digest)
+
+    def test_rejects_invalid_digest(self):
+        with self.assertRaises(ValueError):
+            self.store.path("../../etc/passwd")
+
+class TestReceiveFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = BlobStore(self.tmp.name)
+
+    def test_streams_file_part_into_blob(self):
+        content = b"line\r\n--not the boundary\r\n" * 50
+        body = multipart(("note", None, b"ignored"), ("file", "../dir/report.txt", content))
+        received = asyncio.run(receive_file(FakeRequest(body), self.store, 10000))
+        self.assertEqual(received.size, len(content))
+        self.assertEqual(received.filename, "report.txt")
+        self.assertEqual(received.content_type, "text/plain")
+        self.assertFalse(os.path.exists(self.store.path(received.sha256)))
+        self.assertEqual(received.blob.commit(), received.sha256)
+        with open(self.store.path(received.sha256), "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_rejects_oversized_file_without_leftovers(self):
+        body = multipart(("file", "big.bin", b"x" * 100))
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(receive_file(FakeRequest(body), self.store, 50))
+        self.assertEqual(context.exception.status_code, 413)
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+    def test_rejects_bodies_without_a_file(self):
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(receive_file(FakeRequest(b"{}", content_type="application/json"), self.store, 50))
+        self.assertEqual(context.exception.status_code, 415)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(receive_file(FakeRequest(multipart(("note", None, b"text"))), self.store, 50))
+        self.assertEqual(context.exception.status_code, 400)
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(receive_file(FakeRequest(multipart(("file", "a", b"1"), ("file", "b", b"2"))), self.store, 50))
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(os.listdir(self.store.tmp_dir), [])
+
+if __name__ == '__main__':
+    unittest.main()
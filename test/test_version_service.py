@@ -0,0 +1,124 @@
+import unittest
+import asyncio
+from unittest.mock import MagicMock, patch
+from src.utils.etag_util import VersionIndex, make_etag, etag_matches
+from src.services import version_service
+from src.services.version_service import GROUP_VERSIONS, LISTING_CACHE, ALL_GROUPS, cached_listing, group_versions_changed
+
+class FakeRequest:
+    def __init__(self, if_none_match: str = None):
+        self.headers = {"if-none-match": if_none_match} if if_none_match else {}
+
+class TestEtagUtil(unittest.TestCase):
+    def test_etag_matches(self):
+        etag = '"v7-abc"'
+        self.assertTrue(etag_matches('"v7-abc"', etag))
+        self.assertTrue(etag_matches('"v1-abc", W/"v7-abc"', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches('"v70-abc"', etag))
+        self.assertFalse(etag_matches(None, etag))
+
+    def test_etag_depends_on_version_and_key(self):
+        etag = make_etag(7, (1, "members", None, 50))
+        self.assertRegex(etag, r'^"v7-[0-9a-f]{16}"$')
+        self.assertEqual(etag, make_etag(7, (1, "members", None, 50)))
+        self.assertNotEqual(etag, make_etag(7, (2, "members", None, 50)))
+        self.assertNotEqual(etag, make_etag(7, (1, "members", "abc", 50)))
+        self.assertNotEqual(etag, make_etag(8, (1, "members", None, 50)))
+
+    def test_versions_only_move_forward(self):
+        index = VersionIndex(10, 60)
+        generation = index.generation()
+        index.advance([1], 5)
+        index.put(1, 3, generation)  # Read before the notification arrived
+        self.assertEqual(index.get(1), 5)
+        index.advance([1], 4)
+        self.assertEqual(index.get(1), 5)
+        index.put(2, 3, index.generation())
+        self.assertEqual(index.get(2), 3)
+
+class TestCachedListing(unittest.TestCase):
+    def setUp(self):
+        GROUP_VERSIONS.clear()
+        LISTING_CACHE.clear()
+        self.builds = 0
+
+    async def build(self):
+        self.builds += 1
+        return iter([b'[{"id":1}', b']']), {"X-Next-Cursor": "abc"}
+
+    def etag(self, version: int) -> str:
+        return make_etag(version, (ALL_GROUPS, "groups", None, 50))
+
+    def listing(self, db, if_none_match: str = None):
+        async def scenario():
+            response = await cached_listing(FakeRequest(if_none_match), ALL_GROUPS, ("groups", None, 50), db, self.build)
+            if hasattr(response, "body_iterator"):
+                response.body = b"".join([chunk async for chunk in response.body_iterator])
+            return response
+        return asyncio.run(scenario())
+
+    def test_caches_by_version_read_around_the_listing(self):
+        db = MagicMock()
+        cursor = db.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (3,)
+
+        response = self.listing(db)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, b'[{"id":1}]')
+        self.assertEqual(response.headers["etag"], self.etag(3))
+        self.assertEqual(response.headers["x-next-cursor"], "abc")
+
+        response = self.listing(db, self.etag(3))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], self.etag(3))
+        response = self.listing(db)
+        self.assertEqual(response.body, b'[{"id":1}]')
+        self.assertEqual(self.builds, 1)
+
+        cursor.fetchone.return_value = (4,)
+        self.assertEqual(self.listing(db, self.etag(3)).status_code, 200)
+        self.assertEqual(self.builds, 2)
+
+    def test_listing_changed_while_read_is_not_tagged(self):
+        db = MagicMock()
+        db.cursor.return_value.__enter__.return_value.fetchone.side_effect = [(3,), (4,), (4,), (4,)]
+        response = self.listing(db)
+        self.assertNotIn("etag", response.headers)
+        self.assertEqual(len(LISTING_CACHE), 0)
+        self.assertEqual(self.listing(db).headers["etag"], self.etag(4))
+
+    def test_large_listing_is_streamed_without_caching(self):
+        db = MagicMock()
+        db.cursor.return_value.__enter__.return_value.fetchone.return_value = (3,)
+        with patch.object(version_service, "LISTING_CACHE_MAX_BYTES", 5):
+            response = self.listing(db)
+        self.assertEqual(response.body, b'[{"id":1}]')
+        self.assertEqual(response.headers["etag"], self.etag(3))
+        self.assertEqual(len(LISTING_CACHE), 0)
+
+    def test_notified_version_answers_without_database(self):
+        db = MagicMock()
+        db.cursor.return_value.__enter__.return_value.fetchone.return_value = (5,)
+        with patch.object(version_service.LISTENER, "connected", True):
+            self.listing(db)
+            self.assertEqual(GROUP_VERSIONS.get(ALL_GROUPS), 5)
+            db.reset_mock()
+            self.assertEqual(self.listing(db, self.etag(5)).status_code, 304)
+            self.assertEqual(self.listing(db).body, b'[{"id":1}]')
+            db.cursor.assert_not_called()
+
+            group_versions_changed("6:0,2")
+            self.assertEqual(GROUP_VERSIONS.get(2), 6)
+            db.cursor.return_value.__enter__.return_value.fetchone.return_value = (6,)
+            self.assertEqual(self.listing(db, self.etag(5)).headers["etag"], self.etag(6))
+            self.assertEqual(self.builds, 2)
+
+    def test_notification_for_every_group(self):
+        GROUP_VERSIONS.advance([2], 6)
+        group_versions_changed("9:*")
+        self.assertIsNone(GROUP_VERSIONS.get(2))
+        self.assertEqual(GROUP_VERSIONS.get(ALL_GROUPS), 9)
+
+if __name__ == '__main__':
+    unittest.main()